@@ -93,8 +93,55 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
+    'orders.middleware.CartCookieMiddleware',
 ]
 
+# ที่เก็บตะกร้าสินค้าของ Guest (ผู้ใช้ที่ล็อกอินใช้ฐานข้อมูลเสมอ)
+# - 'orders.storage.DatabaseCartStorage' (ค่าเริ่มต้น): ตาราง Cart/CartItem
+# - 'orders.storage.CacheCartStorage': Django cache (ดู CART_CACHE_ALIAS, CART_CACHE_TIMEOUT)
+# - 'orders.storage.SignedCookieCartStorage': cookie ที่เซ็นชื่อแล้ว สำหรับตะกร้าขนาดเล็ก (ดู CART_COOKIE_MAX_ITEMS)
+CART_STORAGE = 'orders.storage.DatabaseCartStorage'
+
+# จองสต็อกชั่วคราวให้สินค้าที่อยู่ในตะกร้า (ดู orders.inventory)
+# การจองจะหมดอายุหลังตะกร้าไม่ถูกแก้ไขเกิน CART_HOLD_TTL วินาที และถูกคืนโดยคำสั่ง release_expired_holds
+CART_STOCK_HOLDS = False
+CART_HOLD_TTL = 15 * 60
+
+# อายุ (วินาที) ของ idempotency key ในฟอร์มชำระเงิน: การส่งฟอร์มซ้ำด้วย key เดิมภายในเวลานี้จะได้คำสั่งซื้อเดิม
+CHECKOUT_IDEMPOTENCY_TTL = 24 * 60 * 60
+
+# จำนวนหมายเลขคำสั่งซื้อที่แต่ละ process จองไว้ต่อครั้ง (ดู orders.numbering)
+ORDER_NUMBER_BLOCK_SIZE = 20
+
+# คิวงานเบื้องหลัง (orders.jobs) ทำงานด้วย: python manage.py run_jobs
+JOB_LEASE_SECONDS = 5 * 60     # worker ถือสิทธิ์งานได้นานเท่านี้ก่อนที่ worker อื่นจะรับต่อ
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 30         # วินาที (เพิ่มเป็นเท่าตัวในแต่ละครั้งที่ลองใหม่)
+
+# ขนาดสูงสุดของสลิปการโอนเงิน (ตรวจระหว่างอัปโหลด ดู orders.uploads)
+PAYMENT_SLIP_MAX_SIZE = 5 * 1024 * 1024
+
+# 'default' เป็น cache ใน process (แต่ละ worker แยกกัน)
+# 'shared' เก็บในฐานข้อมูลจึงทุก worker เห็นข้อมูลเดียวกัน ใช้กับข้อมูลที่ต้องล้างพร้อมกันทุก process
+# (สร้างตารางด้วย python manage.py createcachetable หรือเปลี่ยนเป็น Redis/Memcached ได้)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_shared_cache',
+    },
+}
+
+# cache ของหน้ารายละเอียดสินค้า (ดู products.detail_cache) ต้องเป็น cache ที่ใช้ร่วมกันทุก process
+PRODUCT_DETAIL_CACHE_ALIAS = 'shared'
+PRODUCT_DETAIL_CACHE_TIMEOUT = 60 * 60
+
+# cache โปรโมชั่นใน process (ดู promotions.cache) หน่วยเป็นวินาที
+PROMOTION_CACHE_TTL = 60
+PROMOTION_CACHE_NEGATIVE_TTL = 30
+
 ROOT_URLCONF = 'myduoproject.urls'
 
 TEMPLATES = [
@@ -124,6 +171,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # ฐานข้อมูลทดสอบเป็นไฟล์ (ไม่ใช่ในหน่วยความจำ) เพื่อให้ test ที่ใช้หลาย process เห็นฐานข้อมูลเดียวกัน
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
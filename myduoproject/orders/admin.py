@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cart, CartItem, Order, OrderItem
+from .models import Cart, CartItem, Job, Order, OrderItem
 
 # ----------------------------------------------------------------------
 # Inline for Order Items
@@ -98,9 +98,21 @@ class CartItemInline(admin.TabularInline):
 
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'session_key', 'total_subtotal', 'discount_amount', 'grand_total', 'updated_at')
+    list_display = ('id', 'user', 'session_key', 'item_count', 'subtotal', 'discount_amount', 'grand_total', 'updated_at')
     search_fields = ('user__username', 'session_key')
     list_filter = ('updated_at', 'created_at', 'user')
     inlines = [CartItemInline]
     
-    readonly_fields = ('total_subtotal', 'grand_total', 'created_at', 'updated_at')
+    readonly_fields = ('item_count', 'subtotal', 'grand_total', 'created_at', 'updated_at')
+
+
+# ----------------------------------------------------------------------
+# Background Job Admin
+# ----------------------------------------------------------------------
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'duration_ms', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name',)
+    readonly_fields = ('attempts', 'locked_by', 'locked_until', 'last_error', 'duration_ms', 'created_at', 'finished_at')
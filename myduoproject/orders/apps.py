@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class OrdersConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'orders'
+
+    def ready(self):
+        # เชื่อม signal handlers (เช่น การรวมตะกร้าตอนล็อกอิน) และลงทะเบียนงานเบื้องหลัง (orders.jobs)
+        from . import signals, tasks  # noqa: F401
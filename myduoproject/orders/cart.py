@@ -1,155 +1,184 @@
+from contextlib import contextmanager
+
 from django.db import transaction
-from django.db.models import Sum, F, DecimalField # เพิ่ม F และ DecimalField
 from django.http import HttpRequest
 from decimal import Decimal
-from django.apps import apps 
 
 # นำเข้าโมเดล Cart และ CartItem จากไฟล์ orders.models ปัจจุบัน
-from .models import Cart, CartItem 
+from .inventory import hold_stock, holds_enabled, release_holds, transfer_holds
+from .models import Cart, CartItem, OrderItem
+from .pricing import price_lines
+from .storage import cart_hold_key, get_cart_storage
 
 # -------------------------------------------------------------------
-# FIX: การ Import ProductVariant อย่างถูกต้อง
-# -------------------------------------------------------------------
-try:
-    ProductVariant = apps.get_model('products', 'ProductVariant')
-except LookupError:
-    print("FATAL ERROR: Could not find ProductVariant model in the 'products' application.")
-    raise
 
-# -------------------------------------------------------------------
+def merge_guest_cart(request: HttpRequest, user):
+    """
+    รวมตะกร้าของ Guest (ไม่ว่าจะเก็บใน backend ใด) เข้าสู่ Cart ของ User
+    เรียกครั้งเดียวจาก user_logged_in (ดู orders.signals)
+    """
+    storage = get_cart_storage(request)
+    guest_hold_key = storage.get_hold_key() if holds_enabled() else None
+    user_cart = storage.merge_into(user)
+    if guest_hold_key and user_cart is not None:
+        # ย้ายการจองสต็อกตามรายการสินค้าไปยัง Cart ของ User
+        transfer_holds(guest_hold_key, cart_hold_key(user_cart.pk))
+    return user_cart
+
+
+class CheckoutSnapshot:
+    """
+    ภาพรวมของตะกร้า ณ ตอนชำระเงิน: รายการสินค้าพร้อม variant/product ที่อ่านมาครั้งเดียว
+    ยอดรวม ส่วนลด และยอดสุทธิคำนวณในหน่วยความจำจากรายการชุดเดียวกับที่จะบันทึกลง OrderItem
+    """
+
+    def __init__(self, cart: Cart, items):
+        self.cart = cart
+        self.items = list(items)
+        self.promotion_code = cart.promotion_code
+        self.subtotal = price_lines(self.items).subtotal
+        self.discount_amount = min(cart.discount_amount or Decimal('0.00'), self.subtotal).quantize(Decimal('0.00'))
+        self.grand_total = self.subtotal - self.discount_amount
+
+    def is_empty(self) -> bool:
+        return not self.items
+
+    def stock_quantities(self) -> dict[int, int]:
+        """จำนวนที่ต้องตัดสต็อก {variant_id: quantity}"""
+        quantities = {}
+        for item in self.items:
+            quantities[item.variant_id] = quantities.get(item.variant_id, 0) + item.quantity
+        return quantities
+
+    def build_order_items(self, order) -> list[OrderItem]:
+        """สร้าง OrderItem (ยังไม่บันทึก) จากรายการใน snapshot โดยไม่ query เพิ่ม"""
+        return [
+            OrderItem(
+                order=order,
+                product=item.variant.product,
+                product_name=item.variant.product.name,
+                variant_size=item.variant.size,
+                quantity=item.quantity,
+                # บันทึกราคา ณ ขณะนั้น
+                unit_price=item.price_at_addition.quantize(Decimal('0.00')),
+            )
+            for item in self.items
+        ]
+
 
 class CartManager:
     """
     Class ที่จัดการการดำเนินการทั้งหมดของตะกร้าสินค้า (เพิ่ม ลบ อัปเดต)
     CartManager จะถูกสร้างขึ้นในแต่ละ request เพื่อจัดการ Cart object ที่เกี่ยวข้อง
+    การเก็บข้อมูลจริงทำผ่าน storage backend (ดู orders.storage และ settings.CART_STORAGE)
+    ถ้าเปิด settings.CART_STOCK_HOLDS ทุกการแก้ไขจะจอง/คืนสต็อกใน transaction เดียวกัน (ดู orders.inventory)
     """
-    
-    def __init__(self, request: HttpRequest):
+
+    def __init__(self, request: HttpRequest, lazy: bool = True):
         """
         ตรวจสอบและดึง Cart object สำหรับผู้ใช้/session
+
+        lazy=True (ค่าเริ่มต้น): ไม่สร้าง session และแถว Cart จนกว่าจะมีการเขียนครั้งแรก (add)
+        การอ่านตะกร้าที่ยังไม่มีอยู่จะได้ Cart เปล่าที่ยังไม่ถูกบันทึก (ไม่มี query)
         """
         self.request = request
         self.user = self.request.user if self.request.user.is_authenticated else None
-        
-        # 1. ตรวจสอบ session key และสร้างถ้าไม่มี (สำหรับ Guest)
-        if not self.request.session.session_key:
-            self.request.session.create()
-        self.session_key = self.request.session.session_key
-
-        # 2. หาหรือสร้าง Cart 
-        self.cart = self._get_or_create_cart()
-
-    def _get_or_create_cart(self) -> Cart:
-        """Logic สำหรับดึง, สร้าง, หรือรวม Cart"""
-        if self.user:
-            # 2a. จัดการ Cart สำหรับผู้ใช้ที่ล็อกอิน
-            user_cart = Cart.objects.filter(user=self.user).first()
-            session_cart = Cart.objects.filter(session_key=self.session_key, user__isnull=True).first()
-            
-            if not user_cart and session_cart:
-                # ถ้า User ไม่มี Cart แต่มี Cart ของ Guest ใน Session ปัจจุบัน -> ผูก Cart
-                session_cart.user = self.user
-                session_cart.session_key = None
-                session_cart.save()
-                return session_cart
-            elif user_cart and session_cart and user_cart.id != session_cart.id: # ตรวจสอบ ID เพื่อป้องกันการผสานตัวเอง
-                # ถ้า User มี Cart แล้ว และมี Guest Cart ที่ยังไม่ถูกผสาน
-                self._merge_session_cart(user_cart, session_cart)
-                return user_cart
-            elif not user_cart:
-                # ถ้าไม่มี Cart ทั้งแบบ User และ Session -> สร้างใหม่
-                return Cart.objects.create(user=self.user)
-            
-            # 2b. ถ้ามี Cart ของ User อยู่แล้ว
-            if user_cart and user_cart.session_key:
-                # ล้าง session_key หากมีการล็อกอิน
-                user_cart.session_key = None
-                user_cart.save(update_fields=['session_key'])
-
-            return user_cart
-
-        else:
-            # 2c. จัดการ Cart สำหรับผู้มาเยือน (Guest)
-            cart, created = Cart.objects.get_or_create(session_key=self.session_key, user__isnull=True)
-            return cart
-
-    @transaction.atomic
-    def _merge_session_cart(self, user_cart: Cart, guest_cart: Cart):
-        """รวมรายการสินค้าจาก Cart ของ Guest เข้าสู่ Cart ของ User"""
-        
-        # ย้ายรายการสินค้าทั้งหมดจาก Guest Cart ไป User Cart
-        for guest_item in guest_cart.items.all():
-            # เรียกใช้เมธอด add เพื่อให้มีการตรวจสอบและรวม item ที่ซ้ำกัน
-            # NOTE: ต้องตั้งค่า self.cart ให้เป็น user_cart ชั่วคราวเพื่อให้ self.add ทำงานกับ user_cart
-            original_cart = self.cart
-            self.cart = user_cart
-            self.add(
-                variant=guest_item.variant, 
-                quantity=guest_item.quantity, 
-                price_override=guest_item.price_at_addition 
-            )
-            self.cart = original_cart # คืนค่า self.cart เดิม
-        
-        # ลบ Guest Cart เดิม
-        guest_cart.delete()
+        self.storage = get_cart_storage(request, user=self.user, lazy=lazy)
+
+    @property
+    def cart(self) -> Cart:
+        """Cart ปัจจุบัน (ถ้ายังไม่มีใน storage จะได้ Cart เปล่าที่ยังไม่ถูกบันทึก)"""
+        return self.storage.cart
+
+    def is_persisted(self) -> bool:
+        """ตรวจสอบว่า Cart มีแถวอยู่ในฐานข้อมูลแล้วหรือไม่"""
+        return self.storage.is_persisted()
+
+    def get_items(self):
+        """รายการสินค้าพร้อม variant/product"""
+        return self.storage.get_items()
+
+    def get_item(self, **lookup) -> CartItem:
+        """ดึงรายการสินค้าหนึ่งรายการในตะกร้านี้ (ไม่พบจะ raise CartItem.DoesNotExist)"""
+        return self.storage.get_item(**lookup)
+
+    @property
+    def hold_key(self) -> str | None:
+        """key ของการจองสต็อกของตะกร้านี้ (None ถ้าไม่ได้เปิดใช้หรือยังไม่มีตะกร้า)"""
+        return self.storage.get_hold_key() if holds_enabled() else None
+
+    @contextmanager
+    def _holding(self, deltas: dict[int, int]):
+        """
+        จอง/คืนสต็อกตามจำนวนที่เปลี่ยน ({variant_id: delta}) ใน transaction เดียวกับการแก้ไขตะกร้า
+        (สร้างตะกร้าก่อนเปิด transaction เพื่อไม่ให้ Cart ที่ถูก rollback ค้างอยู่ใน storage)
+        """
+        if not holds_enabled() or not any(deltas.values()):
+            yield
+            return
+        holder = self.storage.get_hold_key(create=True)
+        with transaction.atomic():
+            hold_stock(holder, deltas)
+            yield
 
-    @transaction.atomic
     def add(self, variant, quantity: int = 1, price_override: Decimal = None):
         """
         เมธอดหลักในการเพิ่ม ProductVariant ลงใน Cart หรืออัปเดตจำนวน
         """
-        # 1. ตรวจสอบราคาที่จะใช้
-        try:
-            unit_price = price_override if price_override is not None else variant.current_price
-        except AttributeError:
-             raise AttributeError("ProductVariant must have a 'current_price' attribute.")
-        
-        try:
-            # 2. ลองค้นหารายการสินค้าในตะกร้าที่มีอยู่แล้ว (ส่วน Get/Update)
-            cart_item = CartItem.objects.get(
-                cart=self.cart,
-                variant_id=variant.id, 
-            )
-            
-            # 3. ถ้ารายการสินค้ามีอยู่: อัปเดตจำนวนและราคา
-            cart_item.quantity += quantity
-            cart_item.price_at_addition = unit_price # อัปเดตราคาล่าสุด
-            cart_item.save(update_fields=['quantity', 'price_at_addition', 'updated_at'])
-
-        except CartItem.DoesNotExist:
-            # 4. ถ้ารายการสินค้าไม่มีอยู่: สร้างรายการใหม่ (ส่วน Create)
-            cart_item = CartItem.objects.create(
-                cart=self.cart,
-                variant=variant, 
-                quantity=quantity,
-                price_at_addition=unit_price
-            )
+        with self._holding({variant.pk: quantity}):
+            return self.storage.add(variant, quantity=quantity, price_override=price_override)
+
+    def add_many(self, items: dict[int, int]) -> list[CartItem]:
+        """
+        เพิ่มสินค้าหลายตัวเลือกในครั้งเดียว ({variant_id: quantity})
+        ตรวจสอบ variant/สต็อกด้วย query เดียว และบันทึกทั้งหมดในครั้งเดียว
+        """
+        with self._holding(items):
+            return self.storage.add_many(items)
+
+    def update_quantity(self, cart_item: CartItem, quantity: int):
+        """
+        ตั้งค่าจำนวนของรายการสินค้า (ถ้าจำนวน <= 0 จะลบรายการออก)
+        """
+        with self._holding({cart_item.variant_id: max(quantity, 0) - cart_item.quantity}):
+            return self.storage.update_quantity(cart_item, quantity)
+
+    def remove(self, cart_item: CartItem):
+        """ลบรายการสินค้าออกจากตะกร้าและหักยอดรวม"""
+        with self._holding({cart_item.variant_id: -cart_item.quantity}):
+            self.storage.remove(cart_item)
+
+    def clear(self):
+        """ล้างรายการสินค้าและส่วนลดทั้งหมด (ใช้หลังสร้างคำสั่งซื้อ) พร้อมคืนการจองสต็อก"""
+        holder = self.hold_key
+        with transaction.atomic():
+            if holder:
+                release_holds(holder)
+            self.storage.clear()
+
+    def apply_discount(self, code, amount: Decimal):
+        """บันทึกโค้ดส่วนลดและยอดส่วนลดลงในตะกร้า"""
+        self.storage.apply_discount(code, amount)
+
+    def revalidate(self) -> dict:
+        """
+        ตรวจสอบราคาและสต็อกล่าสุดของทุกรายการก่อนชำระเงิน (query เดียว ไม่ query ต่อรายการ)
+        คืนค่ารายงาน {'price_changes': [(item, old_price, new_price)], 'stock_issues': [(item, available)]}
+        """
+        return self.storage.revalidate()
 
-        # TODO: self.cart.apply_promotions() 
-        return cart_item
+    def snapshot(self) -> CheckoutSnapshot:
+        """อ่านรายการทั้งหมดพร้อม variant/product ด้วย query เดียวสำหรับขั้นตอนชำระเงิน"""
+        return CheckoutSnapshot(self.cart, self.get_items())
 
     def get_total_quantity(self) -> int:
-        """นับจำนวนรวมของชิ้นสินค้าทั้งหมดในตะกร้า"""
-        result = self.cart.items.aggregate(total_quantity=Sum('quantity'))
-        return result['total_quantity'] or 0
+        """จำนวนรวมของชิ้นสินค้าทั้งหมดในตะกร้า (อ่านจากคอลัมน์ที่เก็บไว้)"""
+        return self.cart.item_count
 
-    # ***************************************************************
-    # FIX: เพิ่มเมธอดสำหรับคำนวณยอดรวม (Subtotal) และยอดสุทธิ (Grand Total)
-    # ***************************************************************
     def get_subtotal(self) -> Decimal:
-        """คำนวณยอดรวมสินค้าทั้งหมดในตะกร้า (ก่อนส่วนลด)"""
-        # คำนวณยอดรวมของ (quantity * price_at_addition)
-        subtotal = self.cart.items.aggregate(
-            subtotal=Sum(F('quantity') * F('price_at_addition'), output_field=DecimalField())
-        )['subtotal']
-        
-        return subtotal.quantize(Decimal('0.00')) if subtotal else Decimal('0.00')
+        """ยอดรวมสินค้าทั้งหมดในตะกร้า (ก่อนส่วนลด)"""
+        return self.cart.subtotal.quantize(Decimal('0.00'))
 
     def get_grand_total(self) -> Decimal:
-        """คำนวณยอดรวมสุทธิ (หลังส่วนลด)"""
-        subtotal = self.get_subtotal()
-        discount = self.cart.discount_amount if self.cart.discount_amount else Decimal('0.00')
-        
-        grand_total = subtotal - discount
-        # ป้องกันไม่ให้ราคารวมติดลบ
-        return max(Decimal('0.00'), grand_total).quantize(Decimal('0.00'))
+        """ยอดรวมสุทธิ (หลังส่วนลด)"""
+        return self.cart.grand_total.quantize(Decimal('0.00'))
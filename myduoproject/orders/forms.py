@@ -2,6 +2,8 @@
 from django import forms
 # สมมติว่า PaymentMethod คือ Choices field หรือ Enum ที่คุณใช้
 from .models import PaymentMethod 
+from .uploads import PAYMENT_SLIP_EXTENSIONS, get_max_slip_size
+import os
 
 class CheckoutForm(forms.Form):
     """
@@ -29,7 +31,12 @@ class CheckoutForm(forms.Form):
         widget=forms.FileInput(attrs={'accept': 'image/*,application/pdf'})
     )
 
-    def __init__(self, *args, **kwargs):
+    # 4. key สำหรับป้องกันการสร้างคำสั่งซื้อซ้ำเมื่อกดส่งฟอร์มซ้ำ (สร้างใหม่ทุกครั้งที่เปิดหน้าชำระเงิน)
+    idempotency_key = forms.CharField(widget=forms.HiddenInput, max_length=64, required=False)
+
+    def __init__(self, *args, payment_slip_upload=None, **kwargs):
+        # ผลจาก PaymentSlipUploadHandler (sha256/size หรือ error) ดู orders.uploads
+        self.payment_slip_upload = payment_slip_upload or {}
         super().__init__(*args, **kwargs)
         
         # เพิ่ม Tailwind classes ให้กับทุกฟิลด์เพื่อความสวยงาม
@@ -43,6 +50,15 @@ class CheckoutForm(forms.Form):
             if name == 'payment_slip':
                  field.widget.attrs.update({'class': 'w-full text-sm text-gray-900 border border-gray-300 rounded-lg cursor-pointer bg-gray-50 focus:outline-none'})
 
+    def clean_payment_slip(self):
+        """ตรวจขนาด (ตรวจระหว่างอัปโหลดแล้ว) และชนิดไฟล์ของสลิป"""
+        payment_slip = self.cleaned_data.get('payment_slip')
+        if self.payment_slip_upload.get('error') == 'too_large':
+            raise forms.ValidationError(f"ไฟล์สลิปต้องมีขนาดไม่เกิน {get_max_slip_size() // (1024 * 1024)}MB")
+        if payment_slip and os.path.splitext(payment_slip.name)[1].lower() not in PAYMENT_SLIP_EXTENSIONS:
+            raise forms.ValidationError("รองรับเฉพาะไฟล์ JPG, PNG, GIF, WEBP หรือ PDF")
+        return payment_slip
+
     def clean(self):
         """
         ตรวจสอบเงื่อนไข: หากเลือก 'โอนเงินผ่านธนาคาร' ต้องมีไฟล์สลิป
@@ -51,9 +67,8 @@ class CheckoutForm(forms.Form):
         payment_method = cleaned_data.get('payment_method')
         payment_slip = cleaned_data.get('payment_slip')
         
-        # สมมติว่าค่าสำหรับ 'โอนเงินผ่านธนาคาร' คือ 'Transfer'
-        # คุณต้องตรวจสอบกับค่าจริงใน PaymentMethod.choices ของคุณ
-        if payment_method == 'Transfer' and not payment_slip:
+        # ตรวจกับค่าจริงใน PaymentMethod.choices ('BANK' = โอนเงินผ่านธนาคาร)
+        if payment_method == PaymentMethod.BANK and not payment_slip and 'payment_slip' not in self.errors:
             self.add_error('payment_slip', 'กรุณาอัปโหลดสลิปหลักฐานการโอนเงิน เมื่อเลือกช่องทางนี้')
             
         return cleaned_data
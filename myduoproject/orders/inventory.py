@@ -0,0 +1,208 @@
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from products.aggregates import refresh_stock_totals
+
+from .models import StockHold
+
+ProductVariant = apps.get_model('products', 'ProductVariant')
+
+# อายุของการจองสต็อกในตะกร้า (วินาที) นับจากการแก้ไขตะกร้าครั้งล่าสุด
+DEFAULT_CART_HOLD_TTL = 15 * 60
+
+
+def holds_enabled() -> bool:
+    """เปิดใช้การจองสต็อกในตะกร้าหรือไม่ (settings.CART_STOCK_HOLDS)"""
+    return getattr(settings, 'CART_STOCK_HOLDS', False)
+
+
+class InsufficientStock(ValueError):
+    """สต็อกไม่พอสำหรับบางรายการ (variants คือรายการ ProductVariant ที่ไม่พอ)"""
+
+    def __init__(self, variants):
+        self.variants = variants
+        names = ', '.join(f"{variant.product.name} ({variant.size})" for variant in variants)
+        super().__init__(f"สินค้าไม่พอในสต็อก: {names}")
+
+
+def _quantity_case(quantities: dict[int, int]) -> Case:
+    """CASE id WHEN <variant_id> THEN <quantity> ... END"""
+    return Case(
+        *[When(pk=variant_id, then=Value(quantity)) for variant_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def _reserve(quantities: dict[int, int]):
+    """
+    เพิ่ม reserved ของทุก variant ด้วย UPDATE เดียวแบบมีเงื่อนไข stock - reserved >= quantity
+    ต้องเรียกภายใน transaction (ถ้ารายการใดไม่พอจะ raise InsufficientStock)
+    """
+    quantity = _quantity_case(quantities)
+    updated = ProductVariant.objects.filter(pk__in=list(quantities), stock__gte=F('reserved') + quantity).update(
+        reserved=F('reserved') + quantity,
+    )
+    if updated != len(quantities):
+        found = set(ProductVariant.objects.filter(pk__in=list(quantities)).values_list('pk', flat=True))
+        missing = [variant_id for variant_id in quantities if variant_id not in found]
+        if missing:
+            raise ValueError(f"ไม่พบตัวเลือกสินค้า: {', '.join(map(str, missing))}")
+        short = list(
+            ProductVariant.objects.select_related('product')
+            .filter(pk__in=list(quantities))
+            .exclude(stock__gte=F('reserved') + quantity)
+        )
+        raise InsufficientStock(short)
+
+
+def _unreserve(quantities: dict[int, int]):
+    """ลด reserved ของทุก variant ด้วย UPDATE เดียว (ไม่ให้ติดลบ)"""
+    quantities = {variant_id: quantity for variant_id, quantity in quantities.items() if quantity > 0}
+    if quantities:
+        ProductVariant.objects.filter(pk__in=list(quantities)).update(
+            reserved=Greatest(F('reserved') - _quantity_case(quantities), Value(0)),
+        )
+
+
+def _release(holds) -> int:
+    """คืนจำนวนของ hold ที่ระบุ (list ของ (pk, variant_id, quantity)) กลับสู่สต็อก แล้วลบ hold"""
+    if not holds:
+        return 0
+    quantities = {}
+    for pk, variant_id, quantity in holds:
+        quantities[variant_id] = quantities.get(variant_id, 0) + quantity
+    _unreserve(quantities)
+    StockHold.objects.filter(pk__in=[pk for pk, variant_id, quantity in holds]).delete()
+    return len(holds)
+
+
+def hold_stock(holder: str, deltas: dict[int, int]):
+    """
+    ปรับการจองสต็อกของตะกร้า holder ตามจำนวนที่เปลี่ยนไป ({variant_id: +เพิ่ม / -ลด})
+    การเพิ่มจะสำเร็จเฉพาะเมื่อสต็อกที่ยังไม่ถูกจองพอ (ไม่เช่นนั้น raise InsufficientStock และไม่จองเลย)
+    ทุกครั้งที่ตะกร้าถูกแก้ไข อายุของ hold ทั้งหมดของตะกร้าจะถูกต่อออกไป (CART_HOLD_TTL)
+    """
+    deltas = {variant_id: delta for variant_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    expires_at = timezone.now() + timedelta(seconds=getattr(settings, 'CART_HOLD_TTL', DEFAULT_CART_HOLD_TTL))
+    with transaction.atomic():
+        existing = {
+            hold.variant_id: hold
+            for hold in StockHold.objects.filter(holder=holder, variant_id__in=list(deltas))
+        }
+        increases = {variant_id: delta for variant_id, delta in deltas.items() if delta > 0}
+        if increases:
+            _reserve(increases)
+
+        # การลดจำนวนคืนได้ไม่เกินที่จองไว้จริง (hold ที่หมดอายุแล้วถูกคืนไปก่อนหน้านี้)
+        decreases = {
+            variant_id: min(-delta, existing[variant_id].quantity if variant_id in existing else 0)
+            for variant_id, delta in deltas.items() if delta < 0
+        }
+        _unreserve(decreases)
+
+        upserts, emptied = [], []
+        for variant_id, delta in deltas.items():
+            current = existing[variant_id].quantity if variant_id in existing else 0
+            quantity = current + delta if delta > 0 else current - decreases[variant_id]
+            if quantity > 0:
+                upserts.append(StockHold(holder=holder, variant_id=variant_id, quantity=quantity, expires_at=expires_at))
+            elif variant_id in existing:
+                emptied.append(existing[variant_id].pk)
+
+        if upserts:
+            StockHold.objects.bulk_create(
+                upserts,
+                update_conflicts=True,
+                unique_fields=['holder', 'variant'],
+                update_fields=['quantity', 'expires_at'],
+            )
+        if emptied:
+            StockHold.objects.filter(pk__in=emptied).delete()
+        StockHold.objects.filter(holder=holder).update(expires_at=expires_at)
+
+
+def release_holds(holder: str) -> int:
+    """คืนการจองทั้งหมดของตะกร้า holder (เช่น ตอนล้างตะกร้า)"""
+    with transaction.atomic():
+        holds = list(StockHold.objects.filter(holder=holder).values_list('pk', 'variant_id', 'quantity'))
+        return _release(holds)
+
+
+def transfer_holds(from_holder: str, to_holder: str):
+    """ย้ายการจองจากตะกร้าหนึ่งไปอีกตะกร้า (รวมจำนวนถ้ามี variant ซ้ำ) โดย reserved ไม่เปลี่ยน"""
+    if not from_holder or from_holder == to_holder:
+        return
+    with transaction.atomic():
+        moved = list(StockHold.objects.filter(holder=from_holder))
+        if not moved:
+            return
+        existing = {
+            hold.variant_id: hold.quantity
+            for hold in StockHold.objects.filter(holder=to_holder, variant_id__in=[hold.variant_id for hold in moved])
+        }
+        StockHold.objects.filter(holder=from_holder).delete()
+        StockHold.objects.bulk_create(
+            [
+                StockHold(
+                    holder=to_holder,
+                    variant_id=hold.variant_id,
+                    quantity=existing.get(hold.variant_id, 0) + hold.quantity,
+                    expires_at=hold.expires_at,
+                )
+                for hold in moved
+            ],
+            update_conflicts=True,
+            unique_fields=['holder', 'variant'],
+            update_fields=['quantity', 'expires_at'],
+        )
+
+
+def release_expired_holds(batch_size: int = 1000) -> int:
+    """คืนการจองที่หมดอายุแล้วกลับสู่สต็อกทีละ batch (แต่ละ batch เป็น transaction สั้น ๆ)"""
+    now = timezone.now()
+    total = 0
+    while True:
+        with transaction.atomic():
+            holds = list(
+                StockHold.objects.filter(expires_at__lt=now).values_list('pk', 'variant_id', 'quantity')[:batch_size]
+            )
+            if not holds:
+                return total
+            total += _release(holds)
+
+
+def decrement_stock(quantities: dict[int, int], holder: str = None):
+    """
+    ตัดสต็อกของทุก variant ({variant_id: quantity}) ด้วย UPDATE เดียวแบบมีเงื่อนไข stock - reserved >= quantity
+    ถ้าระบุ holder จะคืนการจองของตะกร้านั้นก่อน (ภายใน transaction เดียวกัน) เพื่อไม่ให้นับซ้ำ
+    ถ้ามีรายการใดไม่พอ จะย้อนกลับทั้งหมด (savepoint) แล้ว raise InsufficientStock
+    """
+    quantities = {variant_id: quantity for variant_id, quantity in quantities.items() if quantity > 0}
+    if not quantities:
+        return
+
+    quantity = _quantity_case(quantities)
+    with transaction.atomic():
+        if holder:
+            release_holds(holder)
+        updated = ProductVariant.objects.filter(pk__in=list(quantities), stock__gte=F('reserved') + quantity).update(
+            stock=F('stock') - quantity,
+        )
+        if updated != len(quantities):
+            short = list(
+                ProductVariant.objects.select_related('product')
+                .filter(pk__in=list(quantities))
+                .exclude(stock__gte=F('reserved') + quantity)
+            )
+            raise InsufficientStock(short)
+        # สต็อกรวมของสินค้า (Product.total_stock) ใน transaction เดียวกัน
+        refresh_stock_totals(quantities)
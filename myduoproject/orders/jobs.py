@@ -0,0 +1,105 @@
+"""
+คิวงานเบื้องหลังอย่างง่ายที่เก็บในฐานข้อมูล (ตาราง Job)
+
+- ลงทะเบียน handler ด้วย @task('ชื่องาน') (ดู orders.tasks)
+- enqueue('ชื่องาน', {...}) บันทึกงานใน transaction ปัจจุบัน (งานจะหายไปพร้อมกันถ้า transaction ถูก rollback)
+- worker (manage.py run_jobs) รับงานด้วย UPDATE แบบมีเงื่อนไข และถือสิทธิ์ (lease) จนถึง locked_until
+  ถ้า worker ตายระหว่างทำงาน worker อื่นจะรับงานต่อได้เมื่อ lease หมดอายุ
+- งานที่ล้มเหลวจะถูกลองใหม่แบบ exponential backoff จนครบ max_attempts
+"""
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job, JobStatus
+
+DEFAULT_JOB_LEASE = 5 * 60
+DEFAULT_JOB_MAX_ATTEMPTS = 5
+DEFAULT_JOB_RETRY_BACKOFF = 30
+
+# ชื่องาน -> handler
+registry = {}
+
+
+def task(name: str):
+    """Decorator สำหรับลงทะเบียน handler ของงาน (handler รับ payload เป็น keyword arguments)"""
+    def decorator(func):
+        registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name: str, payload: dict = None, delay: int = 0, max_attempts: int = None) -> Job:
+    """เพิ่มงานเข้าคิว (delay คือจำนวนวินาทีที่ต้องรอก่อนเริ่มทำ)"""
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or getattr(settings, 'JOB_MAX_ATTEMPTS', DEFAULT_JOB_MAX_ATTEMPTS),
+    )
+
+
+def _claimable(now):
+    """งานที่ถึงเวลาทำ หรือถูกรับไปแล้วแต่ lease หมดอายุ (worker เดิมหยุดทำงาน)"""
+    return Job.objects.filter(
+        Q(status=JobStatus.PENDING, run_at__lte=now)
+        | Q(status=JobStatus.RUNNING, locked_until__lt=now)
+    )
+
+
+def claim_jobs(worker: str, limit: int = 10, lease: int = None) -> list[Job]:
+    """
+    รับงานที่พร้อมทำได้สูงสุด limit งาน
+    แต่ละงานถูกรับด้วย UPDATE แบบมีเงื่อนไข ถ้า worker อื่นรับงานเดียวกันไปก่อน UPDATE จะไม่มีผลและข้ามงานนั้นไป
+    """
+    now = timezone.now()
+    locked_until = now + timedelta(seconds=lease or getattr(settings, 'JOB_LEASE_SECONDS', DEFAULT_JOB_LEASE))
+    candidates = list(_claimable(now).order_by('run_at').values_list('pk', flat=True)[:limit])
+
+    claimed = []
+    for pk in candidates:
+        if _claimable(now).filter(pk=pk).update(
+            status=JobStatus.RUNNING,
+            locked_by=worker,
+            locked_until=locked_until,
+            attempts=F('attempts') + 1,
+        ):
+            claimed.append(pk)
+    return list(Job.objects.filter(pk__in=claimed).order_by('run_at'))
+
+
+def run_job(job: Job, worker: str) -> bool:
+    """
+    ทำงานหนึ่งงานที่รับมาแล้ว และบันทึกผล (เฉพาะถ้ายังถือ lease อยู่)
+    คืนค่า True ถ้าสำเร็จ
+    """
+    started = time.monotonic()
+    try:
+        handler = registry[job.name]
+        handler(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        succeeded = False
+    else:
+        error = ''
+        succeeded = True
+    job.duration_ms = int((time.monotonic() - started) * 1000)
+
+    now = timezone.now()
+    update = {'duration_ms': job.duration_ms, 'last_error': error, 'locked_by': '', 'locked_until': None}
+    if succeeded:
+        update.update(status=JobStatus.DONE, finished_at=now)
+    elif job.attempts >= job.max_attempts:
+        update.update(status=JobStatus.FAILED, finished_at=now)
+    else:
+        backoff = getattr(settings, 'JOB_RETRY_BACKOFF', DEFAULT_JOB_RETRY_BACKOFF) * 2 ** (job.attempts - 1)
+        update.update(status=JobStatus.PENDING, run_at=now + timedelta(seconds=backoff))
+
+    Job.objects.filter(pk=job.pk, locked_by=worker).update(**update)
+    for field, value in update.items():
+        setattr(job, field, value)
+    return succeeded
@@ -0,0 +1,80 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from orders.models import Cart, CartItem, CheckoutIdempotencyKey
+
+
+class Command(BaseCommand):
+    """
+    ลบ Guest Cart ที่ถูกทิ้งไว้ (พร้อม CartItem), idempotency key ของการชำระเงินและ session ที่หมดอายุแล้ว
+    ทำทีละ batch เล็ก ๆ (แต่ละ batch เป็น transaction สั้น ๆ) จึงรันได้ระหว่างที่ร้านเปิดใช้งาน
+    """
+    help = 'Delete abandoned guest carts, expired checkout keys and expired sessions in bounded batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='ลบ Guest Cart ที่ไม่ถูกแก้ไขเกินจำนวนวันนี้ (ค่าเริ่มต้น 30)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='จำนวนแถวต่อ batch (ค่าเริ่มต้น 1000)')
+        parser.add_argument('--sleep', type=float, default=0.0, help='หน่วงเวลา (วินาที) ระหว่าง batch เพื่อลดภาระฐานข้อมูล')
+        parser.add_argument('--dry-run', action='store_true', help='แสดงจำนวนที่จะถูกลบโดยไม่ลบจริง')
+        parser.add_argument('--skip-sessions', action='store_true', help='ไม่ลบ session ที่หมดอายุ')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        carts = Cart.objects.filter(user__isnull=True, updated_at__lt=cutoff)
+        checkout_keys = CheckoutIdempotencyKey.objects.filter(expires_at__lt=timezone.now())
+        sessions = Session.objects.filter(expire_date__lt=timezone.now())
+        purge_sessions = not options['skip_sessions'] and settings.SESSION_ENGINE in (
+            'django.contrib.sessions.backends.db',
+            'django.contrib.sessions.backends.cached_db',
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f"Abandoned guest carts: {carts.count()}")
+            self.stdout.write(f"Expired checkout keys: {checkout_keys.count()}")
+            if purge_sessions:
+                self.stdout.write(f"Expired sessions: {sessions.count()}")
+            return
+
+        self._purge(
+            'guest carts', carts, options['batch_size'], options['sleep'],
+            # ลบ CartItem ก่อนใน batch เดียวกัน เพื่อให้การลบ Cart ไม่ต้องไล่ CASCADE ทีละแถว
+            # (เฉพาะของ Cart ที่ยังเข้าเงื่อนไขอยู่ ณ ตอนลบ)
+            before_delete=lambda batch: CartItem.objects.filter(cart__in=batch).delete(),
+        )
+        self._purge('checkout keys', checkout_keys, options['batch_size'], options['sleep'])
+        if purge_sessions:
+            self._purge('expired sessions', sessions, options['batch_size'], options['sleep'])
+
+    def _purge(self, label, queryset, batch_size, sleep, before_delete=None):
+        """
+        ลบแถวตาม queryset ทีละ batch (ตาม primary key) พร้อมรายงานความคืบหน้า
+        การลบใช้เงื่อนไขของ queryset ซ้ำอีกครั้ง แถวที่ถูกแก้ไขหลังจากเลือก id (เช่น Guest เพิ่มสินค้าลงตะกร้า) จึงไม่ถูกลบ
+        before_delete(batch) ได้ queryset ของ batch นั้น (ที่ยังเข้าเงื่อนไข) เพื่อลบแถวที่อ้างถึงก่อน
+        """
+        total, batches = 0, 0
+        started = time.monotonic()
+
+        while True:
+            with transaction.atomic():
+                # select_for_update: ฐานข้อมูลที่รองรับจะล็อกแถวไว้ การแก้ไขพร้อมกันต้องรอจนลบเสร็จ
+                ids = list(queryset.select_for_update().values_list('pk', flat=True)[:batch_size])
+                if not ids:
+                    break
+                batch = queryset.filter(pk__in=ids)
+                if before_delete is not None:
+                    before_delete(batch)
+                deleted = batch.delete()[1].get(queryset.model._meta.label, 0)
+
+            total += deleted
+            batches += 1
+            self.stdout.write(f"  {label}: batch {batches} deleted {deleted} (total {total}, {time.monotonic() - started:.1f}s)")
+            if sleep:
+                time.sleep(sleep)
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {total} {label} in {batches} batches."))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.inventory import release_expired_holds
+
+
+class Command(BaseCommand):
+    """
+    คืนการจองสต็อกในตะกร้าที่หมดอายุแล้ว (settings.CART_HOLD_TTL) กลับสู่สต็อกที่ขายได้
+    ควรตั้งให้รันเป็นระยะ (เช่น ทุก 1-5 นาที ผ่าน cron) เมื่อเปิด settings.CART_STOCK_HOLDS
+    """
+    help = 'Release expired cart stock holds in bounded batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='จำนวน hold ต่อ batch (ค่าเริ่มต้น 1000)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        released = release_expired_holds(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Released {released} expired stock holds in {time.monotonic() - started:.1f}s."
+        ))
@@ -0,0 +1,41 @@
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.jobs import claim_jobs, run_job
+
+
+class Command(BaseCommand):
+    """
+    Worker สำหรับคิวงานเบื้องหลัง (orders.jobs): รับงานทีละ batch ด้วย lease แล้วทำทีละงาน
+    รันได้หลาย process พร้อมกัน (แต่ละงานจะถูกรับโดย worker เดียวเท่านั้น)
+    """
+    help = 'Process queued background jobs (order emails, slip processing, ...).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='ทำงานที่พร้อมอยู่ทั้งหมดแล้วจบ (เหมาะกับ cron)')
+        parser.add_argument('--batch-size', type=int, default=10, help='จำนวนงานที่รับต่อครั้ง (ค่าเริ่มต้น 10)')
+        parser.add_argument('--sleep', type=float, default=2.0, help='หน่วงเวลา (วินาที) เมื่อไม่มีงานในคิว')
+        parser.add_argument('--lease', type=int, default=None, help='ระยะเวลาถือสิทธิ์งาน (วินาที) ค่าเริ่มต้นตาม JOB_LEASE_SECONDS')
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.stdout.write(f"Worker {worker} started.")
+
+        while True:
+            jobs = claim_jobs(worker, limit=options['batch_size'], lease=options['lease'])
+            if not jobs:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            for job in jobs:
+                succeeded = run_job(job, worker)
+                line = f"  job #{job.pk} {job.name} attempt {job.attempts}: {job.status} in {job.duration_ms}ms"
+                if succeeded:
+                    self.stdout.write(line)
+                else:
+                    self.stderr.write(f"{line}\n{job.last_error.strip().splitlines()[-1]}")
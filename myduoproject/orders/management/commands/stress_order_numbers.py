@@ -0,0 +1,76 @@
+import multiprocessing
+import time
+import uuid
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _generate(partition, count, block_size, rollback_every):
+    """
+    ทำงานใน process ลูก: ขอเลขคำสั่งซื้อ count ครั้ง (แต่ละครั้งอยู่ใน transaction ของตัวเอง เหมือนตอน checkout)
+    คืนเฉพาะเลขของ transaction ที่ commit แล้ว
+    """
+    import django
+    django.setup()
+    connections.close_all()  # ไม่ใช้ connection ที่ได้มาจาก process แม่
+
+    from orders.numbering import OrderNumberGenerator
+
+    generator = OrderNumberGenerator(block_size=block_size)
+    numbers = []
+    for i in range(count):
+        try:
+            with transaction.atomic():
+                number = generator.next(partition)
+                if rollback_every and i % rollback_every == 0:
+                    raise _Rollback
+        except _Rollback:
+            continue
+        numbers.append(number)
+    connections.close_all()
+    return numbers
+
+
+class Command(BaseCommand):
+    """
+    ทดสอบ orders.numbering ภายใต้การใช้งานพร้อมกันหลาย process
+    ใช้ partition ชั่วคราวแยกจากเลขคำสั่งซื้อจริง (และลบทิ้งเมื่อจบ) จึงรันบนฐานข้อมูลที่ใช้งานอยู่ได้
+    """
+    help = 'Generate order numbers from several processes at once and verify they never collide.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8, help='จำนวน process ที่ขอเลขพร้อมกัน (ค่าเริ่มต้น 8)')
+        parser.add_argument('--count', type=int, default=500, help='จำนวนเลขที่แต่ละ process ขอ (ค่าเริ่มต้น 500)')
+        parser.add_argument('--block-size', type=int, default=None, help='ขนาด block (ค่าเริ่มต้นตาม ORDER_NUMBER_BLOCK_SIZE)')
+        parser.add_argument('--rollback-every', type=int, default=0, help='rollback ทุก ๆ N ครั้ง เพื่อทดสอบว่า block ที่ถูกย้อนกลับจะไม่ถูกใช้ซ้ำ')
+
+    def handle(self, *args, **options):
+        from orders.models import OrderNumberCounter
+
+        partition = f"T{uuid.uuid4().hex[:12]}"
+        jobs = [(partition, options['count'], options['block_size'], options['rollback_every'])] * options['processes']
+
+        connections.close_all()
+        started = time.monotonic()
+        try:
+            with multiprocessing.Pool(options['processes']) as pool:
+                results = pool.starmap(_generate, jobs)
+            elapsed = time.monotonic() - started
+        finally:
+            OrderNumberCounter.objects.filter(partition=partition).delete()
+
+        numbers = [number for result in results for number in result]
+        duplicates = [number for number, seen in Counter(numbers).items() if seen > 1]
+        self.stdout.write(
+            f"{len(numbers)} numbers from {options['processes']} processes in {elapsed:.2f}s "
+            f"({len(numbers) / elapsed:.0f}/s)"
+        )
+        if duplicates:
+            raise CommandError(f"{len(duplicates)} duplicate order numbers, e.g. {duplicates[:5]}")
+        self.stdout.write(self.style.SUCCESS("No duplicates."))
@@ -0,0 +1,28 @@
+from django.conf import settings
+
+
+class CartCookieMiddleware:
+    """
+    เขียน/ลบ cookie ที่ cart storage backend ร้องขอระหว่าง request ลงใน response
+    (ใช้กับ CacheCartStorage และ SignedCookieCartStorage)
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        for name, value in getattr(request, '_cart_cookies', {}).items():
+            if value is None:
+                response.delete_cookie(name, samesite='Lax')
+            else:
+                response.set_cookie(
+                    name,
+                    value,
+                    max_age=getattr(settings, 'CART_COOKIE_AGE', 60 * 60 * 24 * 30),
+                    secure=settings.SESSION_COOKIE_SECURE,
+                    httponly=True,
+                    samesite='Lax',
+                )
+        return response
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-17 11:29
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import DecimalField, F, Sum
+
+
+def backfill_cart_totals(apps, schema_editor):
+    Cart = apps.get_model('orders', 'Cart')
+    for cart in Cart.objects.all().iterator():
+        totals = cart.items.aggregate(
+            item_count=Sum('quantity'),
+            subtotal=Sum(F('quantity') * F('price_at_addition'), output_field=DecimalField()),
+        )
+        cart.item_count = totals['item_count'] or 0
+        cart.subtotal = (totals['subtotal'] or Decimal('0.00')).quantize(Decimal('0.00'))
+        cart.grand_total = max(Decimal('0.00'), cart.subtotal - cart.discount_amount)
+        cart.save(update_fields=['item_count', 'subtotal', 'grand_total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_alter_order_grand_total_alter_order_total_amount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='grand_total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='ยอดรวมสุทธิ'),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='จำนวนชิ้นทั้งหมด'),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='ยอดรวมสินค้า'),
+        ),
+        migrations.RunPython(backfill_cart_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-17 11:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_cart_indexes'),
+        ('products', '0003_productvariant_reserved'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('holder', models.CharField(max_length=64, verbose_name='ตะกร้าที่จอง')),
+                ('quantity', models.PositiveIntegerField(verbose_name='จำนวน')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='หมดอายุเมื่อ')),
+                ('variant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='products.productvariant', verbose_name='ตัวเลือกสินค้า')),
+            ],
+            options={
+                'verbose_name': 'การจองสต็อก',
+                'verbose_name_plural': 'การจองสต็อก',
+                'unique_together': {('holder', 'variant')},
+            },
+        ),
+    ]
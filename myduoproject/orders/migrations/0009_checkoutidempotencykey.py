@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 11:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_stockhold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckoutIdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Idempotency Key')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='หมดอายุเมื่อ')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_keys', to='orders.order', verbose_name='คำสั่งซื้อ')),
+            ],
+            options={
+                'verbose_name': 'Idempotency Key ของการชำระเงิน',
+                'verbose_name_plural': 'Idempotency Key ของการชำระเงิน',
+            },
+        ),
+    ]
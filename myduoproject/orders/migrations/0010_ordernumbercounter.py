@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-17 11:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_checkoutidempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderNumberCounter',
+            fields=[
+                ('partition', models.CharField(max_length=16, primary_key=True, serialize=False, verbose_name='ช่วงของเลข')),
+                ('next_value', models.PositiveBigIntegerField(default=1, verbose_name='เลขถัดไปที่ยังไม่ถูกจอง')),
+            ],
+            options={
+                'verbose_name': 'ตัวนับเลขคำสั่งซื้อ',
+                'verbose_name_plural': 'ตัวนับเลขคำสั่งซื้อ',
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-17 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_ordernumbercounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='ชื่องาน')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='ข้อมูลของงาน')),
+                ('status', models.CharField(choices=[('PENDING', 'รอดำเนินการ'), ('RUNNING', 'กำลังทำงาน'), ('DONE', 'สำเร็จ'), ('FAILED', 'ล้มเหลว')], default='PENDING', max_length=10, verbose_name='สถานะ')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='จำนวนครั้งที่ทำไปแล้ว')),
+                ('max_attempts', models.PositiveIntegerField(default=5, verbose_name='จำนวนครั้งสูงสุด')),
+                ('run_at', models.DateTimeField(verbose_name='ทำได้ตั้งแต่')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='worker ที่รับงาน')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='ถือสิทธิ์ถึง')),
+                ('last_error', models.TextField(blank=True, verbose_name='ข้อผิดพลาดล่าสุด')),
+                ('duration_ms', models.PositiveIntegerField(blank=True, null=True, verbose_name='เวลาที่ใช้ครั้งล่าสุด (ms)')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='เสร็จเมื่อ')),
+            ],
+            options={
+                'verbose_name': 'งานเบื้องหลัง',
+                'verbose_name_plural': 'งานเบื้องหลัง',
+                'indexes': [models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 11:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='payment_slip_preview',
+            field=models.FileField(blank=True, null=True, upload_to='payment_slips/previews/', verbose_name='ภาพตัวอย่างสลิป'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='payment_slip_sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='SHA-256 ของสลิป'),
+        ),
+    ]
@@ -2,9 +2,7 @@ from django.db import models
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from decimal import Decimal
-import uuid
-import time
-from promotions.models import Promotion, DiscountType # นำเข้า Promotion จาก app promotions
+from promotions.models import Promotion # นำเข้า Promotion จาก app promotions
 from django.contrib.auth import get_user_model # เพื่อใช้ User model
 from django.http import HttpRequest
 # *** ไม่ต้อง Import ProductVariant ที่นี่ เพื่อหลีกเลี่ยง Conflict ***
@@ -35,6 +33,20 @@ class Cart(models.Model):
     promotion_code = models.CharField(max_length=50, blank=True, null=True)
     discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
 
+    # ยอดรวมที่เก็บไว้ล่วงหน้า (Denormalized) อัปเดตแบบ incremental โดย CartManager
+    # เพื่อให้หน้า badge/summary/checkout อ่านจากแถวเดียวโดยไม่ต้องรวมยอด CartItem ทุกครั้ง
+    item_count = models.PositiveIntegerField(default=0, verbose_name=_("จำนวนชิ้นทั้งหมด"))
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'), verbose_name=_("ยอดรวมสินค้า"))
+    grand_total = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'), verbose_name=_("ยอดรวมสุทธิ"))
+
+    class Meta:
+        indexes = [
+            # ค้นหา Guest Cart จาก session
+            models.Index(fields=['session_key'], name='cart_session_key_idx'),
+            # ใช้กับคำสั่ง purge_abandoned_carts (เฉพาะ Guest Cart)
+            models.Index(fields=['updated_at'], name='cart_guest_updated_idx', condition=models.Q(user__isnull=True)),
+        ]
+
     def __str__(self):
         if self.user:
             return f"Cart of {self.user.username}"
@@ -42,18 +54,33 @@ class Cart(models.Model):
 
     @property
     def total_subtotal(self):
-        """คำนวณยอดรวมของสินค้าทั้งหมดก่อนหักส่วนลด"""
-        return sum(item.subtotal for item in self.items.all()) if self.items.exists() else Decimal('0.00')
+        """ยอดรวมของสินค้าทั้งหมดก่อนหักส่วนลด (อ่านจากคอลัมน์ subtotal ที่เก็บไว้)"""
+        return self.subtotal
 
-    @property
-    def grand_total(self):
-        """คำนวณยอดรวมสุทธิหลังหักส่วนลดแล้ว"""
-        subtotal = self.total_subtotal
-        return max(Decimal('0.00'), subtotal - self.discount_amount)
-    
     def is_empty(self):
         """ตรวจสอบว่าตะกร้ามีรายการสินค้าหรือไม่"""
-        return self.items.count() == 0
+        return self.item_count == 0
+
+    def apply_discount(self, code, amount: Decimal):
+        """บันทึกโค้ดส่วนลดและคำนวณ grand_total ใหม่จาก subtotal ที่เก็บไว้"""
+        self.promotion_code = code
+        self.discount_amount = amount
+        self.grand_total = max(Decimal('0.00'), self.subtotal - amount)
+        self.save(update_fields=['promotion_code', 'discount_amount', 'grand_total', 'updated_at'])
+
+    def recalculate_totals(self, save=True):
+        """
+        คำนวณยอดรวมใหม่ทั้งหมดจาก CartItem (ใช้แก้ไขกรณีค่าที่เก็บไว้คลาดเคลื่อน)
+        """
+        totals = self.items.aggregate(
+            item_count=models.Sum('quantity'),
+            subtotal=models.Sum(models.F('quantity') * models.F('price_at_addition'), output_field=models.DecimalField()),
+        )
+        self.item_count = totals['item_count'] or 0
+        self.subtotal = (totals['subtotal'] or Decimal('0.00')).quantize(Decimal('0.00'))
+        self.grand_total = max(Decimal('0.00'), self.subtotal - self.discount_amount)
+        if save:
+            self.save(update_fields=['item_count', 'subtotal', 'grand_total', 'updated_at'])
 
 
 class CartItem(models.Model):
@@ -105,13 +132,31 @@ class CartItem(models.Model):
             return self.variant.size
         except AttributeError:
             return ""
+class StockHold(models.Model):
+    """
+    การจองสต็อกชั่วคราว (มี TTL) ของสินค้าที่อยู่ในตะกร้า
+    holder คือ key ของตะกร้าที่จอง (ดู get_hold_key ใน orders.storage)
+    ผลรวมของ hold ที่ยังไม่ถูกปล่อยจะถูกเก็บไว้ใน ProductVariant.reserved
+    """
+    variant = models.ForeignKey(f'{PRODUCT_APP_NAME}.ProductVariant', on_delete=models.CASCADE, related_name='holds', verbose_name=_("ตัวเลือกสินค้า"))
+    holder = models.CharField(max_length=64, verbose_name=_("ตะกร้าที่จอง"))
+    quantity = models.PositiveIntegerField(verbose_name=_("จำนวน"))
+    expires_at = models.DateTimeField(db_index=True, verbose_name=_("หมดอายุเมื่อ"))
+
+    class Meta:
+        verbose_name = _("การจองสต็อก")
+        verbose_name_plural = _("การจองสต็อก")
+        unique_together = ('holder', 'variant')
+
+    def __str__(self):
+        return f"{self.holder}: {self.quantity} x {self.variant_id}"
 # --- END CART MODELS ---
 
 
 # --- HELPER FUNCTIONS FOR PROMOTION VIEWS ---
 
-# NOTE: ฟังก์ชัน get_active_cart และ calculate_discount_amount 
-# ควรอยู่ในไฟล์ utilities.py หรือ services.py มากกว่า models.py แต่ถูกคงไว้ตามต้นฉบับ
+# NOTE: ฟังก์ชัน get_active_cart ควรอยู่ในไฟล์ utilities.py หรือ services.py มากกว่า models.py แต่ถูกคงไว้ตามต้นฉบับ
+# (การคำนวณส่วนลดย้ายไปอยู่ที่ orders.pricing)
 def get_active_cart(request: HttpRequest) -> Cart | None:
     """ 
     Retrieves the active cart, prioritizing logged-in user's cart, 
@@ -134,22 +179,23 @@ def get_active_cart(request: HttpRequest) -> Cart | None:
             return None
     return None
 
-def calculate_discount_amount(subtotal: Decimal, promotion: Promotion) -> Decimal:
-    """ 
-    Calculates the discount amount based on the promotion rules and the cart subtotal.
+# --- ORDER MODELS ---
+
+class OrderNumberCounter(models.Model):
     """
-    discount = Decimal('0.00')
-    value = promotion.discount_value
-    
-    if promotion.discount_type == DiscountType.PERCENTAGE:
-        calculated_discount = subtotal * (value / 100)
-        discount = calculated_discount
-    elif promotion.discount_type == DiscountType.FIXED_AMOUNT:
-        discount = value
-    
-    return min(discount, subtotal)
+    ตัวนับเลขคำสั่งซื้อแยกตามวัน (partition = 'YYYYMMDD')
+    แต่ละ process จะจองเลขเป็นช่วง (block) ด้วย UPDATE เดียว แล้วแจกเลขในหน่วยความจำ (ดู orders.numbering)
+    """
+    partition = models.CharField(max_length=16, primary_key=True, verbose_name=_("ช่วงของเลข"))
+    next_value = models.PositiveBigIntegerField(default=1, verbose_name=_("เลขถัดไปที่ยังไม่ถูกจอง"))
+
+    class Meta:
+        verbose_name = _("ตัวนับเลขคำสั่งซื้อ")
+        verbose_name_plural = _("ตัวนับเลขคำสั่งซื้อ")
+
+    def __str__(self):
+        return f"{self.partition}: {self.next_value}"
 
-# --- ORDER MODELS ---
 
 class Order(models.Model):
     """
@@ -187,6 +233,9 @@ class Order(models.Model):
         blank=True, 
         verbose_name='สลิปหลักฐานการโอนเงิน'
     )
+    # SHA-256 ของสลิป (ไฟล์ถูกเก็บแบบ content-addressed ดู orders.uploads) และภาพตัวอย่างที่ worker สร้างให้
+    payment_slip_sha256 = models.CharField(max_length=64, blank=True, db_index=True, verbose_name='SHA-256 ของสลิป')
+    payment_slip_preview = models.FileField(upload_to='payment_slips/previews/', null=True, blank=True, verbose_name='ภาพตัวอย่างสลิป')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -201,7 +250,9 @@ class Order(models.Model):
     def save(self, *args, **kwargs):
         """Generate a unique order number if it's a new record."""
         if not self.order_number:
-            self.order_number = f"{time.strftime('%Y%m%d')}-{uuid.uuid4().hex[:4].upper()}"
+            # เลขแบบ YYYYMMDD-000123 ไม่ซ้ำแน่นอน (ไม่ต้องสุ่มแล้วลองใหม่) ดู orders.numbering
+            from .numbering import next_order_number
+            self.order_number = next_order_number()
         super().save(*args, **kwargs)
 
 
@@ -229,3 +280,61 @@ class OrderItem(models.Model):
         
     def __str__(self):
         return f"{self.quantity} x {self.product_name} ({self.variant_size})"
+
+
+class CheckoutIdempotencyKey(models.Model):
+    """
+    key ที่ฟอร์มชำระเงินส่งมาพร้อมกับ POST (สร้างใหม่ทุกครั้งที่เปิดหน้าชำระเงิน)
+    ใช้จับคู่ key -> คำสั่งซื้อ เพื่อให้การกดส่งซ้ำ/retry ได้คำสั่งซื้อเดิมแทนการสร้างใหม่
+    """
+    key = models.CharField(max_length=64, unique=True, verbose_name=_("Idempotency Key"))
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='idempotency_keys', verbose_name=_("คำสั่งซื้อ"))
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True, verbose_name=_("หมดอายุเมื่อ"))
+
+    class Meta:
+        verbose_name = _("Idempotency Key ของการชำระเงิน")
+        verbose_name_plural = _("Idempotency Key ของการชำระเงิน")
+
+    def __str__(self):
+        return f"{self.key} -> {self.order_id}"
+
+
+class JobStatus(models.TextChoices):
+    PENDING = 'PENDING', _('รอดำเนินการ')
+    RUNNING = 'RUNNING', _('กำลังทำงาน')
+    DONE = 'DONE', _('สำเร็จ')
+    FAILED = 'FAILED', _('ล้มเหลว')
+
+
+class Job(models.Model):
+    """
+    งานเบื้องหลังที่รอให้ worker (manage.py run_jobs) ทำ เช่น ส่งอีเมลยืนยันคำสั่งซื้อ
+    ถูกบันทึกใน transaction เดียวกับคำสั่งซื้อ worker จึงเห็นงานหลังจากคำสั่งซื้อ commit แล้วเท่านั้น (ดู orders.jobs)
+    """
+    name = models.CharField(max_length=100, verbose_name=_("ชื่องาน"))
+    payload = models.JSONField(default=dict, blank=True, verbose_name=_("ข้อมูลของงาน"))
+    status = models.CharField(max_length=10, choices=JobStatus.choices, default=JobStatus.PENDING, verbose_name=_("สถานะ"))
+
+    attempts = models.PositiveIntegerField(default=0, verbose_name=_("จำนวนครั้งที่ทำไปแล้ว"))
+    max_attempts = models.PositiveIntegerField(default=5, verbose_name=_("จำนวนครั้งสูงสุด"))
+    run_at = models.DateTimeField(verbose_name=_("ทำได้ตั้งแต่"))
+
+    # lease: worker ที่รับงานไปถือสิทธิ์ถึง locked_until ถ้าเกินเวลานี้ worker อื่นรับงานต่อได้
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name=_("worker ที่รับงาน"))
+    locked_until = models.DateTimeField(null=True, blank=True, verbose_name=_("ถือสิทธิ์ถึง"))
+
+    last_error = models.TextField(blank=True, verbose_name=_("ข้อผิดพลาดล่าสุด"))
+    duration_ms = models.PositiveIntegerField(null=True, blank=True, verbose_name=_("เวลาที่ใช้ครั้งล่าสุด (ms)"))
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name=_("เสร็จเมื่อ"))
+
+    class Meta:
+        verbose_name = _("งานเบื้องหลัง")
+        verbose_name_plural = _("งานเบื้องหลัง")
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.name} ({self.status})"
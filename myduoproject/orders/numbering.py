@@ -0,0 +1,78 @@
+"""
+ตัวสร้างหมายเลขคำสั่งซื้อ (order_number) แบบไม่ซ้ำ อ่านง่าย และไม่ต้องสุ่มแล้วลองใหม่
+
+รูปแบบ: YYYYMMDD-NNNNNN (NNNNNN คือลำดับภายในวัน เริ่มที่ 000001 และยาวขึ้นได้ถ้าเกิน 6 หลัก)
+
+แต่ละ process จองเลขเป็นช่วง (block) ขนาด ORDER_NUMBER_BLOCK_SIZE จาก OrderNumberCounter
+ด้วย UPDATE เดียว แล้วแจกเลขจากหน่วยความจำ จึงแตะฐานข้อมูลเพียงครั้งเดียวต่อ block
+เลขอาจไม่ต่อเนื่องระหว่าง process (แต่ละ process ถือ block ของตัวเอง) แต่จะไม่ซ้ำกันเสมอ
+
+block ที่จองภายใน transaction จะถูกใช้ต่อหลังจาก transaction นั้น commit แล้วเท่านั้น
+(ถ้า rollback การจองในฐานข้อมูลจะถูกย้อนกลับ และ process อื่นอาจได้ช่วงเดียวกันไป)
+"""
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OrderNumberCounter
+
+DEFAULT_BLOCK_SIZE = 20
+
+
+class OrderNumberGenerator:
+    """แจกเลขจาก block ที่จองไว้ของ process นี้ (thread-safe)"""
+
+    def __init__(self, block_size: int = None):
+        self.block_size = block_size
+        self._lock = threading.RLock()
+        self._partition = None
+        self._next = self._end = 0
+        # block ที่ยังไม่ commit จะใช้ต่อไม่ได้ (ดูคำอธิบายด้านบน)
+        self._confirmed = False
+
+    def _get_block_size(self) -> int:
+        return self.block_size or getattr(settings, 'ORDER_NUMBER_BLOCK_SIZE', DEFAULT_BLOCK_SIZE)
+
+    def _allocate(self, partition: str):
+        """จองช่วงเลข [start, end) ถัดไปของ partition ด้วย UPDATE เดียว (สร้างแถวถ้ายังไม่มี)"""
+        size = self._get_block_size()
+        counters = OrderNumberCounter.objects.filter(partition=partition)
+        with transaction.atomic():
+            if not counters.update(next_value=F('next_value') + size):
+                OrderNumberCounter.objects.get_or_create(partition=partition)
+                counters.update(next_value=F('next_value') + size)
+            end = counters.values_list('next_value', flat=True).get()
+
+        self._partition = partition
+        self._next, self._end = end - size, end
+        self._confirmed = False
+        block = (partition, end)
+
+        def confirm():
+            with self._lock:
+                if (self._partition, self._end) == block:
+                    self._confirmed = True
+
+        # นอก transaction callback จะถูกเรียกทันที
+        transaction.on_commit(confirm)
+
+    def next(self, partition: str = None) -> str:
+        """คืนหมายเลขคำสั่งซื้อถัดไป (partition ค่าเริ่มต้นคือวันที่ปัจจุบัน YYYYMMDD)"""
+        partition = partition or timezone.localdate().strftime('%Y%m%d')
+        with self._lock:
+            if partition != self._partition or self._next >= self._end or not self._confirmed:
+                self._allocate(partition)
+            value = self._next
+            self._next += 1
+        return f"{partition}-{value:06d}"
+
+
+order_number_generator = OrderNumberGenerator()
+
+
+def next_order_number(partition: str = None) -> str:
+    """หมายเลขคำสั่งซื้อถัดไปจาก generator ของ process นี้"""
+    return order_number_generator.next(partition)
@@ -0,0 +1,176 @@
+"""
+Engine กลางสำหรับคำนวณราคาและส่วนลดของตะกร้า (ใช้ร่วมกันทุก view แทนการคำนวณซ้ำในแต่ละที่)
+
+- promotion_error / discount_for: กฎของโปรโมชั่น (สถานะ วันที่ จำนวนครั้ง ยอดขั้นต่ำ) และการคำนวณส่วนลด
+- price_subtotal / price_lines: ราคาของตะกร้าหนึ่งใบ (ระดับตะกร้า หรือแยกรายบรรทัดพร้อมกระจายส่วนลด)
+- current_discount / discount_update: ส่วนลดของโค้ดที่ใส่ไว้แล้วเมื่อยอดตะกร้าเปลี่ยน (ดู orders.storage)
+
+การคำนวณหลายตะกร้าพร้อมกัน (batch) ทำในฐานข้อมูล ไม่วนลูปใน Python:
+- discount_expression: ส่วนลดเป็น SQL expression (ตรงกับ current_discount) ใช้กับ QuerySet.update()/annotate() ได้ทุกแถว
+- reprice_carts: คำนวณส่วนลดใหม่ให้ทุก Cart ที่ใช้โค้ดหนึ่ง ๆ ด้วย UPDATE เดียว
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db.models import Case, DecimalField, F, Value, When
+from django.db.models.functions import Greatest, Least, Round
+from django.db.models.lookups import LessThan
+from django.utils import timezone
+
+from promotions.models import DiscountType
+
+from .models import Cart
+
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+
+# เหตุผลที่ใช้โปรโมชั่นไม่ได้
+REASON_NOT_FOUND = 'not_found'
+REASON_INVALID = 'invalid'          # ถูกปิด หมดอายุ/ยังไม่เริ่ม หรือถูกใช้ครบจำนวนแล้ว
+REASON_MIN_ORDER = 'min_order'      # ยอดสั่งซื้อไม่ถึงขั้นต่ำ
+
+
+def _money(value) -> Decimal:
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def promotion_error(promotion, subtotal: Decimal) -> str | None:
+    """ตรวจว่าโปรโมชั่นใช้กับยอดนี้ได้หรือไม่ (None = ใช้ได้ ไม่เช่นนั้นคืน REASON_*)"""
+    if promotion is None:
+        return REASON_NOT_FOUND
+    if not promotion.is_valid:
+        return REASON_INVALID
+    if subtotal < promotion.min_order_amount:
+        return REASON_MIN_ORDER
+    return None
+
+
+def discount_for(promotion, subtotal: Decimal) -> Decimal:
+    """ส่วนลดของโปรโมชั่นสำหรับยอดนี้ (ไม่เกินยอดรวม และไม่ตรวจเงื่อนไข ดู promotion_error)"""
+    if promotion.discount_type == DiscountType.PERCENTAGE:
+        percent = min(max(promotion.discount_value, ZERO), Decimal(100))
+        discount = subtotal * percent / Decimal(100)
+    elif promotion.discount_type == DiscountType.FIXED_AMOUNT:
+        discount = max(promotion.discount_value, ZERO)
+    else:
+        discount = ZERO
+    return _money(min(discount, subtotal))
+
+
+class LinePrice:
+    """ราคาของรายการหนึ่งบรรทัด พร้อมส่วนลดที่ถูกกระจายมาตามสัดส่วนยอด"""
+
+    def __init__(self, item, unit_price: Decimal, quantity: int):
+        self.item = item
+        self.unit_price = unit_price
+        self.quantity = quantity
+        self.total = _money(unit_price * quantity)
+        self.discount = ZERO
+
+    @property
+    def net_total(self) -> Decimal:
+        return self.total - self.discount
+
+
+class CartPrice:
+    """ผลการคำนวณราคาของตะกร้าหนึ่งใบ"""
+
+    def __init__(self, subtotal: Decimal, promotion=None, lines=None):
+        self.lines = lines or []
+        self.subtotal = _money(subtotal)
+        self.promotion = promotion
+        self.error = promotion_error(promotion, self.subtotal) if promotion is not None else None
+        self.discount_amount = discount_for(promotion, self.subtotal) if promotion is not None and not self.error else ZERO
+        self.grand_total = self.subtotal - self.discount_amount
+        self._allocate_discount()
+
+    @property
+    def is_applied(self) -> bool:
+        return self.promotion is not None and self.error is None
+
+    def _allocate_discount(self):
+        """กระจายส่วนลดระดับตะกร้าลงแต่ละบรรทัดตามสัดส่วน (เศษสตางค์ไปอยู่ที่บรรทัดสุดท้าย)"""
+        if not self.lines or not self.discount_amount or not self.subtotal:
+            return
+        remaining = self.discount_amount
+        for line in self.lines[:-1]:
+            line.discount = _money(self.discount_amount * line.total / self.subtotal)
+            remaining -= line.discount
+        self.lines[-1].discount = remaining
+
+
+def price_subtotal(subtotal: Decimal, promotion=None) -> CartPrice:
+    """ราคาระดับตะกร้าจากยอดรวม (ใช้เมื่อไม่ต้องการรายบรรทัด เช่น ยอดที่เก็บไว้ใน Cart)"""
+    return CartPrice(subtotal, promotion)
+
+
+def price_lines(items, promotion=None) -> CartPrice:
+    """ราคาของรายการสินค้า (CartItem หรือ object ที่มี price_at_addition/quantity) พร้อมส่วนลดรายบรรทัด"""
+    lines = [LinePrice(item, item.price_at_addition, item.quantity) for item in items]
+    subtotal = sum((line.total for line in lines), ZERO)
+    return CartPrice(subtotal, promotion, lines)
+
+
+def is_live(promotion, now=None) -> bool:
+    """
+    โปรโมชั่นยังเปิดใช้และอยู่ในช่วงเวลาหรือไม่ (ไม่ตรวจจำนวนครั้งที่ใช้ ซึ่งนับจริงตอน checkout ด้วย Promotion.redeem)
+    ใช้ตอนคำนวณส่วนลดของตะกร้าที่ใส่โค้ดไว้แล้วใหม่
+    """
+    now = now or timezone.now()
+    return promotion.is_active and promotion.valid_from <= now <= promotion.valid_to
+
+
+def current_discount(promotion, subtotal: Decimal, now=None) -> Decimal | None:
+    """
+    ส่วนลดของโค้ดที่ใส่ไว้แล้วเมื่อยอดตะกร้าเปลี่ยน: None = โค้ดใช้ไม่ได้แล้ว (ควรนำออกจากตะกร้า)
+    ถ้ายอดต่ำกว่าขั้นต่ำจะได้ 0 แต่ยังคงโค้ดไว้ (ได้ส่วนลดคืนเมื่อยอดถึงขั้นต่ำอีกครั้ง)
+    """
+    if promotion is None or not is_live(promotion, now):
+        return None
+    if subtotal < promotion.min_order_amount:
+        return ZERO
+    return discount_for(promotion, subtotal)
+
+
+def discount_expression(promotion, subtotal=F('subtotal')):
+    """
+    SQL expression ของส่วนลด (ตรงกับ current_discount) คำนวณทุกแถวในคำสั่งเดียว
+    subtotal: expression ของยอดรวม (ค่าเริ่มต้นคือคอลัมน์ Cart.subtotal) เช่น
+    Cart.objects.annotate(discount=discount_expression(promotion)) หรือใช้ใน update() (ดู reprice_carts)
+    """
+    output_field = DecimalField(max_digits=12, decimal_places=2)
+    if promotion.discount_type == DiscountType.PERCENTAGE:
+        percent = min(max(promotion.discount_value, ZERO), Decimal(100))
+        discount = Round(subtotal * Value(percent / Decimal(100)), 2, output_field=output_field)
+    elif promotion.discount_type == DiscountType.FIXED_AMOUNT:
+        discount = Value(max(promotion.discount_value, ZERO), output_field=output_field)
+    else:
+        discount = Value(ZERO, output_field=output_field)
+    return Case(
+        When(LessThan(subtotal, Value(promotion.min_order_amount)), then=Value(ZERO, output_field=output_field)),
+        default=Least(discount, subtotal, output_field=output_field),
+        output_field=output_field,
+    )
+
+
+def discount_update(promotion, subtotal=F('subtotal'), now=None) -> dict:
+    """
+    ค่าสำหรับ QuerySet.update() ที่คำนวณ discount_amount และ grand_total ของ Cart จาก subtotal (expression)
+    ถ้าโปรโมชั่นไม่มีอยู่หรือใช้ไม่ได้แล้ว (ถูกปิด/หมดอายุ) จะนำโค้ดออก
+    """
+    if promotion is None or not is_live(promotion, now):
+        return {'promotion_code': None, 'discount_amount': ZERO, 'grand_total': subtotal}
+    discount = discount_expression(promotion, subtotal)
+    return {'discount_amount': discount, 'grand_total': Greatest(subtotal - discount, Value(ZERO))}
+
+
+def reprice_carts(promotion) -> int:
+    """
+    คำนวณส่วนลดใหม่ให้ทุก Cart ในฐานข้อมูลที่ใช้โค้ดนี้ด้วย UPDATE เดียว (เช่น หลังแก้ไขโปรโมชั่นในแอดมิน)
+    ถ้าโปรโมชั่นใช้ไม่ได้แล้ว (ถูกปิด/หมดอายุ) จะนำโค้ดออกจากตะกร้า
+    (ตะกร้าใน cache/cookie จะถูกคำนวณใหม่เมื่อมีการแก้ไขตะกร้าครั้งถัดไป)
+    """
+    now = timezone.now()
+    return Cart.objects.filter(promotion_code=promotion.code).update(
+        **discount_update(promotion, now=now),
+        updated_at=now,
+    )
@@ -0,0 +1,24 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from promotions.models import Promotion
+
+from .cart import merge_guest_cart
+from .pricing import reprice_carts
+
+
+@receiver(user_logged_in)
+def merge_guest_cart_on_login(sender, request, user, **kwargs):
+    """รวม Guest Cart เข้าสู่ Cart ของผู้ใช้ครั้งเดียวเมื่อเข้าสู่ระบบ"""
+    if request is None or not hasattr(request, 'session'):
+        return
+    merge_guest_cart(request, user)
+
+
+@receiver(post_save, sender=Promotion)
+def reprice_carts_on_promotion_change(sender, instance, created, **kwargs):
+    """คำนวณส่วนลดของตะกร้าที่ใช้โค้ดนี้อยู่ใหม่ทันทีเมื่อโปรโมชั่นถูกแก้ไข (เช่น ผ่าน PromotionAdmin)"""
+    if created or kwargs.get('raw'):
+        return
+    reprice_carts(instance)
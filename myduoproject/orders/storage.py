@@ -0,0 +1,684 @@
+"""
+Backend สำหรับเก็บข้อมูลตะกร้าสินค้า (เลือกได้ผ่าน settings.CART_STORAGE)
+
+- DatabaseCartStorage: ตาราง Cart/CartItem เดิม (ค่าเริ่มต้น และใช้กับผู้ใช้ที่ล็อกอินเสมอ)
+- CacheCartStorage: เก็บตะกร้าของ Guest ใน Django cache โดยอ้างอิงด้วย token ใน cookie
+- SignedCookieCartStorage: เก็บตะกร้าขนาดเล็กของ Guest ใน cookie ที่เซ็นชื่อแล้ว
+
+ทุก backend คืนค่าเป็น Cart/CartItem (สำหรับ backend ที่ไม่ใช้ฐานข้อมูลจะเป็น instance ที่ยังไม่ถูกบันทึก)
+เพื่อให้ views และ templates ใช้งานได้เหมือนเดิม
+"""
+import uuid
+from decimal import Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Greatest
+from django.http import HttpRequest
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from promotions.cache import get_promotion
+
+from .models import Cart, CartItem
+from .pricing import current_discount, discount_update
+
+ProductVariant = apps.get_model('products', 'ProductVariant')
+
+DEFAULT_CART_STORAGE = 'orders.storage.DatabaseCartStorage'
+
+# key ใน session ที่เก็บ id ของ Guest Cart (ใช้ตอนรวมตะกร้าหลังล็อกอิน)
+GUEST_CART_SESSION_KEY = 'guest_cart_id'
+
+
+def cart_hold_key(cart_id) -> str:
+    """key ของการจองสต็อก (orders.inventory) สำหรับ Cart ในฐานข้อมูล"""
+    return f'cart:{cart_id}'
+
+
+def get_cart_storage(request: HttpRequest, user=None, lazy: bool = True):
+    """
+    สร้าง storage ของตะกร้าสำหรับ request นี้
+    ผู้ใช้ที่ล็อกอินใช้ฐานข้อมูลเสมอ ส่วน Guest ใช้ backend ตาม settings.CART_STORAGE
+    """
+    if user is not None:
+        return DatabaseCartStorage(request, user=user, lazy=lazy)
+    storage_class = import_string(getattr(settings, 'CART_STORAGE', DEFAULT_CART_STORAGE))
+    return storage_class(request, lazy=lazy)
+
+
+class BaseCartStorage:
+    """Interface ร่วมของทุก backend ที่ CartManager เรียกใช้"""
+
+    def __init__(self, request: HttpRequest, user=None, lazy: bool = True):
+        self.request = request
+        self.user = user
+        self._cart = None
+
+    @property
+    def cart(self) -> Cart:
+        raise NotImplementedError
+
+    def is_persisted(self) -> bool:
+        """ตรวจสอบว่า Cart มีแถวอยู่ในฐานข้อมูลแล้วหรือไม่"""
+        return self.cart.pk is not None
+
+    def get_items(self):
+        raise NotImplementedError
+
+    def get_item(self, **lookup) -> CartItem:
+        raise NotImplementedError
+
+    def add(self, variant, quantity: int = 1, price_override: Decimal = None) -> CartItem:
+        raise NotImplementedError
+
+    def add_many(self, items: dict[int, int], validate_stock: bool = True) -> list[CartItem]:
+        raise NotImplementedError
+
+    def update_quantity(self, cart_item: CartItem, quantity: int):
+        raise NotImplementedError
+
+    def remove(self, cart_item: CartItem):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def apply_discount(self, code, amount: Decimal):
+        raise NotImplementedError
+
+    def revalidate(self) -> dict:
+        """
+        ตรวจสอบราคาและสต็อกของทุกรายการกับ ProductVariant ปัจจุบัน และอัปเดตราคาที่เปลี่ยนไป
+        คืนค่ารายงาน {'price_changes': [(item, old_price, new_price)], 'stock_issues': [(item, available)]}
+        """
+        raise NotImplementedError
+
+    def _build_revalidation_report(self, items) -> tuple[dict, list, Decimal]:
+        """เปรียบเทียบราคา/สต็อกของรายการ (ที่โหลด variant มาแล้ว) และปรับราคาใน object"""
+        report = {'price_changes': [], 'stock_issues': []}
+        changed, amount_delta = [], Decimal('0.00')
+        for item in items:
+            current_price = item.variant.current_price
+            if item.price_at_addition != current_price:
+                report['price_changes'].append((item, item.price_at_addition, current_price))
+                amount_delta += (current_price - item.price_at_addition) * item.quantity
+                item.price_at_addition = current_price
+                changed.append(item)
+            if item.variant.stock < item.quantity:
+                report['stock_issues'].append((item, max(item.variant.stock, 0)))
+        return report, changed, amount_delta
+
+    def merge_into(self, user):
+        """ย้ายตะกร้าของ Guest เข้าสู่ Cart ของ User (เรียกครั้งเดียวตอนล็อกอิน)"""
+        raise NotImplementedError
+
+    def get_hold_key(self, create: bool = False) -> str | None:
+        """
+        key ที่ใช้อ้างอิงการจองสต็อกของตะกร้านี้ (ดู orders.inventory.hold_stock)
+        create=False จะคืน None ถ้าตะกร้ายังไม่มีอยู่จริง
+        """
+        raise NotImplementedError
+
+    def _load_variants(self, items: dict[int, int], validate_stock: bool = True) -> dict:
+        """ดึงและตรวจสอบ variant พร้อมสต็อกของทุกรายการด้วย query เดียว"""
+        variants = ProductVariant.objects.in_bulk(list(items), field_name='pk')
+        missing = [variant_id for variant_id in items if variant_id not in variants]
+        if missing:
+            raise ValueError(f"ไม่พบตัวเลือกสินค้า: {', '.join(map(str, missing))}")
+        if validate_stock:
+            short = [variants[variant_id] for variant_id, quantity in items.items() if variants[variant_id].stock < quantity]
+            if short:
+                raise ValueError(f"สินค้าไม่พอในสต็อก: {', '.join(str(variant.pk) for variant in short)}")
+        return variants
+
+
+# ----------------------------------------------------------------------
+# Database backend
+# ----------------------------------------------------------------------
+
+class DatabaseCartStorage(BaseCartStorage):
+    """เก็บตะกร้าในตาราง Cart/CartItem พร้อมยอดรวมที่อัปเดตแบบ incremental"""
+
+    def __init__(self, request: HttpRequest, user=None, lazy: bool = True):
+        """
+        lazy=True (ค่าเริ่มต้น): ไม่สร้าง session และแถว Cart จนกว่าจะมีการเขียนครั้งแรก (add)
+        การอ่านตะกร้าที่ยังไม่มีอยู่จะได้ Cart เปล่าที่ยังไม่ถูกบันทึก (ไม่มี query)
+        """
+        super().__init__(request, user=user, lazy=lazy)
+        if not lazy:
+            # หาหรือสร้าง Cart ทันที (พฤติกรรมเดิม)
+            self._cart = self._get_or_create_cart()
+
+    @property
+    def session_key(self):
+        return self.request.session.session_key
+
+    @property
+    def cart(self) -> Cart:
+        """Cart ปัจจุบัน (ถ้ายังไม่มีในฐานข้อมูลจะได้ Cart เปล่าที่ยังไม่ถูกบันทึก)"""
+        if self._cart is None:
+            self._cart = self._get_or_create_cart(create=False) or Cart(user=self.user)
+        return self._cart
+
+    def get_items(self):
+        """QuerySet ของรายการสินค้าพร้อม variant/product (ไม่ query ถ้ายังไม่มี Cart)"""
+        if not self.is_persisted():
+            return CartItem.objects.none()
+        return self.cart.items.select_related('variant__product')
+
+    def get_item(self, **lookup) -> CartItem:
+        return self.get_items().get(**lookup)
+
+    def _ensure_cart(self) -> Cart:
+        """สร้าง session และแถว Cart จริงเมื่อมีการเขียนครั้งแรก"""
+        if not self.is_persisted():
+            self._cart = self._get_or_create_cart()
+        return self._cart
+
+    def get_hold_key(self, create: bool = False) -> str | None:
+        if create:
+            return cart_hold_key(self._ensure_cart().pk)
+        if self._cart is None and not self.user:
+            # ใช้ id ที่เก็บไว้ใน session เพื่อไม่ต้อง query Cart
+            guest_cart_id = self.request.session.get(GUEST_CART_SESSION_KEY)
+            return cart_hold_key(guest_cart_id) if guest_cart_id else None
+        return cart_hold_key(self.cart.pk) if self.is_persisted() else None
+
+    def _get_or_create_cart(self, create: bool = True) -> Cart | None:
+        """Logic สำหรับดึงหรือสร้าง Cart (create=False จะคืน None แทนการสร้างใหม่)"""
+        if self.user:
+            # 2a. จัดการ Cart สำหรับผู้ใช้ที่ล็อกอิน
+            # NOTE: การรวม Guest Cart ทำครั้งเดียวตอนล็อกอิน (ดู merge_into และ orders.signals)
+            user_cart = Cart.objects.filter(user=self.user).first()
+            if not user_cart and create:
+                return Cart.objects.create(user=self.user)
+            return user_cart
+
+        else:
+            # 2b. จัดการ Cart สำหรับผู้มาเยือน (Guest)
+            if not create:
+                if not self.session_key:
+                    return None
+                return Cart.objects.filter(session_key=self.session_key, user__isnull=True).first()
+
+            # ตรวจสอบ session key และสร้างถ้าไม่มี (เฉพาะตอนเขียนเท่านั้น)
+            if not self.session_key:
+                self.request.session.create()
+            cart, created = Cart.objects.get_or_create(session_key=self.session_key, user__isnull=True)
+            # เก็บ id ไว้ใน session เพราะ session key จะถูกเปลี่ยนตอนล็อกอิน (cycle_key)
+            self.request.session[GUEST_CART_SESSION_KEY] = cart.pk
+            return cart
+
+    def _apply_totals_delta(self, quantity_delta: int, amount_delta: Decimal):
+        """
+        อัปเดตยอดรวมที่เก็บไว้ใน Cart แบบ incremental ด้วย UPDATE เดียว
+        (ใช้ F expression เพื่อไม่ให้ทับค่าที่ request อื่นเพิ่งเขียน)
+        ถ้าตะกร้ามีโค้ดส่วนลด ส่วนลดจะถูกคำนวณใหม่จาก subtotal ใหม่ในคำสั่งเดียวกัน (ดู orders.pricing)
+        """
+        if not quantity_delta and not amount_delta:
+            return
+        new_subtotal = F('subtotal') + amount_delta
+        if self.cart.promotion_code:
+            pricing = discount_update(get_promotion(self.cart.promotion_code), new_subtotal)
+        else:
+            pricing = {'grand_total': Greatest(new_subtotal - F('discount_amount'), Value(Decimal('0.00')))}
+        Cart.objects.filter(pk=self.cart.pk).update(
+            item_count=F('item_count') + quantity_delta,
+            subtotal=new_subtotal,
+            updated_at=timezone.now(),
+            **pricing,
+        )
+        self.cart.refresh_from_db(fields=[
+            'item_count', 'subtotal', 'promotion_code', 'discount_amount', 'grand_total', 'updated_at',
+        ])
+
+    @transaction.atomic
+    def add(self, variant, quantity: int = 1, price_override: Decimal = None) -> CartItem:
+        """
+        เมธอดหลักในการเพิ่ม ProductVariant ลงใน Cart หรืออัปเดตจำนวน
+        """
+        # 0. การเขียนครั้งแรกจะสร้าง session และ Cart จริง
+        self._ensure_cart()
+
+        # 1. ตรวจสอบราคาที่จะใช้
+        try:
+            unit_price = price_override if price_override is not None else variant.current_price
+        except AttributeError:
+             raise AttributeError("ProductVariant must have a 'current_price' attribute.")
+
+        try:
+            # 2. ลองค้นหารายการสินค้าในตะกร้าที่มีอยู่แล้ว (ส่วน Get/Update)
+            cart_item = CartItem.objects.get(
+                cart=self.cart,
+                variant_id=variant.id,
+            )
+            old_subtotal = cart_item.subtotal
+
+            # 3. ถ้ารายการสินค้ามีอยู่: อัปเดตจำนวนและราคา
+            cart_item.quantity += quantity
+            cart_item.price_at_addition = unit_price # อัปเดตราคาล่าสุด
+            cart_item.save(update_fields=['quantity', 'price_at_addition', 'updated_at'])
+
+        except CartItem.DoesNotExist:
+            # 4. ถ้ารายการสินค้าไม่มีอยู่: สร้างรายการใหม่ (ส่วน Create)
+            old_subtotal = Decimal('0.00')
+            cart_item = CartItem.objects.create(
+                cart=self.cart,
+                variant=variant,
+                quantity=quantity,
+                price_at_addition=unit_price
+            )
+
+        # 5. อัปเดตยอดรวมของ Cart ใน transaction เดียวกัน
+        self._apply_totals_delta(quantity, cart_item.subtotal - old_subtotal)
+        return cart_item
+
+    @transaction.atomic
+    def add_many(self, items: dict[int, int], validate_stock: bool = True) -> list[CartItem]:
+        """
+        เพิ่มสินค้าหลายตัวเลือกในครั้งเดียว ({variant_id: quantity})
+        - ตรวจสอบ variant และสต็อกทั้งหมดด้วย query เดียว
+        - upsert CartItem ทั้งหมดด้วยคำสั่ง bulk เดียวบน unique (cart, variant)
+        """
+        if not items:
+            return []
+
+        # 1. ตรวจสอบ variant และสต็อกทั้งหมดในครั้งเดียว
+        variants = self._load_variants(items, validate_stock=validate_stock)
+
+        # 2. ดึงจำนวนเดิมในตะกร้า (ถ้ามี) เพื่อรวมจำนวนและคำนวณยอดรวมที่เปลี่ยนไป
+        self._ensure_cart()
+        existing = {
+            item.variant_id: item
+            for item in self.cart.items.filter(variant_id__in=list(items)).only('variant_id', 'quantity', 'price_at_addition')
+        }
+
+        cart_items = []
+        quantity_delta, amount_delta = 0, Decimal('0.00')
+        for variant_id, quantity in items.items():
+            variant = variants[variant_id]
+            old_item = existing.get(variant_id)
+            new_quantity = quantity + (old_item.quantity if old_item else 0)
+            cart_item = CartItem(cart=self.cart, variant=variant, quantity=new_quantity, price_at_addition=variant.current_price)
+            cart_items.append(cart_item)
+            quantity_delta += quantity
+            amount_delta += cart_item.subtotal - (old_item.subtotal if old_item else Decimal('0.00'))
+
+        # 3. Upsert ทั้งหมดด้วยคำสั่งเดียว (INSERT ... ON CONFLICT (cart, variant) DO UPDATE)
+        CartItem.objects.bulk_create(
+            cart_items,
+            update_conflicts=True,
+            unique_fields=['cart', 'variant'],
+            update_fields=['quantity', 'price_at_addition', 'updated_at'],
+        )
+
+        self._apply_totals_delta(quantity_delta, amount_delta)
+        return cart_items
+
+    @transaction.atomic
+    def update_quantity(self, cart_item: CartItem, quantity: int):
+        """
+        ตั้งค่าจำนวนของรายการสินค้า (ถ้าจำนวน <= 0 จะลบรายการออก)
+        """
+        old_quantity, old_subtotal = cart_item.quantity, cart_item.subtotal
+
+        if quantity <= 0:
+            cart_item.delete()
+            self._apply_totals_delta(-old_quantity, -old_subtotal)
+            return None
+
+        cart_item.quantity = quantity
+        cart_item.save(update_fields=['quantity', 'updated_at'])
+        self._apply_totals_delta(quantity - old_quantity, cart_item.subtotal - old_subtotal)
+        return cart_item
+
+    @transaction.atomic
+    def remove(self, cart_item: CartItem):
+        """ลบรายการสินค้าออกจากตะกร้าและหักยอดรวม"""
+        quantity, subtotal = cart_item.quantity, cart_item.subtotal
+        cart_item.delete()
+        self._apply_totals_delta(-quantity, -subtotal)
+
+    @transaction.atomic
+    def clear(self):
+        """ล้างรายการสินค้าและส่วนลดทั้งหมด (ใช้หลังสร้างคำสั่งซื้อ)"""
+        if not self.is_persisted():
+            return
+        self.cart.items.all().delete()
+        self.cart.promotion_code = ""
+        self.cart.discount_amount = Decimal('0.00')
+        self.cart.item_count = 0
+        self.cart.subtotal = Decimal('0.00')
+        self.cart.grand_total = Decimal('0.00')
+        self.cart.save(update_fields=[
+            'promotion_code', 'discount_amount', 'item_count', 'subtotal', 'grand_total', 'updated_at',
+        ])
+
+    def apply_discount(self, code, amount: Decimal):
+        self.cart.apply_discount(code, amount)
+
+    @transaction.atomic
+    def revalidate(self) -> dict:
+        """
+        ดึงราคา/สต็อกปัจจุบันของทุกรายการด้วย query เดียว (JOIN variant/product)
+        แล้วอัปเดตราคาที่เปลี่ยนด้วย bulk_update เดียว และปรับยอดรวมแบบ incremental
+        """
+        items = list(self.get_items()) if self.is_persisted() else []
+        report, changed, amount_delta = self._build_revalidation_report(items)
+        if changed:
+            CartItem.objects.bulk_update(changed, ['price_at_addition'])
+            self._apply_totals_delta(0, amount_delta)
+        return report
+
+    @transaction.atomic
+    def merge_into(self, user):
+        """
+        รวม Guest Cart ของ session ปัจจุบันเข้าสู่ Cart ของ User
+        ใช้คำสั่งแบบ set-based จำนวนคงที่ ไม่ขึ้นกับจำนวนรายการสินค้า:
+        1. UPDATE รายการที่ซ้ำกัน (รวมจำนวน) 2. ย้ายรายการที่เหลือแบบ bulk 3. ลบ Guest Cart
+        """
+        guest_cart_id = self.request.session.pop(GUEST_CART_SESSION_KEY, None)
+        guest_carts = Cart.objects.filter(user__isnull=True)
+        if guest_cart_id:
+            guest_cart = guest_carts.filter(pk=guest_cart_id).first()
+        elif self.session_key:
+            guest_cart = guest_carts.filter(session_key=self.session_key).first()
+        else:
+            guest_cart = None
+
+        if guest_cart is None:
+            return None
+
+        user_cart = Cart.objects.filter(user=user).first()
+        if user_cart is None:
+            # User ยังไม่มี Cart -> ผูก Guest Cart กับ User ได้เลย
+            guest_cart.user = user
+            guest_cart.session_key = None
+            guest_cart.save(update_fields=['user', 'session_key', 'updated_at'])
+            return guest_cart
+
+        guest_items = CartItem.objects.filter(cart=guest_cart)
+        matching_guest_item = guest_items.filter(variant_id=OuterRef('variant_id'))
+
+        # 1. รายการที่มีอยู่แล้วใน User Cart: รวมจำนวนและใช้ราคาจาก Guest Cart
+        CartItem.objects.filter(cart=user_cart, variant_id__in=guest_items.values('variant_id')).update(
+            quantity=F('quantity') + Subquery(matching_guest_item.values('quantity')[:1]),
+            price_at_addition=Subquery(matching_guest_item.values('price_at_addition')[:1]),
+            updated_at=timezone.now(),
+        )
+
+        # 2. รายการที่เหลือ: ย้ายไป User Cart ทั้งหมดในคำสั่งเดียว
+        guest_items.exclude(variant_id__in=CartItem.objects.filter(cart=user_cart).values('variant_id')).update(
+            cart=user_cart,
+            updated_at=timezone.now(),
+        )
+
+        # 3. ลบ Guest Cart (รายการที่ซ้ำซึ่งรวมแล้วจะถูกลบตาม CASCADE)
+        guest_cart.delete()
+
+        user_cart.recalculate_totals()
+        if user_cart.promotion_code:
+            # ยอดรวมเปลี่ยนจากการรวมตะกร้า: คำนวณส่วนลดของโค้ดเดิมใหม่
+            Cart.objects.filter(pk=user_cart.pk).update(**discount_update(get_promotion(user_cart.promotion_code)))
+            user_cart.refresh_from_db(fields=['promotion_code', 'discount_amount', 'grand_total'])
+        return user_cart
+
+
+# ----------------------------------------------------------------------
+# Dictionary-based backends (cache / signed cookie)
+# ----------------------------------------------------------------------
+
+class DictCartStorage(BaseCartStorage):
+    """
+    Base สำหรับ backend ที่เก็บตะกร้าเป็น dict ขนาดเล็ก (ไม่ใช้ฐานข้อมูล):
+    {'i': {'<variant_id>': [quantity, '<price>']}, 'c': '<promotion_code>', 'd': '<discount>', 'k': '<hold token>'}
+
+    รายการสินค้าจะเป็น CartItem ที่ยังไม่ถูกบันทึก โดยมี id เท่ากับ variant_id
+    """
+
+    def __init__(self, request: HttpRequest, user=None, lazy: bool = True):
+        super().__init__(request, user=user, lazy=lazy)
+        self._state = None
+
+    # --- การอ่าน/เขียน dict (แต่ละ backend ต้อง implement) ---
+    def _read(self) -> dict | None:
+        raise NotImplementedError
+
+    def _write(self, state: dict):
+        raise NotImplementedError
+
+    def _delete(self):
+        raise NotImplementedError
+
+    def _set_cookie(self, name, value):
+        """บันทึก cookie ที่ต้องเขียนลง response (ดู orders.middleware.CartCookieMiddleware)"""
+        if not hasattr(self.request, '_cart_cookies'):
+            self.request._cart_cookies = {}
+        self.request._cart_cookies[name] = value
+
+    # --- state ---
+    @property
+    def state(self) -> dict:
+        if self._state is None:
+            self._state = self._read() or {'i': {}, 'c': None, 'd': '0.00'}
+        return self._state
+
+    def _reprice(self):
+        """คำนวณส่วนลดของโค้ดที่ใส่ไว้ใหม่จากรายการใน state (ดู orders.pricing.current_discount)"""
+        code = self.state.get('c')
+        if not code:
+            return
+        subtotal = sum((quantity * Decimal(price) for quantity, price in self.state['i'].values()), Decimal('0.00'))
+        discount = current_discount(get_promotion(code), subtotal)
+        if discount is None:
+            self.state['c'] = None
+            discount = Decimal('0.00')
+        self.state['d'] = str(discount)
+
+    def _save(self):
+        self._reprice()
+        if self.state['i'] or self.state.get('c'):
+            self._write(self.state)
+        else:
+            self._delete()
+        self._sync_cart()
+
+    def _sync_cart(self):
+        """คำนวณยอดรวมจาก state ลงใน Cart object เดิม (ให้ reference ที่ view ถืออยู่ถูกต้องเสมอ)"""
+        cart = self._cart
+        if cart is None:
+            return
+        lines = self.state['i'].values()
+        cart.promotion_code = self.state.get('c')
+        cart.discount_amount = Decimal(self.state.get('d') or '0.00')
+        cart.item_count = sum(quantity for quantity, price in lines)
+        cart.subtotal = sum((quantity * Decimal(price) for quantity, price in lines), Decimal('0.00'))
+        cart.grand_total = max(Decimal('0.00'), cart.subtotal - cart.discount_amount)
+
+    @property
+    def cart(self) -> Cart:
+        if self._cart is None:
+            self._cart = Cart(user=None)
+            self._sync_cart()
+        return self._cart
+
+    def _make_item(self, variant, quantity, price) -> CartItem:
+        return CartItem(id=variant.pk, cart=self.cart, variant=variant, quantity=quantity, price_at_addition=Decimal(price))
+
+    def get_items(self) -> list[CartItem]:
+        lines = self.state['i']
+        if not lines:
+            return []
+        variants = ProductVariant.objects.select_related('product').in_bulk([int(variant_id) for variant_id in lines])
+        return [
+            self._make_item(variants[int(variant_id)], quantity, price)
+            for variant_id, (quantity, price) in lines.items()
+            if int(variant_id) in variants
+        ]
+
+    def get_item(self, **lookup) -> CartItem:
+        # รองรับการค้นหาด้วย id หรือ variant_id (ทั้งสองค่าเท่ากันใน backend นี้)
+        variant_id = str(lookup.get('variant_id', lookup.get('id')))
+        line = self.state['i'].get(variant_id)
+        if line is None:
+            raise CartItem.DoesNotExist
+        try:
+            variant = ProductVariant.objects.select_related('product').get(pk=variant_id)
+        except ProductVariant.DoesNotExist:
+            raise CartItem.DoesNotExist
+        return self._make_item(variant, *line)
+
+    def add(self, variant, quantity: int = 1, price_override: Decimal = None) -> CartItem:
+        unit_price = price_override if price_override is not None else variant.current_price
+        key = str(variant.pk)
+        old_quantity = self.state['i'].get(key, [0, None])[0]
+        self.state['i'][key] = [old_quantity + quantity, str(unit_price)]
+        self._save()
+        return self._make_item(variant, *self.state['i'][key])
+
+    def add_many(self, items: dict[int, int], validate_stock: bool = True) -> list[CartItem]:
+        if not items:
+            return []
+        variants = self._load_variants(items, validate_stock=validate_stock)
+        cart_items = []
+        for variant_id, quantity in items.items():
+            key = str(variant_id)
+            old_quantity = self.state['i'].get(key, [0, None])[0]
+            self.state['i'][key] = [old_quantity + quantity, str(variants[variant_id].current_price)]
+            cart_items.append(self._make_item(variants[variant_id], *self.state['i'][key]))
+        self._save()
+        return cart_items
+
+    def update_quantity(self, cart_item: CartItem, quantity: int):
+        key = str(cart_item.variant_id)
+        if quantity <= 0:
+            self.state['i'].pop(key, None)
+            self._save()
+            return None
+        cart_item.quantity = quantity
+        self.state['i'][key] = [quantity, str(cart_item.price_at_addition)]
+        self._save()
+        return cart_item
+
+    def remove(self, cart_item: CartItem):
+        self.state['i'].pop(str(cart_item.variant_id), None)
+        self._save()
+
+    def clear(self):
+        self._state = {'i': {}, 'c': None, 'd': '0.00'}
+        self._save()
+
+    def apply_discount(self, code, amount: Decimal):
+        self.state['c'] = code
+        self.state['d'] = str(amount)
+        self._save()
+
+    def revalidate(self) -> dict:
+        report, changed, amount_delta = self._build_revalidation_report(self.get_items())
+        if changed:
+            for item in changed:
+                self.state['i'][str(item.variant_id)][1] = str(item.price_at_addition)
+            self._save()
+        return report
+
+    def get_hold_key(self, create: bool = False) -> str | None:
+        # token สุ่มที่เก็บใน state (บันทึกพร้อมการแก้ไขตะกร้าครั้งถัดไป)
+        if not self.state.get('k') and create:
+            self.state['k'] = uuid.uuid4().hex
+        return f"guest:{self.state['k']}" if self.state.get('k') else None
+
+    @transaction.atomic
+    def merge_into(self, user):
+        """
+        ย้ายรายการจาก cache/cookie เข้าสู่ Cart ของ User ในฐานข้อมูลด้วย upsert เดียว
+        รายการที่ variant ถูกลบไปแล้ว (cache/cookie ไม่มี foreign key) ถูกข้ามไป เพื่อไม่ให้การล็อกอินล้มเหลว
+        """
+        lines = self.state['i']
+        if not lines:
+            return None
+        items = {int(variant_id): quantity for variant_id, (quantity, price) in lines.items()}
+        existing = set(ProductVariant.objects.filter(pk__in=list(items)).values_list('pk', flat=True))
+        items = {variant_id: quantity for variant_id, quantity in items.items() if variant_id in existing}
+        user_cart = None
+        if items:
+            user_storage = DatabaseCartStorage(self.request, user=user)
+            user_storage.add_many(items, validate_stock=False)
+            user_cart = user_storage.cart
+        self.clear()
+        return user_cart
+
+
+class CacheCartStorage(DictCartStorage):
+    """
+    เก็บตะกร้าของ Guest ใน Django cache (เช่น locmem, file, redis)
+    อ้างอิงด้วย token แบบสุ่มใน cookie จึงไม่ต้องสร้าง session หรือแถวในฐานข้อมูล
+
+    settings: CART_CACHE_ALIAS (ค่าเริ่มต้น 'default'), CART_CACHE_TIMEOUT (วินาที)
+    """
+    cookie_name = 'cart_token'
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'CART_CACHE_ALIAS', 'default')]
+
+    def _cache_key(self, token):
+        return f'orders:cart:{token}'
+
+    def _read(self) -> dict | None:
+        token = self.request.COOKIES.get(self.cookie_name)
+        return self.cache.get(self._cache_key(token)) if token else None
+
+    def _write(self, state: dict):
+        token = self.request.COOKIES.get(self.cookie_name)
+        if not token:
+            token = uuid.uuid4().hex
+            # ให้ request เดียวกันอ่าน token ใหม่ได้ และเขียน cookie ลง response
+            self.request.COOKIES[self.cookie_name] = token
+            self._set_cookie(self.cookie_name, token)
+        self.cache.set(self._cache_key(token), state, getattr(settings, 'CART_CACHE_TIMEOUT', 60 * 60 * 24 * 30))
+
+    def _delete(self):
+        token = self.request.COOKIES.get(self.cookie_name)
+        if token:
+            self.cache.delete(self._cache_key(token))
+            self._set_cookie(self.cookie_name, None)
+
+
+class SignedCookieCartStorage(DictCartStorage):
+    """
+    เก็บตะกร้าขนาดเล็กของ Guest ใน cookie ที่เซ็นชื่อ (บีบอัด) แล้ว ไม่ใช้ฐานข้อมูลหรือ cache เลย
+
+    settings: CART_COOKIE_MAX_ITEMS (จำนวนรายการสูงสุด ค่าเริ่มต้น 20)
+    """
+    cookie_name = 'cart'
+    salt = 'orders.storage.SignedCookieCartStorage'
+    # cookie ต้องไม่เกิน ~4KB
+    max_cookie_size = 4000
+
+    def _read(self) -> dict | None:
+        value = self.request.COOKIES.get(self.cookie_name)
+        if not value:
+            return None
+        try:
+            return signing.loads(value, salt=self.salt)
+        except signing.BadSignature:
+            return None
+
+    def _write(self, state: dict):
+        max_items = getattr(settings, 'CART_COOKIE_MAX_ITEMS', 20)
+        value = signing.dumps(state, salt=self.salt, compress=True)
+        if len(state['i']) > max_items or len(value) > self.max_cookie_size:
+            # ไม่บันทึก state ที่เกินขนาด เพื่อให้ cookie เดิมยังใช้งานได้
+            self._state = None
+            raise ValueError(f"ตะกร้าสินค้าสำหรับผู้ที่ยังไม่เข้าสู่ระบบมีได้ไม่เกิน {max_items} รายการ")
+        self.request.COOKIES[self.cookie_name] = value
+        self._set_cookie(self.cookie_name, value)
+
+    def _delete(self):
+        if self.request.COOKIES.pop(self.cookie_name, None):
+            self._set_cookie(self.cookie_name, None)
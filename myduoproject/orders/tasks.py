@@ -0,0 +1,54 @@
+"""
+งานเบื้องหลังของคำสั่งซื้อ (ทำโดย manage.py run_jobs ดู orders.jobs)
+"""
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+from PIL import Image, ImageOps
+
+from .jobs import task
+from .models import Order
+
+
+@task('orders.send_order_confirmation')
+def send_order_confirmation(order_id):
+    """ส่งอีเมลยืนยันคำสั่งซื้อให้ผู้สั่งซื้อ"""
+    order = Order.objects.get(pk=order_id)
+    body = render_to_string('orders/emails/order_confirmation.txt', {
+        'order': order,
+        'items': order.items.all(),
+    })
+    send_mail(f"ยืนยันคำสั่งซื้อ #{order.order_number}", body, None, [order.email])
+
+
+# ขนาดสูงสุด (px) ของภาพตัวอย่างสลิป
+PAYMENT_SLIP_PREVIEW_SIZE = (600, 600)
+
+
+@task('orders.process_payment_slip')
+def process_payment_slip(order_id):
+    """
+    สร้างภาพตัวอย่าง (JPEG ขนาดเล็ก) ของสลิปการโอนเงินให้แอดมินเปิดดูได้เร็ว
+    ภาพตัวอย่างตั้งชื่อตาม SHA-256 ของสลิป จึงสร้างครั้งเดียวต่อไฟล์ แม้หลายคำสั่งซื้อจะใช้สลิปเดียวกัน
+    """
+    order = Order.objects.get(pk=order_id)
+    if not order.payment_slip or order.payment_slip_preview:
+        return
+    if os.path.splitext(order.payment_slip.name)[1].lower() == '.pdf':
+        # ยังไม่มีตัวแปลง PDF เป็นภาพในโปรเจกต์ แอดมินเปิดไฟล์ PDF ต้นฉบับได้โดยตรง
+        return
+
+    preview_name = f"payment_slips/previews/{order.payment_slip_sha256 or order.pk}.jpg"
+    if not default_storage.exists(preview_name):
+        with order.payment_slip.open('rb') as slip:
+            image = ImageOps.exif_transpose(Image.open(slip))
+            image.thumbnail(PAYMENT_SLIP_PREVIEW_SIZE)
+            output = BytesIO()
+            image.convert('RGB').save(output, format='JPEG', quality=80)
+        preview_name = default_storage.save(preview_name, ContentFile(output.getvalue()))
+
+    Order.objects.filter(pk=order.pk).update(payment_slip_preview=preview_name)
@@ -0,0 +1,80 @@
+import multiprocessing
+import re
+import unittest
+from collections import Counter
+
+from django.db import connection, connections, transaction
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from orders.models import OrderNumberCounter
+from orders.numbering import OrderNumberGenerator
+
+ORDER_NUMBER_PATTERN = re.compile(r'^\d{8}-\d{6}$')
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _generate(count, block_size, rollback_every):
+    """
+    ทำงานใน process ลูก (fork จาก test จึงใช้ฐานข้อมูลทดสอบเดียวกัน): ขอเลข count ครั้ง
+    แต่ละครั้งอยู่ใน transaction ของตัวเองเหมือนตอน checkout คืนเฉพาะเลขของ transaction ที่ commit แล้ว
+    """
+    connections.close_all()  # ไม่ใช้ connection ที่ได้มาจาก process แม่
+    generator = OrderNumberGenerator(block_size=block_size)
+    numbers = []
+    for i in range(count):
+        try:
+            with transaction.atomic():
+                number = generator.next()
+                if rollback_every and i % rollback_every == 0:
+                    raise _Rollback
+        except _Rollback:
+            continue
+        numbers.append(number)
+    connections.close_all()
+    return numbers
+
+
+@unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), "ต้องใช้ multiprocessing แบบ fork")
+class OrderNumberConcurrencyTests(TransactionTestCase):
+    """orders.numbering ภายใต้การขอเลขพร้อมกันหลาย process (ดู manage.py stress_order_numbers สำหรับโหลดที่มากกว่านี้)"""
+
+    processes = 4
+    count = 150
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("ฐานข้อมูลทดสอบในหน่วยความจำใช้ร่วมกันหลาย process ไม่ได้ (ดู DATABASES['default']['TEST'])")
+
+    def _run(self, block_size, rollback_every=0):
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(self.processes) as pool:
+            results = pool.starmap(_generate, [(self.count, block_size, rollback_every)] * self.processes)
+        return [number for result in results for number in result]
+
+    def assertUniqueOrderNumbers(self, numbers):
+        duplicates = [number for number, seen in Counter(numbers).items() if seen > 1]
+        self.assertEqual(duplicates, [])
+        today = timezone.localdate().strftime('%Y%m%d')
+        for number in numbers:
+            self.assertRegex(number, ORDER_NUMBER_PATTERN)
+            self.assertEqual(number[:8], today)
+
+    def test_numbers_are_unique_across_processes(self):
+        numbers = self._run(block_size=5)
+        self.assertEqual(len(numbers), self.processes * self.count)
+        self.assertUniqueOrderNumbers(numbers)
+        # ทุก block ที่แจกไปถูกนับใน counter แล้ว
+        counter = OrderNumberCounter.objects.get(partition=numbers[0][:8])
+        self.assertGreaterEqual(counter.next_value - 1, max(int(number[9:]) for number in numbers))
+
+    def test_rolled_back_blocks_are_not_reused(self):
+        # transaction ที่ rollback ย้อนการจอง block ไปด้วย process อื่นอาจได้ช่วงเดียวกัน จึงต้องไม่แจกเลขจาก block นั้นอีก
+        rollback_every = 7
+        numbers = self._run(block_size=3, rollback_every=rollback_every)
+        committed_per_process = self.count - len(range(0, self.count, rollback_every))
+        self.assertEqual(len(numbers), self.processes * committed_per_process)
+        self.assertUniqueOrderNumbers(numbers)
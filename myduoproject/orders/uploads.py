@@ -0,0 +1,71 @@
+"""
+การรับไฟล์สลิปการโอนเงิน
+
+- PaymentSlipUploadHandler คำนวณ SHA-256 และตรวจขนาดไฟล์ทีละ chunk ระหว่างที่ไฟล์กำลังถูกอัปโหลด
+  (ไฟล์ที่เกิน PAYMENT_SLIP_MAX_SIZE จะถูกทิ้งทันทีโดยไม่เขียนลงดิสก์/หน่วยความจำ)
+- store_payment_slip บันทึกไฟล์แบบ content-addressed (ชื่อไฟล์มาจาก hash) ไฟล์ที่เหมือนกันจึงถูกเก็บครั้งเดียว
+- การสร้างภาพตัวอย่างทำใน worker (งาน orders.process_payment_slip ดู orders.tasks)
+"""
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+PAYMENT_SLIP_FIELD = 'payment_slip'
+DEFAULT_PAYMENT_SLIP_MAX_SIZE = 5 * 1024 * 1024
+PAYMENT_SLIP_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.pdf')
+
+
+def get_max_slip_size() -> int:
+    return getattr(settings, 'PAYMENT_SLIP_MAX_SIZE', DEFAULT_PAYMENT_SLIP_MAX_SIZE)
+
+
+class PaymentSlipUploadHandler(FileUploadHandler):
+    """
+    Upload handler ที่ต้องอยู่ก่อน handler มาตรฐานของ Django (ดู CheckoutView.dispatch)
+    ส่งข้อมูลต่อให้ handler ถัดไปเขียนไฟล์ตามปกติ และบันทึกผลไว้ที่ request.payment_slip_upload:
+    {'sha256': ..., 'size': ...} หรือ {'error': 'too_large'}
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.active = field_name == PAYMENT_SLIP_FIELD
+        if self.active:
+            self.hasher = hashlib.sha256()
+            self.size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.active:
+            self.size += len(raw_data)
+            if self.size > get_max_slip_size():
+                self.request.payment_slip_upload = {'error': 'too_large'}
+                raise SkipFile
+            self.hasher.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.active:
+            self.request.payment_slip_upload = {'sha256': self.hasher.hexdigest(), 'size': self.size}
+        # ให้ handler ถัดไปเป็นผู้สร้าง UploadedFile
+        return None
+
+
+def payment_slip_name(sha256: str, original_name: str) -> str:
+    """path ของไฟล์ตาม hash เช่น payment_slips/sha256/ab/cd/abcd....jpg"""
+    extension = os.path.splitext(original_name)[1].lower()
+    return f"payment_slips/sha256/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+
+def store_payment_slip(uploaded_file, sha256: str) -> str:
+    """
+    บันทึกสลิปลง storage ทีละ chunk (ถ้ามีไฟล์เดียวกันอยู่แล้วจะไม่บันทึกซ้ำ)
+    คืนค่าชื่อไฟล์สำหรับใส่ใน Order.payment_slip
+    ควรเรียกนอก transaction เพื่อไม่ให้การเขียนไฟล์ใหญ่ถือ transaction ไว้
+    """
+    name = payment_slip_name(sha256, uploaded_file.name)
+    if default_storage.exists(name):
+        return name
+    # Storage.save อ่านไฟล์ผ่าน chunks() จึงไม่โหลดทั้งไฟล์เข้าหน่วยความจำ
+    return default_storage.save(name, uploaded_file)
@@ -11,6 +11,7 @@ urlpatterns = [
     
     # Cart Management (ใช้ AJAX)
     path('cart/add/', views.add_to_cart, name='add_to_cart'),
+    path('cart/add-many/', views.add_many_to_cart, name='add_many_to_cart'),
     path('cart/update/', views.update_cart_item, name='update_cart_item'),
     path('cart/remove/', views.remove_from_cart, name='remove_from_cart'),
     
@@ -2,19 +2,29 @@ from django.shortcuts import render, redirect, get_object_or_404
 from products.models import ProductVariant 
 from django.http import JsonResponse, HttpResponse
 from django.contrib import messages
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.views.decorators.http import require_POST
 from django.views.generic import View, TemplateView
+from django.conf import settings
+from django.utils import timezone
+from datetime import timedelta
 from .forms import CheckoutForm
 # นำเข้าโมเดลที่จำเป็น
-from .models import Cart, CartItem, Order, OrderItem 
+from .models import Cart, CartItem, CheckoutIdempotencyKey, Order, OrderItem 
 from promotions.models import Promotion 
+from promotions.cache import get_promotion
+from promotions.offers import available_promotions
 from .cart import CartManager # <--- ใช้ CartManager ตัวเดียวเท่านั้น
+from .inventory import InsufficientStock, decrement_stock, holds_enabled
+from .jobs import enqueue
+from .pricing import REASON_INVALID, REASON_MIN_ORDER, price_subtotal
 import uuid
 from decimal import Decimal, InvalidOperation
-from promotions.models import Promotion , DiscountType
+from promotions.models import Promotion
 import json
-from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.utils.decorators import method_decorator
+from .uploads import PaymentSlipUploadHandler, store_payment_slip
 # ----------------------------------------------------------------------
 # *** FIX: ลบฟังก์ชัน _get_or_create_cart(request) ที่ล้าสมัยออก ***
 # ตอนนี้ CartManager จะทำหน้าที่นี้ทั้งหมด
@@ -42,11 +52,14 @@ def add_to_cart(request):
     # ดึง variant จากฐานข้อมูล
     variant = get_object_or_404(ProductVariant, id=variant_id)
 
-    if variant.stock < quantity:
+    if variant.available_stock < quantity:
         return JsonResponse({"error": "สินค้าไม่พอในสต็อก"}, status=400)
 
     # 2. เพิ่มลงตะกร้า: เรียกใช้เมธอด .add()
-    cart_manager.add(variant=variant, quantity=quantity)
+    try:
+        cart_manager.add(variant=variant, quantity=quantity)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
     # 3. ดึงยอดรวมเพื่อส่งกลับ
     total_quantity = cart_manager.get_total_quantity()
@@ -57,6 +70,40 @@ def add_to_cart(request):
     })
 
 
+@require_POST
+def add_many_to_cart(request):
+    """
+    เพิ่มสินค้าหลายตัวเลือกลงในตะกร้าในครั้งเดียว (เช่น "Buy the look" หรือปุ่มสั่งซื้อซ้ำ)
+    รับ JSON: {"items": [{"variant_id": 1, "quantity": 2}, ...]}
+    """
+    try:
+        data = json.loads(request.body)
+        items = {}
+        for entry in data.get('items', []):
+            variant_id = int(entry['variant_id'])
+            quantity = int(entry.get('quantity', 1))
+            if quantity < 1:
+                raise ValueError("quantity must be >= 1")
+            # รวมจำนวนถ้าส่ง variant เดียวกันมาหลายครั้ง
+            items[variant_id] = items.get(variant_id, 0) + quantity
+    except (json.JSONDecodeError, AttributeError, KeyError, TypeError, ValueError):
+        return JsonResponse({"error": "Invalid items"}, status=400)
+
+    if not items:
+        return JsonResponse({"error": "Missing items"}, status=400)
+
+    cart_manager = CartManager(request)
+    try:
+        cart_manager.add_many(items)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse({
+        "message": f"เพิ่มสินค้า {len(items)} รายการลงในตะกร้าแล้ว",
+        "cart_total_items": cart_manager.get_total_quantity(),
+    })
+
+
 class CartSummaryView(TemplateView):
     """
     แสดงหน้ารวมตะกร้าสินค้า (FIX: ใช้ CartManager เพื่อดึง Cart ที่ถูกต้อง)
@@ -72,9 +119,11 @@ class CartSummaryView(TemplateView):
         cart = cart_manager.cart
         
         context['cart'] = cart
-        # ดึงรายการสินค้า: เนื่องจาก CartManager ดึง Cart ที่ถูกต้องแล้ว รายการนี้จึงถูกต้อง
-        context['cart_items'] = cart.items.select_related('variant__product').all() 
+        # ดึงรายการสินค้า: ถ้ายังไม่มี Cart ในฐานข้อมูล จะได้รายการว่างโดยไม่ query
+        context['cart_items'] = cart_manager.get_items()
         context['total_quantity'] = cart_manager.get_total_quantity()
+        # ข้อเสนอที่ใช้ได้กับยอดปัจจุบัน (อ่านจาก index ในหน่วยความจำ ดู promotions.offers)
+        context['available_promotions'] = [] if cart.is_empty() else available_promotions(cart.subtotal)
         return context
 
 
@@ -93,37 +142,42 @@ def update_cart_item(request):
         new_quantity = int(request.POST.get('quantity', 0))
         
         # 2. ค้นหารายการสินค้าและตรวจสอบว่ามีอยู่จริง
-        cart_item = get_object_or_404(CartItem, cart=current_cart, variant_id=variant_id)
-        
-        # 3. ใช้เมธอด .update_quantity() ใน CartManager (ถ้ามี)
-        # เนื่องจากเรายังไม่ได้สร้างเมธอด update_quantity ใน cart.py
-        # เราจะใช้วิธี update โดยตรงใน view ก่อน
+        cart_item = cart_manager.get_item(variant_id=variant_id)
         
+        # 3. ใช้เมธอด .update_quantity() ใน CartManager (อัปเดตยอดรวมของ Cart ไปพร้อมกัน)
         if new_quantity <= 0:
             # ถ้าจำนวนเป็น 0 หรือน้อยกว่า ให้ลบรายการนั้นออก
             item_name = cart_item.variant.product.name
-            cart_item.delete()
+            cart_manager.update_quantity(cart_item, new_quantity)
             messages.info(request, f"ลบ {item_name} ออกจากตะกร้าแล้ว")
         else:
-            cart_item.quantity = new_quantity
-            # TODO: ควรมีการตรวจสอบสต็อกที่นี่
-            cart_item.save()
+            # ตรวจสต็อกเมื่อเพิ่มจำนวน: ถ้าเปิดการจอง hold_stock ตรวจแบบ atomic ใน update_quantity อยู่แล้ว
+            # ไม่เช่นนั้นเทียบกับจำนวนที่ยังขายได้ของ variant (ลดจำนวนได้เสมอ)
+            if (
+                not holds_enabled()
+                and new_quantity > cart_item.quantity
+                and new_quantity > cart_item.variant.available_stock
+            ):
+                raise InsufficientStock([cart_item.variant])
+            cart_manager.update_quantity(cart_item, new_quantity)
             messages.success(request, "อัปเดตจำนวนสินค้าเรียบร้อยแล้ว")
-        
-        # 4. คำนวณยอดรวมใหม่ (ควรรีเฟรช Cart object เพื่อให้ grand_total/subtotal ถูกต้อง)
-        current_cart.refresh_from_db()
 
-        # คืนค่าเพื่ออัปเดต UI
+        # 4. คืนค่าเพื่ออัปเดต UI (ยอดรวมอ่านจาก Cart ที่ถูกอัปเดตแล้ว ไม่ต้องรวมยอดใหม่)
         return JsonResponse({
             'success': True, 
             'total_items': cart_manager.get_total_quantity(),
             'new_item_total': f"{cart_item.subtotal:.2f}" if new_quantity > 0 else "0.00", 
-            'cart_total_subtotal': f"{current_cart.total_subtotal:.2f}",
+            'cart_total_subtotal': f"{current_cart.subtotal:.2f}",
             'cart_grand_total': f"{current_cart.grand_total:.2f}",
         })
 
     except CartItem.DoesNotExist:
          return JsonResponse({'success': False, 'error': 'รายการสินค้าไม่ถูกต้องหรือไม่อยู่ในตะกร้าของคุณ'}, status=404)
+    except InsufficientStock as e:
+        # จำนวนสูงสุดที่ตั้งได้คือที่ยังไม่ถูกจอง (รวมกับที่ตะกร้านี้จองไว้แล้ว ถ้าเปิดการจอง)
+        held = cart_item.quantity if holds_enabled() else 0
+        available = held + sum(variant.available_stock for variant in e.variants)
+        return JsonResponse({'success': False, 'error': f"{e} (สั่งได้สูงสุด {available} ชิ้น)"}, status=400)
     except Exception as e:
         print(f"Error in update_cart_item: {e}")
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
@@ -135,23 +189,18 @@ def remove_from_cart(request):
     ลบรายการสินค้าออกจากตะกร้า
     """
     cart_manager = CartManager(request)
-    current_cart = cart_manager.cart
     
     cart_item_id = request.POST.get('cart_item_id') 
     
     if cart_item_id:
         try:
             # 1. ค้นหารายการ CartItem และตรวจสอบความเป็นเจ้าของ
-            item_to_delete = get_object_or_404(
-                CartItem, 
-                id=cart_item_id, 
-                cart=current_cart
-            )
+            item_to_delete = cart_manager.get_item(id=cart_item_id)
             
             item_name = item_to_delete.variant.product.name
 
-            # 2. ดำเนินการลบ
-            item_to_delete.delete()
+            # 2. ดำเนินการลบ (CartManager จะหักยอดรวมของ Cart ให้)
+            cart_manager.remove(item_to_delete)
             
             messages.success(request, f'✅ ลบ {item_name} ออกจากตะกร้าเรียบร้อยแล้ว')
             
@@ -183,43 +232,33 @@ def apply_promotion(request):
 
     if not code:
         messages.error(request, "กรุณากรอกโค้ดโปรโมชั่น")
-        return redirect('orders:cart_summary')
+        return redirect('orders:cart')
 
-    # ... (ส่วนคำนวณโปรโมชั่นเดิมยังคงถูกต้อง) ...
-    try:
-        promotion = Promotion.objects.get(code=code)
-    except Promotion.DoesNotExist:
-        messages.error(request, "โค้ดโปรโมชั่นไม่ถูกต้อง")
-        return redirect('orders:cart_summary')
+    if cart.is_empty():
+        messages.error(request, "ไม่สามารถใช้โค้ดได้ ตะกร้าสินค้าว่างเปล่า")
+        return redirect('orders:cart')
 
-    # ตรวจสอบความถูกต้องอื่นๆ 
-    if not promotion.is_valid:
-          messages.error(request, "โค้ดโปรโมชั่นนี้หมดอายุหรือถูกใช้ครบจำนวนแล้ว")
-          return redirect('orders:cart_summary')
+    # อ่านผ่าน cache (times_used ถูกอ่านใหม่จากฐานข้อมูลเสมอ ดู promotions.cache)
+    promotion = get_promotion(code)
+    if promotion is None:
+        messages.error(request, "โค้ดโปรโมชั่นไม่ถูกต้อง")
+        return redirect('orders:cart')
 
-    if cart_total < promotion.min_order_amount:
-        messages.error(f"ยอดสั่งซื้อขั้นต่ำสำหรับการใช้โค้ดนี้คือ {promotion.min_order_amount:.2f} บาท")
-        return redirect('orders:cart_summary')
+    # ตรวจสอบความถูกต้องและคำนวณส่วนลดด้วย pricing engine กลาง (ดู orders.pricing)
+    price = price_subtotal(cart_total, promotion)
+    if price.error == REASON_INVALID:
+        messages.error(request, "โค้ดโปรโมชั่นนี้หมดอายุหรือถูกใช้ครบจำนวนแล้ว")
+        return redirect('orders:cart')
 
-    # คำนวณส่วนลด
-    discount_value = promotion.discount_value
-    discount_amount = Decimal(0.00)
-    
-    if promotion.discount_type == Promotion.DiscountType.PERCENTAGE: 
-        discount_amount = min(Decimal(100), discount_value) / Decimal(100) * cart_total
-    elif promotion.discount_type == Promotion.DiscountType.FIXED_AMOUNT: 
-        discount_amount = min(cart_total, discount_value)
-    else:
-        messages.error(request, "ประเภทโปรโมชั่นไม่ถูกต้อง กรุณาติดต่อผู้ดูแลระบบ")
-        return redirect('orders:cart_summary')
+    if price.error == REASON_MIN_ORDER:
+        messages.error(request, f"ยอดสั่งซื้อขั้นต่ำสำหรับการใช้โค้ดนี้คือ {promotion.min_order_amount:.2f} บาท")
+        return redirect('orders:cart')
 
     # บันทึกส่วนลดลงใน Cart
-    cart.promotion_code = code
-    cart.discount_amount = discount_amount.quantize(Decimal('0.00'))
-    cart.save(update_fields=['promotion_code', 'discount_amount']) 
+    cart_manager.apply_discount(code, price.discount_amount)
     
-    messages.success(request, f"ใช้โค้ด {code} เรียบร้อยแล้ว! ได้รับส่วนลด {cart.discount_amount:.2f} บาท")
-    return redirect('orders:cart_summary')
+    messages.success(request, f"ใช้โค้ด {code} เรียบร้อยแล้ว! ได้รับส่วนลด {price.discount_amount:.2f} บาท")
+    return redirect('orders:cart')
 \
 class CheckoutView(View):
     """จัดการขั้นตอนการชำระเงินและการสร้างคำสั่งซื้อ"""
@@ -251,10 +290,18 @@ class CheckoutView(View):
         
         if cart.is_empty():
             messages.warning(request, "ตะกร้าสินค้าว่างเปล่า ไม่สามารถดำเนินการชำระเงินได้")
-            return redirect('orders:cart_summary')
+            return redirect('orders:cart')
+
+        # ตรวจสอบราคา/สต็อกล่าสุดก่อนแสดงหน้าชำระเงิน และแจ้งผู้ใช้ถ้ามีการเปลี่ยนแปลง
+        report = cart_manager.revalidate()
+        for item, old_price, new_price in report['price_changes']:
+            messages.info(request, f"ราคา {item.product_name} ({item.variant_name}) เปลี่ยนจาก {old_price:.2f} เป็น {new_price:.2f} บาท")
+        for item, available in report['stock_issues']:
+            messages.warning(request, f"{item.product_name} ({item.variant_name}) เหลือในสต็อกเพียง {available} ชิ้น")
 
         # ดึงข้อมูลเริ่มต้นสำหรับฟอร์ม
         initial_data = self._get_initial_data(request)
+        initial_data['idempotency_key'] = uuid.uuid4().hex
         form = CheckoutForm(initial=initial_data) 
         
         # 2. คำนวณยอดรวมและส่วนลดจาก CartManager
@@ -264,100 +311,178 @@ class CheckoutView(View):
         context = {
             'form': form,
             'cart': cart,
-            'cart_items': cart.items.select_related('variant__product').all(),
+            'cart_items': cart_manager.get_items(),
             'subtotal': subtotal,                 # <--- ส่ง Subtotal เข้า Context
             'grand_total': grand_total,           # <--- ส่ง Grand Total เข้า Context
             'discount_amount': cart.discount_amount, # ส่งส่วนลดปัจจุบันเข้า Context
         }
         return render(request, self.template_name, context)
 
-    def _create_order_items(self, new_order, cart_items):
-        """สร้าง OrderItem จาก CartItem ที่มีอยู่ (ใช้ bulk_create เพื่อเพิ่มประสิทธิภาพ)"""
-        order_items = []
-        for cart_item in cart_items:
-            order_items.append(
-                OrderItem(
-                    order=new_order,
-                    product=cart_item.variant.product, 
-                    product_name=cart_item.variant.product.name,
-                    quantity=cart_item.quantity,
-                    # บันทึกราคา ณ ขณะนั้น
-                    unit_price=cart_item.price_at_addition.quantize(Decimal('0.00')), 
-                    variant_size=cart_item.variant.size, 
-                )
-            )
-        OrderItem.objects.bulk_create(order_items)
+    def _create_order_items(self, new_order, snapshot):
+        """สร้าง OrderItem ทั้งหมดจาก snapshot ด้วย bulk_create ครั้งเดียว (ไม่ query variant/product ต่อรายการ)"""
+        OrderItem.objects.bulk_create(snapshot.build_order_items(new_order))
+
+    def _update_promotion_usage(self, snapshot) -> bool:
+        """
+        นับการใช้โปรโมชั่นด้วย UPDATE แบบมีเงื่อนไข (ไม่ล็อกแถวด้วย select_for_update)
+        คืนค่า False ถ้าโค้ดในตะกร้าใช้ไม่ได้แล้ว (เช่น ถูกใช้ครบ max_uses ระหว่างที่ผู้ใช้กำลังชำระเงิน)
+        """
+        if not snapshot.promotion_code:
+            return True
+        return Promotion.redeem(snapshot.promotion_code)
+
+    def _get_idempotent_order(self, key):
+        """คืนคำสั่งซื้อที่เคยสร้างด้วย key นี้ (ถ้ายังไม่หมดอายุ) และลบ key ที่หมดอายุแล้วทิ้ง"""
+        if not key:
+            return None
+        now = timezone.now()
+        CheckoutIdempotencyKey.objects.filter(key=key, expires_at__lte=now).delete()
+        record = CheckoutIdempotencyKey.objects.select_related('order').filter(key=key).first()
+        return record.order if record else None
+
+    def _redirect_to_existing_order(self, request, order):
+        messages.info(request, f"คำสั่งซื้อ #{order.order_number} ถูกสร้างไปแล้ว")
+        return redirect('orders:order_detail', order_number=order.order_number)
 
-    def _update_promotion_usage(self, cart):
-        """อัปเดตจำนวนครั้งที่ใช้โปรโมชั่น"""
-        if cart.promotion_code:
+    @transaction.atomic
+    def _place_order(self, request, cart_manager, snapshot, data, idempotency_key, payment_slip_name, payment_slip_sha256):
+        """
+        สร้างคำสั่งซื้อ ผูก idempotency key นับโปรโมชั่น และตัดสต็อกใน transaction เดียว
+        (ข้อมูลทั้งหมดถูกเตรียมไว้ก่อนแล้ว transaction จึงสั้นที่สุด)
+        key ถูกผูกก่อนนับโปรโมชั่น/ตัดสต็อก การส่งซ้ำพร้อมกันจึงหยุดก่อนเขียนข้อมูลอื่น
+        """
+        # 0. สร้าง Order
+        new_order = Order.objects.create(
+            user=request.user if request.user.is_authenticated else None,
+            
+            full_name=data['full_name'],
+            email=data['email'],
+            phone_number=data['phone_number'],
+            shipping_address=data['shipping_address'],
+            payment_method=data['payment_method'],
+            payment_slip=payment_slip_name,
+            payment_slip_sha256=payment_slip_sha256,
+            
+            # สรุปทางการเงิน (คำนวณจาก snapshot ชุดเดียวกับ OrderItem)
+            total_amount=snapshot.subtotal,
+            discount_amount=snapshot.discount_amount,
+            grand_total=snapshot.grand_total,
+        )
+        
+        # 0.1 ผูก key กับคำสั่งซื้อ ถ้า request ที่ใช้ key เดียวกันบันทึกไปก่อน (ส่งซ้ำพร้อมกัน)
+        #     ให้ย้อนกลับทุกอย่างใน request นี้และพาไปยังคำสั่งซื้อเดิม
+        if idempotency_key:
+            CheckoutIdempotencyKey.objects.filter(key=idempotency_key, expires_at__lte=timezone.now()).delete()
             try:
-                # ใช้ select_for_update เพื่อล็อกแถวในฐานข้อมูลชั่วคราวระหว่าง Transaction
-                promotion = Promotion.objects.select_for_update().get(code=cart.promotion_code)
-                promotion.times_used += 1
-                promotion.save(update_fields=['times_used'])
-            except Promotion.DoesNotExist:
-                messages.warning(self.request, f"ไม่พบรหัสโปรโมชั่น '{cart.promotion_code}' แต่คำสั่งซื้อถูกสร้างแล้ว")
-                pass
+                with transaction.atomic():
+                    CheckoutIdempotencyKey.objects.create(
+                        key=idempotency_key,
+                        order=new_order,
+                        expires_at=timezone.now() + timedelta(
+                            seconds=getattr(settings, 'CHECKOUT_IDEMPOTENCY_TTL', 24 * 60 * 60)
+                        ),
+                    )
+            except IntegrityError:
+                existing_order = self._get_idempotent_order(idempotency_key)
+                transaction.set_rollback(True)
+                if existing_order is None:
+                    # key ของ request แรกยังไม่ commit หรือหมดอายุไปพร้อมกัน
+                    messages.warning(request, "คำสั่งซื้อนี้กำลังดำเนินการอยู่ กรุณาตรวจสอบคำสั่งซื้อของคุณหรือลองใหม่อีกครั้ง")
+                    return redirect('orders:cart')
+                return self._redirect_to_existing_order(request, existing_order)
+
+        # 1. นับการใช้โปรโมชั่น (ตรวจ max_uses อีกครั้ง ณ ตอนชำระเงิน)
+        if not self._update_promotion_usage(snapshot):
+            # ย้อนคำสั่งซื้อและ key ด้านบนด้วย
+            transaction.set_rollback(True)
+            messages.error(
+                request,
+                f"โค้ดส่วนลด '{snapshot.promotion_code}' ใช้ไม่ได้แล้ว (หมดอายุหรือถูกใช้ครบจำนวน) กรุณานำโค้ดออกจากตะกร้าแล้วลองอีกครั้ง",
+            )
+            return redirect('orders:cart')
+
+        # 1.1 ตัดสต็อกทุกรายการด้วย UPDATE เดียว (ถ้ารายการใดไม่พอ จะไม่ตัดสต็อกเลย)
+        #     การจองในตะกร้านี้ (ถ้ามี) จะถูกคืนก่อนตัดสต็อกใน transaction เดียวกัน
+        try:
+            decrement_stock(snapshot.stock_quantities(), holder=cart_manager.hold_key)
+        except InsufficientStock as e:
+            # ย้อนคำสั่งซื้อ key และการนับโปรโมชั่นด้านบนด้วย
+            transaction.set_rollback(True)
+            messages.error(request, str(e))
+            return redirect('orders:cart')
+
+        # 2. สร้าง Order Items
+        self._create_order_items(new_order, snapshot)
+        
+        # 3. งานที่ไม่จำเป็นต้องเสร็จก่อนตอบกลับ (เช่น อีเมลยืนยัน) ส่งเข้าคิวให้ worker ทำ (manage.py run_jobs)
+        #    งานถูกบันทึกใน transaction เดียวกับคำสั่งซื้อ จึงถูกทำหลังคำสั่งซื้อ commit แล้วเท่านั้น
+        enqueue('orders.send_order_confirmation', {'order_id': new_order.pk})
+        if payment_slip_name:
+            enqueue('orders.process_payment_slip', {'order_id': new_order.pk})
+
+        # 4. ล้างตะกร้าสินค้า (รีเซ็ตยอดรวมที่เก็บไว้ใน Cart ด้วย)
+        cart_manager.clear()
+        
+        messages.success(request, f"สร้างคำสั่งซื้อ #{new_order.order_number} สำเร็จแล้ว!")
+        return redirect('orders:order_detail', order_number=new_order.order_number)
+
+    @method_decorator(csrf_exempt)
+    def dispatch(self, request, *args, **kwargs):
+        # ต้องเพิ่ม upload handler ก่อนที่ request.POST/FILES จะถูกอ่าน (CsrfViewMiddleware อ่าน POST ก่อนถึง view)
+        # จึงยกเว้น CSRF ที่ระดับ middleware แล้วตรวจ CSRF เองด้านล่างหลังเพิ่ม handler
+        if request.method == 'POST':
+            request.upload_handlers.insert(0, PaymentSlipUploadHandler(request))
+        return csrf_protect(super().dispatch)(request, *args, **kwargs)
 
-    @transaction.atomic
     def post(self, request):
-        # 1. ใช้ CartManager เพื่อดึง Cart ที่ถูกต้อง
+        # 0. ถ้าเป็นการส่งฟอร์มซ้ำ (key เดิม) ให้กลับไปยังคำสั่งซื้อเดิมโดยไม่สร้างใหม่
+        #    (ตรวจก่อนเช็คตะกร้า เพราะตะกร้าถูกล้างไปแล้วหลังสร้างคำสั่งซื้อครั้งแรก)
+        idempotency_key = request.POST.get('idempotency_key', '')[:64]
+        existing_order = self._get_idempotent_order(idempotency_key)
+        if existing_order is not None:
+            return self._redirect_to_existing_order(request, existing_order)
+
+        # 1. ใช้ CartManager เพื่อดึง Cart ที่ถูกต้อง และอ่านรายการทั้งหมด (พร้อม variant/product) ครั้งเดียว
+        #    ยอดรวม/ส่วนลด/ยอดสุทธิคำนวณจาก snapshot นี้ ไม่ query ซ้ำ
         cart_manager = CartManager(request)
         cart = cart_manager.cart
+        snapshot = cart_manager.snapshot()
         
-        if not cart.items.exists():
+        if snapshot.is_empty():
             messages.warning(request, "ตะกร้าสินค้าว่างเปล่า ไม่สามารถดำเนินการต่อได้")
-            return redirect('orders:cart_summary')
+            return redirect('orders:cart')
             
-        form = CheckoutForm(request.POST)
-
-        # คำนวณยอดรวมและส่วนลดล่าสุดอีกครั้ง
-        subtotal = cart_manager.get_subtotal()
-        grand_total = cart_manager.get_grand_total()
+        form = CheckoutForm(
+            request.POST,
+            request.FILES,
+            payment_slip_upload=getattr(request, 'payment_slip_upload', None),
+        )
+
+        subtotal = snapshot.subtotal
+        grand_total = snapshot.grand_total
         
         if form.is_valid():
             data = form.cleaned_data
-            
-            # 1. สร้าง Order
-            new_order = Order.objects.create(
-                user=request.user if request.user.is_authenticated else None,
-                
-                full_name=data['full_name'],
-                email=data['email'],
-                phone_number=data['phone_number'],
-                shipping_address=data['shipping_address'],
-                payment_method=data['payment_method'],
-                
-                # สรุปทางการเงิน (ใช้ค่าที่คำนวณล่าสุดจาก CartManager)
-                total_amount=subtotal.quantize(Decimal('0.00')),
-                discount_amount=cart.discount_amount.quantize(Decimal('0.00')),
-                grand_total=grand_total.quantize(Decimal('0.00')),
+
+            # สลิปถูกสตรีม/คำนวณ hash ระหว่างอัปโหลดแล้ว บันทึกลง storage ก่อนเปิด transaction
+            # เพื่อไม่ให้การเขียนไฟล์ใหญ่ถือ transaction ของคำสั่งซื้อไว้
+            payment_slip_name, payment_slip_sha256 = None, ''
+            if data.get('payment_slip'):
+                payment_slip_sha256 = request.payment_slip_upload['sha256']
+                payment_slip_name = store_payment_slip(data['payment_slip'], payment_slip_sha256)
+
+            return self._place_order(
+                request, cart_manager, snapshot, data, idempotency_key, payment_slip_name, payment_slip_sha256,
             )
-            
-            # 2. สร้าง Order Items
-            self._create_order_items(new_order, cart.items.all())
-            
-            # 3. อัปเดต Promotion usage
-            self._update_promotion_usage(cart)
-                
-            # 4. ล้างตะกร้าสินค้า
-            cart.items.all().delete() 
-            cart.promotion_code = ""
-            cart.discount_amount = Decimal('0.00')
-            cart.save(update_fields=['promotion_code', 'discount_amount'])
-            
-            messages.success(request, f"สร้างคำสั่งซื้อ #{new_order.order_number} สำเร็จแล้ว!")
-            return redirect('orders:order_detail', order_number=new_order.order_number)
 
         # หากฟอร์มไม่ถูกต้อง
         context = {
             'cart': cart,
             'form': form,
-            'cart_items': cart.items.select_related('variant__product').all(),
+            'cart_items': snapshot.items,
             'subtotal': subtotal,                 # <--- ส่ง Subtotal กลับไป
             'grand_total': grand_total,           # <--- ส่ง Grand Total กลับไป
-            'discount_amount': cart.discount_amount, 
+            'discount_amount': snapshot.discount_amount, 
         }
         messages.error(request, "ข้อมูลการจัดส่งไม่สมบูรณ์ กรุณาตรวจสอบอีกครั้ง")
         return render(request, self.template_name, context)
@@ -399,46 +524,32 @@ def validate_coupon(request):
         return JsonResponse({'valid': False, 'message': 'กรุณาใส่โค้ดส่วนลด'})
     
     try:
-        # 2. ค้นหาโค้ดในฐานข้อมูล
-        # เราใช้ Promotion Model ของคุณ
-        promotion = Promotion.objects.get(code=coupon_code)
-        
-        # 3. ตรวจสอบเงื่อนไขตาม Model Properties และฟิลด์
+        # 2. ค้นหาโค้ดผ่าน cache (ช่องกรอกโค้ดเรียก endpoint นี้บ่อย รวมถึงโค้ดที่ไม่มีอยู่จริง)
+        promotion = get_promotion(coupon_code)
+        if promotion is None:
+            raise Promotion.DoesNotExist
         
-        # 3.1 ตรวจสอบสถานะและวันที่ (ใช้ @property is_valid ที่คุณสร้าง)
-        if not promotion.is_valid:
-            # ใช้ property is_valid ที่อยู่ใน Model.py ของคุณ
+        # 3. ตรวจสอบเงื่อนไขและคำนวณส่วนลดด้วย pricing engine กลาง (ดู orders.pricing)
+        price = price_subtotal(subtotal, promotion)
+
+        # 3.1 ตรวจสอบสถานะ วันที่ และจำนวนครั้งที่ใช้
+        if price.error == REASON_INVALID:
             return JsonResponse({
                 'valid': False, 
                 'message': 'โค้ดนี้ถูกปิดใช้งาน หรือหมดอายุ/ใช้ครบจำนวนแล้ว'
             })
             
         # 3.2 ตรวจสอบยอดสั่งซื้อขั้นต่ำ
-        if subtotal < promotion.min_order_amount:
+        if price.error == REASON_MIN_ORDER:
              return JsonResponse({
                 'valid': False, 
                 'message': f'ยอดสั่งซื้อขั้นต่ำสำหรับโค้ดนี้คือ {promotion.min_order_amount.quantize(Decimal("0.01"))} บาท'
              })
         
-        # 4. คำนวณมูลค่าส่วนลด
-        
-        if promotion.discount_type == DiscountType.PERCENTAGE:
-            # คำนวณส่วนลดแบบเปอร์เซ็นต์
-            discount_amount = subtotal * (promotion.discount_value / Decimal(100))
-        elif promotion.discount_type == DiscountType.FIXED_AMOUNT:
-            # คำนวณส่วนลดแบบจำนวนเงินคงที่
-            discount_amount = promotion.discount_value
-        else:
-            discount_amount = Decimal(0)
-
-        # 5. ตรวจสอบให้แน่ใจว่าส่วนลดไม่เกินยอดรวมสินค้า
-        final_discount = min(discount_amount, subtotal)
-        final_discount = final_discount.quantize(Decimal("0.01"))
-        
-        # 6. ส่งผลลัพธ์กลับในรูปแบบ JSON
+        # 4. ส่งผลลัพธ์กลับในรูปแบบ JSON (ส่วนลดไม่เกินยอดรวมสินค้าแล้ว)
         return JsonResponse({
             'valid': True,
-            'discount_amount': final_discount,
+            'discount_amount': price.discount_amount,
             'message': 'ใช้โค้ดส่วนลดสำเร็จ'
         })
         
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Product, ProductVariant, Category, Brand # 1. เพิ่ม Category และ Brand
+from . import search
 
 # --- ProductVariant Inline Admin ---
 class ProductVariantInline(admin.TabularInline):
@@ -19,6 +20,7 @@ class ProductAdmin(admin.ModelAdmin):
         'status', 
         'category', # เพิ่ม category เพื่อให้กรองง่ายขึ้น
         'get_min_price', # ฟังก์ชันแสดงราคาต่ำสุด
+        'total_stock',
         'is_featured'
     )
     
@@ -38,13 +40,15 @@ class ProductAdmin(admin.ModelAdmin):
     search_fields = ('name', 'description', 'sku')
     prepopulated_fields = {'slug': ('name',)}
     inlines = [ProductVariantInline]
+
+    def get_search_results(self, request, queryset, search_term):
+        # ค้นผ่าน index FTS5 (products.search) แทน icontains ที่ต้องอ่านทุกแถว
+        return search.filter_queryset(queryset, search_term), False
     
-    # ฟังก์ชันคำนวณราคาเริ่มต้น (ราคาต่ำสุดของ Variants ที่มีสต็อก)
+    # ราคาเริ่มต้นอ่านจาก Product.min_price ที่เก็บไว้ (ดู products.aggregates) ไม่ต้อง query variants ทีละแถว
+    @admin.display(description='เริ่มต้นที่', ordering='min_price')
     def get_min_price(self, obj):
-        # ดึงราคาต่ำสุดจาก variants ทั้งหมดที่มีสต็อก > 0
-        min_price = obj.variants.filter(stock__gt=0).order_by('current_price').values_list('current_price', flat=True).first()
-        return f"฿ {min_price:,.2f}" if min_price is not None else "N/A"
-    get_min_price.short_description = 'เริ่มต้นที่'
+        return f"฿ {obj.min_price:,.2f}" if obj.min_price is not None else "N/A"
 
 
 # --- 2. Register Helper Models ---
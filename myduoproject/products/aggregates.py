@@ -0,0 +1,57 @@
+"""
+ค่าสรุปของสินค้าที่เก็บไว้ใน Product (min_price, max_price, total_stock, default_variant)
+
+- refresh_aggregates: คำนวณใหม่เฉพาะสินค้าที่ระบุด้วย UPDATE เดียว (subquery ต่อสินค้าอ่านเฉพาะ variant ของสินค้านั้นผ่าน index)
+  ถูกเรียกเมื่อ ProductVariant ถูกบันทึก/ลบ (ดู products.signals)
+- refresh_stock_totals: อัปเดตเฉพาะ total_stock ของสินค้าที่มี variant ถูกตัดสต็อกแบบ bulk (ดู orders.inventory.decrement_stock)
+- manage.py rebuild_product_aggregates: คำนวณใหม่ทั้งหมดเป็นช่วง ๆ สำหรับแก้ค่าที่คลาดเคลื่อน
+ทุกครั้งที่ค่าสรุปเปลี่ยน ตัวนับ filter (products.facets) ของสินค้าเหล่านั้นจะถูกอัปเดตหลัง commit
+"""
+from django.db.models import IntegerField, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from . import facets
+from .models import Product, ProductVariant
+
+
+def _variants():
+    return ProductVariant.objects.filter(product=OuterRef('pk')).order_by().values('product')
+
+
+def _total_stock():
+    return Coalesce(
+        Subquery(_variants().annotate(total=Sum('stock')).values('total')),
+        Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def aggregate_expressions() -> dict:
+    """expression สำหรับ Product.objects.update(...) ที่คำนวณค่าสรุปจาก variant ของแต่ละสินค้า"""
+    return {
+        'min_price': Subquery(_variants().annotate(price=Min('current_price')).values('price')),
+        'max_price': Subquery(_variants().annotate(price=Max('current_price')).values('price')),
+        'total_stock': _total_stock(),
+        # variant ที่ตั้งเป็นตัวเลือกหลัก ถ้าไม่มีใช้ตัวแรกที่สร้าง
+        'default_variant': Subquery(
+            ProductVariant.objects.filter(product=OuterRef('pk')).order_by('-is_default', 'id').values('id')[:1]
+        ),
+    }
+
+
+def refresh_aggregates(product_ids) -> int:
+    """คำนวณค่าสรุปของสินค้าที่ระบุใหม่ด้วย UPDATE เดียว"""
+    product_ids = list(product_ids)
+    updated = Product.objects.filter(pk__in=product_ids).update(**aggregate_expressions())
+    facets.schedule_update(product_ids)
+    return updated
+
+
+def refresh_stock_totals(variant_ids) -> int:
+    """คำนวณ total_stock ใหม่ของสินค้าที่เป็นเจ้าของ variant เหล่านี้ (ราคาไม่เปลี่ยนจากการตัดสต็อก)"""
+    product_ids = list(
+        ProductVariant.objects.filter(pk__in=list(variant_ids)).values_list('product_id', flat=True).distinct()
+    )
+    updated = Product.objects.filter(pk__in=product_ids).update(total_stock=_total_stock())
+    facets.schedule_update(product_ids)
+    return updated
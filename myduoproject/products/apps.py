@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class ProductsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'products'
+
+    def ready(self):
+        # ดูแลค่าสรุปของสินค้า (products.aggregates) และ index ค้นหา (products.search)
+        from . import signals  # noqa: F401
@@ -0,0 +1,123 @@
+"""
+Cache ของหน้ารายละเอียดสินค้า (read model ต่อ slug ใน Django cache)
+
+- read model คือ dict ของข้อมูลที่หน้า product_detail ใช้ (สินค้า หมวดหมู่ แบรนด์ และ variant พร้อมราคา)
+  สร้างด้วย 2 query แล้วเก็บไว้ในคีย์ที่มี version: products:detail:<slug>:<version>
+- version ของแต่ละ slug เก็บแยก (products:detail-version:<slug>) และถูกเปลี่ยนเป็นค่าใหม่ (bump) หลัง commit
+  เมื่อ Product, ProductVariant, Category หรือ Brand ที่เกี่ยวข้องเปลี่ยน (ดู products.signals)
+  ข้อมูลของ version เก่าไม่ถูกอ่านอีกและหมดอายุไปเอง จึงไม่ต้องตามลบทุกคีย์
+- สต็อกไม่อยู่ใน read model เพราะเปลี่ยนทุกครั้งที่มีการจอง/ชำระเงิน live_stock อ่านจากฐานข้อมูลทุกครั้งด้วย query เล็ก ๆ
+  ผ่าน index ของ product_id ต่อหนึ่งการเปิดหน้า
+
+- bump เปลี่ยน version ใน cache ที่ตั้งค่าไว้เท่านั้น cache จึงต้องใช้ร่วมกันทุก process (ฐานข้อมูล, Redis, Memcached)
+  ถ้าเป็น LocMemCache แต่ละ worker มี version ของตัวเอง worker อื่นจะแสดงราคา/variant เก่าจนหมดอายุ
+  (manage.py check จะเตือน ดู check_cache_backend)
+
+settings: PRODUCT_DETAIL_CACHE_ALIAS (ค่าเริ่มต้น 'default'), PRODUCT_DETAIL_CACHE_TIMEOUT (วินาที)
+"""
+import uuid
+from functools import partial
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from .models import Product, ProductVariant
+
+DEFAULT_PRODUCT_DETAIL_CACHE_TIMEOUT = 60 * 60
+
+
+def _alias():
+    return getattr(settings, 'PRODUCT_DETAIL_CACHE_ALIAS', 'default')
+
+
+def _cache():
+    return caches[_alias()]
+
+
+@checks.register(checks.Tags.caches)
+def check_cache_backend(app_configs, **kwargs):
+    """เตือนเมื่อ cache ของหน้ารายละเอียดสินค้าอยู่ใน process (bump ไม่ถึง worker อื่น)"""
+    if isinstance(_cache(), LocMemCache):
+        return [checks.Warning(
+            f"PRODUCT_DETAIL_CACHE_ALIAS ('{_alias()}') เป็น LocMemCache: การแก้ไขสินค้าจะล้าง cache "
+            "เฉพาะ process ที่บันทึก process อื่นจะแสดงข้อมูลเก่าจนครบ PRODUCT_DETAIL_CACHE_TIMEOUT",
+            hint="ตั้ง PRODUCT_DETAIL_CACHE_ALIAS เป็น cache ที่ใช้ร่วมกัน เช่น DatabaseCache, Redis หรือ Memcached",
+            id='products.W001',
+        )]
+    return []
+
+
+def _timeout():
+    return getattr(settings, 'PRODUCT_DETAIL_CACHE_TIMEOUT', DEFAULT_PRODUCT_DETAIL_CACHE_TIMEOUT)
+
+
+def _version_key(slug):
+    return f'products:detail-version:{slug}'
+
+
+def _detail_key(slug, version):
+    return f'products:detail:{slug}:{version}'
+
+
+def build_detail(slug) -> dict | None:
+    """read model ของสินค้าจากฐานข้อมูล (None ถ้าไม่พบ slug)"""
+    product = Product.objects.select_related('category', 'brand').filter(slug=slug).first()
+    if product is None:
+        return None
+    variants = list(
+        ProductVariant.objects.filter(product=product).order_by('id').values('id', 'size', 'current_price', 'original_price')
+    )
+    return {
+        'id': product.pk,
+        'name': product.name,
+        'slug': product.slug,
+        'description': product.description,
+        'sku': product.sku,
+        'image_url': product.image.url if product.image else None,
+        'category_name': product.category.name if product.category else None,
+        'brand_name': product.brand.name if product.brand else None,
+        'default_variant_id': product.default_variant_id,
+        'variants': variants,
+    }
+
+
+def get_detail(slug) -> dict | None:
+    """read model จาก cache (ถ้าไม่มีจะสร้างและเก็บไว้) แต่ละครั้งได้ dict ใหม่ ผู้เรียกแก้ไขได้โดยไม่กระทบ cache"""
+    cache = _cache()
+    version = cache.get(_version_key(slug))
+    if version is None:
+        version = uuid.uuid4().hex
+        # add: ถ้ามี process อื่นตั้ง version ไปพร้อมกันให้ใช้ค่านั้น
+        if not cache.add(_version_key(slug), version, None):
+            version = cache.get(_version_key(slug), version)
+
+    detail = cache.get(_detail_key(slug, version))
+    if detail is None:
+        detail = build_detail(slug)
+        if detail is None:
+            return None
+        cache.set(_detail_key(slug, version), detail, _timeout())
+    return {**detail, 'variants': [dict(variant) for variant in detail['variants']]}
+
+
+def live_stock(product_id) -> dict:
+    """{variant_id: จำนวนที่ขายได้} อ่านจากฐานข้อมูลทุกครั้ง (ดู ProductVariant.available_stock)"""
+    return {
+        pk: max(stock - reserved, 0)
+        for pk, stock, reserved in ProductVariant.objects.filter(product_id=product_id).values_list('id', 'stock', 'reserved')
+    }
+
+
+def bump(slugs):
+    """เปลี่ยน version ของ slug เหล่านี้ทันที (read model เดิมจะไม่ถูกอ่านอีก)"""
+    slugs = {slug for slug in slugs if slug}
+    if slugs:
+        _cache().set_many({_version_key(slug): uuid.uuid4().hex for slug in slugs}, None)
+
+
+def schedule_bump(slugs):
+    """bump หลัง transaction ปัจจุบัน commit เพื่อไม่ให้ request อื่นเก็บข้อมูลก่อน commit ไว้ใน version ใหม่"""
+    transaction.on_commit(partial(bump, list(slugs)))
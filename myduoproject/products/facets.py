@@ -0,0 +1,209 @@
+"""
+ตัวนับจำนวนสินค้าตาม filter ของหน้ารายการ (หมวดหมู่ แบรนด์ ช่วงราคา และเฉพาะที่มีสินค้า) แบบไม่ต้อง GROUP BY
+
+- FacetIndex เก็บ bitset (int ของ Python, bit ที่ n = Product.id n) ต่อค่าของแต่ละ facet เฉพาะสินค้าที่แสดงหน้าร้าน
+  การนับคือ AND ของ bitset แล้ว int.bit_count() จึงใช้เวลาระดับ microsecond ต่อค่า
+- จำนวนของแต่ละ facet นับโดยใช้ filter ของ facet อื่นเท่านั้น (เลือกหมวดหมู่แล้วยังเห็นจำนวนของหมวดหมู่อื่น)
+- ช่วงราคาอิงจาก Product.min_price และสต็อกจาก Product.total_stock (ดู products.aggregates)
+- index ถูกสร้างด้วย query เดียวและเก็บไว้ใน process เป็นเวลา FACET_INDEX_TTL วินาที
+  การเปลี่ยนแปลงใน process เดียวกันอัปเดตทีละสินค้าหลัง commit (schedule_update) process อื่นจะเห็นเมื่อครบ TTL
+"""
+import threading
+import time
+from bisect import bisect_right
+from decimal import Decimal
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import LISTED_STATUSES, Brand, Category, Product
+
+DEFAULT_FACET_INDEX_TTL = 300
+# ขอบของช่วงราคา (บาท) ช่วงสุดท้ายไม่มีขอบบน
+DEFAULT_PRICE_BANDS = (0, 500, 1000, 2000, 5000)
+
+FACETS = ('category', 'brand', 'price', 'in_stock')
+
+_FIELDS = ('pk', 'status', 'category_id', 'brand_id', 'min_price', 'total_stock')
+
+
+def price_bands() -> list[tuple]:
+    """[(ราคาต่ำสุด, ราคาสูงสุดไม่รวม หรือ None), ...] จาก PRODUCT_PRICE_BANDS"""
+    edges = [Decimal(edge) for edge in getattr(settings, 'PRODUCT_PRICE_BANDS', DEFAULT_PRICE_BANDS)]
+    return list(zip(edges, [*edges[1:], None]))
+
+
+def band_key(low, high) -> str:
+    return f'{low}-{high}' if high is not None else f'{low}-'
+
+
+def parse_band(key):
+    """แปลงค่า ?price= กลับเป็น (low, high) (None ถ้าไม่ใช่ช่วงที่ตั้งค่าไว้)"""
+    for low, high in price_bands():
+        if band_key(low, high) == key:
+            return low, high
+    return None
+
+
+def _bitset(pks) -> int:
+    bits = bytearray((max(pks, default=0) >> 3) + 1)
+    for pk in pks:
+        bits[pk >> 3] |= 1 << (pk & 7)
+    return int.from_bytes(bits, 'little')
+
+
+class FacetIndex:
+    """bitset ต่อค่าของแต่ละ facet (แก้ไขผ่าน update เท่านั้น และต้องถือ lock ของ module ขณะอ่าน/เขียน)"""
+
+    def __init__(self, rows, categories, brands):
+        self.bands = price_bands()
+        self._band_edges = [low for low, high in self.bands]
+        self.categories = {pk: (slug, name) for pk, slug, name in categories}
+        self.category_ids = {slug: pk for pk, (slug, name) in self.categories.items()}
+        self.brands = dict(brands)
+        self.values = {}
+        members = {facet: {} for facet in FACETS}
+        for pk, status, *fields in rows:
+            if status not in LISTED_STATUSES:
+                continue
+            self.values[pk] = values = self._facet_values(*fields)
+            for facet, value in values.items():
+                if value is not None:
+                    members[facet].setdefault(value, []).append(pk)
+        # สร้าง bitset จากรายการ id ครั้งเดียว (OR ทีละแถวจะสร้าง int ใหม่ทุกครั้ง)
+        self.all = _bitset(self.values)
+        self.sets = {facet: {value: _bitset(pks) for value, pks in values.items()} for facet, values in members.items()}
+
+    def _band(self, price):
+        if price is None or price < self._band_edges[0]:
+            return None
+        low, high = self.bands[bisect_right(self._band_edges, price) - 1]
+        return band_key(low, high)
+
+    def _facet_values(self, category_id, brand_id, min_price, total_stock) -> dict:
+        return {
+            'category': category_id,
+            'brand': brand_id,
+            'price': self._band(min_price),
+            'in_stock': True if total_stock > 0 else None,
+        }
+
+    def _add(self, pk, status, *fields):
+        if status not in LISTED_STATUSES:
+            return
+        values = self._facet_values(*fields)
+        bit = 1 << pk
+        self.all |= bit
+        for facet, value in values.items():
+            if value is not None:
+                self.sets[facet][value] = self.sets[facet].get(value, 0) | bit
+        self.values[pk] = values
+
+    def _remove(self, pk):
+        values = self.values.pop(pk, None)
+        if values is None:
+            return
+        mask = ~(1 << pk)
+        self.all &= mask
+        for facet, value in values.items():
+            if value is None:
+                continue
+            remaining = self.sets[facet][value] & mask
+            if remaining:
+                self.sets[facet][value] = remaining
+            else:
+                del self.sets[facet][value]
+
+    def update(self, product_ids, rows):
+        """แทนที่ข้อมูลของสินค้าที่ระบุด้วย rows (สินค้าที่ไม่มีใน rows ถือว่าถูกลบ)"""
+        for pk in product_ids:
+            self._remove(pk)
+        for row in rows:
+            self._add(*row)
+
+    def _matching(self, filters, exclude=None) -> int:
+        matching = self.all
+        for facet, value in filters.items():
+            if facet != exclude:
+                matching &= self.sets[facet].get(value, 0)
+        return matching
+
+    def count(self, filters) -> int:
+        """จำนวนสินค้าที่ตรงกับทุก filter ({facet: value})"""
+        return self._matching(filters).bit_count()
+
+    def counts(self, filters) -> dict:
+        """{facet: {value: จำนวน}} ของทุก facet ภายใต้ filter ของ facet อื่น (ไม่รวมค่าที่มีจำนวน 0)"""
+        result = {}
+        for facet in FACETS:
+            base = self._matching(filters, exclude=facet)
+            counts = {}
+            for value, bits in self.sets[facet].items():
+                count = (base & bits).bit_count()
+                if count:
+                    counts[value] = count
+            result[facet] = counts
+        return result
+
+
+def _rows(queryset):
+    return queryset.values_list(*_FIELDS)
+
+
+def build_index() -> FacetIndex:
+    return FacetIndex(
+        _rows(Product.objects.filter(status__in=LISTED_STATUSES)),
+        Category.objects.values_list('pk', 'slug', 'name'),
+        Brand.objects.values_list('pk', 'name'),
+    )
+
+
+_index = None
+_expires_at = 0
+_lock = threading.Lock()
+
+
+def _get_index() -> FacetIndex:
+    # ต้องถือ _lock อยู่แล้ว
+    global _index, _expires_at
+    if _index is None or _expires_at < time.monotonic():
+        _index = build_index()
+        _expires_at = time.monotonic() + getattr(settings, 'FACET_INDEX_TTL', DEFAULT_FACET_INDEX_TTL)
+    return _index
+
+
+def invalidate():
+    """ล้าง index ทั้งหมด (เช่น เมื่อหมวดหมู่/แบรนด์ถูกแก้ไข ดู products.signals)"""
+    global _index
+    with _lock:
+        _index = None
+
+
+def update_products(product_ids):
+    """อ่านสินค้าที่ระบุจากฐานข้อมูลแล้วอัปเดต index (ถ้ายังไม่ได้สร้าง index จะไม่ทำอะไร)"""
+    product_ids = list(product_ids)
+    if _index is None or not product_ids:
+        return
+    rows = list(_rows(Product.objects.filter(pk__in=product_ids)))
+    with _lock:
+        if _index is not None:
+            _index.update(product_ids, rows)
+
+
+def schedule_update(product_ids):
+    """อัปเดต index หลัง transaction ปัจจุบัน commit (ถ้า rollback index จะไม่เปลี่ยน)"""
+    transaction.on_commit(partial(update_products, list(product_ids)))
+
+
+def category_id(slug):
+    """id ของหมวดหมู่จาก slug (None ถ้าไม่พบ)"""
+    with _lock:
+        return _get_index().category_ids.get(slug)
+
+
+def facet_counts(filters) -> tuple[dict, FacetIndex]:
+    """จำนวนของทุก facet ภายใต้ filters พร้อม index (สำหรับชื่อหมวดหมู่/แบรนด์และช่วงราคา)"""
+    with _lock:
+        index = _get_index()
+        return index.counts(filters), index
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.aggregates import refresh_aggregates
+from products.models import Product
+
+
+class Command(BaseCommand):
+    """
+    คำนวณค่าสรุปของสินค้า (min_price, max_price, total_stock, default_variant) ใหม่ทั้งหมดจาก ProductVariant
+    ใช้หลังแก้ข้อมูล variant โดยตรงในฐานข้อมูล หรือเมื่อค่าที่เก็บไว้คลาดเคลื่อน (ดู products.aggregates)
+    ทำทีละ batch ตาม primary key แต่ละ batch เป็น UPDATE เดียว จึงรันได้ระหว่างที่ร้านเปิดใช้งาน
+    """
+    help = 'Recompute the stored price/stock aggregates of every product from its variants.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='จำนวนสินค้าต่อ batch (ค่าเริ่มต้น 1000)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total, last_id = 0, 0
+        started = time.monotonic()
+
+        while True:
+            ids = list(
+                Product.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            total += refresh_aggregates(ids)
+            last_id = ids[-1]
+            self.stdout.write(f"  {total} products ({time.monotonic() - started:.1f}s)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt aggregates for {total} products in {time.monotonic() - started:.2f}s."
+        ))
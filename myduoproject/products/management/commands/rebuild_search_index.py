@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products import search
+
+
+class Command(BaseCommand):
+    """
+    สร้าง index ค้นหาสินค้า (FTS5) ใหม่ทั้งหมดจากตาราง Product (ดู products.search)
+    ใช้หลังนำเข้าข้อมูลด้วย bulk_create/update ซึ่งไม่ส่ง signal หรือเมื่อ index ไม่ตรงกับข้อมูล
+    """
+    help = 'Rebuild the full-text product search index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='จำนวนสินค้าต่อ batch (ค่าเริ่มต้น 500)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def on_batch(total):
+            self.stdout.write(f"  {total} products ({time.monotonic() - started:.1f}s)")
+
+        total = search.rebuild(batch_size=options['batch_size'], on_batch=on_batch)
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {total} products in {time.monotonic() - started:.2f}s."
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 11:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_brand_alter_category_options_alter_product_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productvariant',
+            name='reserved',
+            field=models.PositiveIntegerField(default=0, verbose_name='จำนวนที่ถูกจองในตะกร้า'),
+        ),
+    ]
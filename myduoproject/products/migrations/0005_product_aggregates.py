@@ -0,0 +1,64 @@
+# Generated by Django 5.2.6 on 2026-10-17 12:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import IntegerField, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_aggregates(apps, schema_editor):
+    # เหมือน products.aggregates.aggregate_expressions แต่ใช้โมเดลของ migration
+    Product = apps.get_model('products', 'Product')
+    ProductVariant = apps.get_model('products', 'ProductVariant')
+    variants = ProductVariant.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    Product.objects.update(
+        min_price=Subquery(variants.annotate(price=Min('current_price')).values('price')),
+        max_price=Subquery(variants.annotate(price=Max('current_price')).values('price')),
+        total_stock=Coalesce(Subquery(variants.annotate(total=Sum('stock')).values('total')), Value(0), output_field=IntegerField()),
+        default_variant=Subquery(
+            ProductVariant.objects.filter(product=OuterRef('pk')).order_by('-is_default', 'id').values('id')[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='default_variant',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='products.productvariant', verbose_name='ตัวเลือกหลัก'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='max_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='ราคาสูงสุด'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='min_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='ราคาเริ่มต้น'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='total_stock',
+            field=models.IntegerField(default=0, editable=False, verbose_name='สต็อกรวม'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['min_price', 'id'], name='product_list_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'min_price', 'id'], name='product_list_cat_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['brand', 'min_price', 'id'], name='product_list_brand_price_idx'),
+        ),
+        migrations.RunPython(populate_aggregates, migrations.RunPython.noop),
+    ]
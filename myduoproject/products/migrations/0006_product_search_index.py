@@ -0,0 +1,57 @@
+import unicodedata
+
+from django.db import migrations
+
+# ตาราง FTS5 สำหรับค้นหาสินค้า (ดู products.search) rowid = Product.id
+# tokenizer trigram ค้นหาข้อความภาษาไทยที่ไม่มีช่องว่างได้ และ rank ตั้งค่าน้ำหนัก BM25 ตามคอลัมน์ (ชื่อสินค้ามากที่สุด)
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE products_product_fts USING fts5(
+        name, sku, brand, category, description,
+        tokenize = 'trigram'
+    )
+    """,
+    "INSERT INTO products_product_fts (products_product_fts, rank) VALUES ('rank', 'bm25(10.0, 8.0, 4.0, 3.0, 1.0)')",
+]
+
+BATCH_SIZE = 500
+
+INSERT_SQL = (
+    "INSERT INTO products_product_fts (rowid, name, sku, brand, category, description) "
+    "VALUES (%s, %s, %s, %s, %s, %s)"
+)
+
+# สำเนาของ products.search.normalize ณ ตอนสร้าง migration นี้ (migration ต้องไม่ import โค้ดของแอปที่อาจเปลี่ยนภายหลัง)
+_INVISIBLE = dict.fromkeys(map(ord, '\u200b\u200c\u200d\u2060\ufeff\u00ad'))
+
+
+def normalize(text):
+    return unicodedata.normalize('NFC', text or '').translate(_INVISIBLE).strip()
+
+
+def populate_search_index(apps, schema_editor):
+    # normalize ข้อความแบบเดียวกับการอัปเดตทีละสินค้า ทีละ batch ตาม primary key
+    Product = apps.get_model('products', 'Product')
+    last_id = 0
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            rows = list(
+                Product.objects.filter(pk__gt=last_id).order_by('pk')
+                .values_list('pk', 'name', 'sku', 'brand__name', 'category__name', 'description')[:BATCH_SIZE]
+            )
+            if not rows:
+                break
+            cursor.executemany(INSERT_SQL, [(pk, *(normalize(value) for value in values)) for pk, *values in rows])
+            last_id = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_SQL, reverse_sql="DROP TABLE products_product_fts"),
+        migrations.RunPython(populate_search_index, migrations.RunPython.noop),
+    ]
@@ -44,6 +44,18 @@ class Brand(models.Model):
 # Core Product Model
 # ----------------------------------------------------------------------
 
+# สถานะที่แสดงในหน้ารายการสินค้า
+LISTED_STATUSES = ['PRE_ORDER', 'AVAILABLE']
+
+
+def _listing_index(*fields, name):
+    """
+    index สำหรับหน้ารายการสินค้าตาม filter + ลำดับที่ ProductListView ใช้ (อ่านตามลำดับแล้วหยุดที่ LIMIT)
+    ไม่ใช้ partial index ตาม status เพราะ SQLite ใช้ partial index กับ status IN (?, ?) ที่เป็น parameter ไม่ได้
+    """
+    return models.Index(fields=[*fields, 'id'], name=name)
+
+
 class Product(models.Model):
     """
     โมเดลหลักสำหรับสินค้า
@@ -73,10 +85,33 @@ class Product(models.Model):
     # Image (requires django-pillow installed)
     image = models.ImageField(upload_to='products/%Y/%m/', blank=True, null=True, verbose_name="รูปภาพหลัก")
 
+    # ค่าสรุปจาก ProductVariant ที่เก็บไว้ล่วงหน้า (Denormalized) ดูแลโดย products.aggregates
+    # เพื่อให้หน้ารายการ การเรียงตามราคา และ admin อ่านจากคอลัมน์ได้โดยตรงโดยไม่ต้องรวมยอด variant ทุกครั้ง
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False, verbose_name="ราคาเริ่มต้น")
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False, verbose_name="ราคาสูงสุด")
+    total_stock = models.IntegerField(default=0, editable=False, verbose_name="สต็อกรวม")
+    default_variant = models.ForeignKey(
+        'ProductVariant', on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+        related_name='+', verbose_name="ตัวเลือกหลัก",
+    )
+
     class Meta:
         verbose_name_plural = "Products"
         verbose_name = "Product"
         ordering = ['name']
+        indexes = [
+            # เรียงใหม่สุด / ชื่อ: ทั้งหมด, กรองตามหมวดหมู่, กรองตามแบรนด์ (ดู ProductListView.SORTS)
+            # ลำดับใหม่สุด (-created_at, -id) ใช้ index แบบ ascending โดยอ่านย้อนหลัง
+            _listing_index('created_at', name='product_list_newest_idx'),
+            _listing_index('category', 'created_at', name='product_list_cat_newest_idx'),
+            _listing_index('brand', 'created_at', name='product_list_brand_newest_idx'),
+            _listing_index('name', name='product_list_name_idx'),
+            _listing_index('category', 'name', name='product_list_cat_name_idx'),
+            _listing_index('brand', 'name', name='product_list_brand_name_idx'),
+            _listing_index('min_price', name='product_list_price_idx'),
+            _listing_index('category', 'min_price', name='product_list_cat_price_idx'),
+            _listing_index('brand', 'min_price', name='product_list_brand_price_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -86,6 +121,10 @@ class Product(models.Model):
     def __str__(self):
         return self.name
 
+    @property
+    def in_stock(self):
+        return self.total_stock > 0
+
 # ----------------------------------------------------------------------
 # Product Variants Model
 # ----------------------------------------------------------------------
@@ -99,6 +138,8 @@ class ProductVariant(models.Model):
     original_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="ราคาปกติ")
     current_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="ราคาขายปัจจุบัน")
     stock = models.IntegerField(default=0, verbose_name="จำนวนในสต็อก")
+    # จำนวนที่ถูกจองไว้ในตะกร้า (ดู orders.inventory) อัปเดตแบบ incremental เพื่อไม่ต้องรวมยอดทุกครั้ง
+    reserved = models.PositiveIntegerField(default=0, verbose_name="จำนวนที่ถูกจองในตะกร้า")
     is_default = models.BooleanField(default=False, verbose_name="ตัวเลือกหลัก")
     
     class Meta:
@@ -109,3 +150,8 @@ class ProductVariant(models.Model):
 
     def __str__(self):
         return f"{self.product.name} - {self.size}"
+
+    @property
+    def available_stock(self):
+        """จำนวนที่ยังขายได้ (สต็อกหักจำนวนที่ถูกจองในตะกร้าอื่น)"""
+        return max(self.stock - self.reserved, 0)
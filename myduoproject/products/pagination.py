@@ -0,0 +1,103 @@
+"""
+Keyset (cursor) pagination สำหรับหน้ารายการสินค้า
+
+แทนที่ OFFSET + COUNT ด้วยการค้นหาต่อจากแถวสุดท้ายของหน้าก่อน (WHERE (a, b) > (x, y) ORDER BY a, b LIMIT n)
+ทุกหน้าจึงเร็วเท่ากันไม่ว่าจะลึกแค่ไหน และไม่ต้องนับจำนวนทั้งหมด
+ordering ต้องจบด้วยคอลัมน์ที่ไม่ซ้ำ (เช่น id) เพื่อให้ลำดับแน่นอน
+"""
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _cursor_value(value):
+    # datetime ต้องเก็บละเอียดถึง microsecond (DjangoJSONEncoder ตัดเหลือ millisecond ทำให้ cursor ไม่ตรงแถว)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(values) -> str:
+    data = json.dumps([_cursor_value(value) for value in values], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """แปลง cursor กลับเป็นค่าของคอลัมน์ ordering (Django แปลงสตริงเป็น datetime/Decimal ตอน filter เอง)"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor(cursor)
+    return values
+
+
+def _seek(ordering, values, reverse=False) -> Q:
+    """เงื่อนไขแถวที่อยู่ถัดจาก values ตาม ordering: a > x OR (a = x AND b > y) ..."""
+    condition, equal = Q(), Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        descending = field.startswith('-') != reverse
+        condition |= equal & Q(**{f"{name}__{'lt' if descending else 'gt'}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def _reverse(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+class KeysetPage:
+    """หน้าหนึ่งของผลลัพธ์ พร้อม cursor ของหน้าถัดไป/ก่อนหน้า (None ถ้าไม่มี)"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+
+def paginate(queryset, ordering, per_page: int, after: str = None, before: str = None) -> KeysetPage:
+    """
+    ดึงหน้าหนึ่งด้วย query เดียว (LIMIT per_page + 1 เพื่อรู้ว่ามีหน้าถัดไปหรือไม่)
+    after: cursor สำหรับหน้าถัดไป, before: cursor สำหรับหน้าก่อนหน้า (ดึงย้อนลำดับแล้วกลับลำดับในหน่วยความจำ)
+    """
+    names = [field.lstrip('-') for field in ordering]
+
+    if before:
+        values = decode_cursor(before, len(ordering))
+        rows = list(queryset.filter(_seek(ordering, values, reverse=True)).order_by(*_reverse(ordering))[:per_page + 1])
+        has_previous, rows = len(rows) > per_page, rows[:per_page][::-1]
+        has_next = True
+    else:
+        if after:
+            queryset = queryset.filter(_seek(ordering, decode_cursor(after, len(ordering))))
+        rows = list(queryset.order_by(*ordering)[:per_page + 1])
+        has_next, rows = len(rows) > per_page, rows[:per_page]
+        has_previous = bool(after)
+
+    def cursor(row):
+        return encode_cursor(getattr(row, name) for name in names)
+
+    return KeysetPage(
+        rows,
+        next_cursor=cursor(rows[-1]) if has_next and rows else None,
+        previous_cursor=cursor(rows[0]) if has_previous and rows else None,
+    )
@@ -0,0 +1,165 @@
+"""
+ค้นหาสินค้าด้วย SQLite FTS5 (ตาราง products_product_fts สร้างใน migration 0006)
+
+- ใช้ tokenizer แบบ trigram: แบ่งข้อความเป็นชิ้นละ 3 ตัวอักษรโดยไม่ต้องอาศัยช่องว่าง
+  ภาษาไทยที่เขียนติดกันจึงค้นหาด้วยคำใดก็ได้ที่อยู่ในข้อความ (substring) โดยไม่ต้องมีตัวตัดคำ
+  คำค้นที่สั้นกว่า 3 ตัวอักษรใช้ LIKE กับชื่อ/SKU/แบรนด์/หมวดหมู่แทน (ไม่ผ่าน index จึงใช้ร่วมกับคำที่ยาวกว่าได้ดีที่สุด)
+- เรียงผลด้วย BM25 โดยให้น้ำหนักชื่อสินค้ามากที่สุด (ตั้งค่า rank ไว้ในตาราง ดู RANK_WEIGHTS)
+- index ถูกอัปเดตทีละสินค้าเมื่อ Product/Category/Brand ถูกบันทึกหรือลบ (ดู products.signals)
+  และสร้างใหม่ทั้งหมดได้ด้วย manage.py rebuild_search_index
+- ข้อความถูก normalize (NFC และตัดอักขระที่มองไม่เห็น เช่น zero-width space ที่พบบ่อยในข้อความภาษาไทย)
+  ทั้งตอนสร้าง index และตอนค้นหา
+"""
+import unicodedata
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from .models import LISTED_STATUSES, Product
+
+FTS_TABLE = 'products_product_fts'
+# ลำดับคอลัมน์ในตาราง FTS (rowid = Product.id)
+FTS_COLUMNS = ('name', 'sku', 'brand', 'category', 'description')
+# น้ำหนัก BM25 ตามลำดับคอลัมน์ข้างบน
+RANK_WEIGHTS = (10.0, 8.0, 4.0, 3.0, 1.0)
+# คอลัมน์ที่ใช้ LIKE กับคำค้นสั้น (ไม่รวม description ซึ่งยาว)
+SHORT_TERM_COLUMNS = ('name', 'sku', 'brand', 'category')
+
+MIN_TERM_LENGTH = 3
+DEFAULT_SEARCH_MAX_RESULTS = 500
+_BATCH_SIZE = 500
+
+_INVISIBLE = dict.fromkeys(map(ord, '\u200b\u200c\u200d\u2060\ufeff\u00ad'))
+
+
+def normalize(text) -> str:
+    return unicodedata.normalize('NFC', text or '').translate(_INVISIBLE).strip()
+
+
+def _chunks(values, size=_BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _documents(product_ids):
+    """เอกสารของ index (rowid, *FTS_COLUMNS) ที่ normalize แล้ว"""
+    rows = Product.objects.filter(pk__in=product_ids).values_list(
+        'pk', 'name', 'sku', 'brand__name', 'category__name', 'description',
+    )
+    return [(pk, *(normalize(value) for value in values)) for pk, *values in rows]
+
+
+def _delete(cursor, product_ids):
+    cursor.execute(
+        f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(product_ids))})",
+        product_ids,
+    )
+
+
+def _insert(cursor, documents):
+    cursor.executemany(
+        f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) VALUES ({', '.join(['%s'] * (len(FTS_COLUMNS) + 1))})",
+        documents,
+    )
+
+
+def index_products(product_ids) -> int:
+    """เขียนเอกสารของสินค้าที่ระบุลง index ใหม่ (สินค้าที่ไม่มีอยู่แล้วจะถูกนำออก)"""
+    indexed = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        for ids in _chunks(product_ids):
+            _delete(cursor, ids)
+            documents = _documents(ids)
+            _insert(cursor, documents)
+            indexed += len(documents)
+    return indexed
+
+
+def remove_products(product_ids):
+    with connection.cursor() as cursor:
+        for ids in _chunks(product_ids):
+            _delete(cursor, ids)
+
+
+def rebuild(batch_size: int = _BATCH_SIZE, on_batch=None) -> int:
+    """สร้าง index ใหม่ทั้งหมดทีละ batch ตาม primary key (on_batch(total) ถูกเรียกหลังแต่ละ batch)"""
+    total, last_id = 0, 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        while True:
+            ids = list(Product.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            documents = _documents(ids)
+            _insert(cursor, documents)
+            total += len(documents)
+            last_id = ids[-1]
+            if on_batch is not None:
+                on_batch(total)
+        # รวม segment ของ index ให้เหลือชุดเดียว (ค้นหาเร็วขึ้นหลังเขียนจำนวนมาก)
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return total
+
+
+def _conditions(query):
+    """
+    แปลงคำค้นเป็นเงื่อนไข SQL บนตาราง FTS (alias f): ทุกคำต้องพบ (AND)
+    คืนค่า (where, params, ranked) หรือ None ถ้าไม่มีคำค้น ranked = ใช้ MATCH (มี BM25) หรือไม่
+    """
+    terms = list(dict.fromkeys(normalize(query).split()))
+    if not terms:
+        return None
+    long_terms = [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+    short_terms = [term for term in terms if len(term) < MIN_TERM_LENGTH]
+
+    where, params = [], []
+    if long_terms:
+        # แต่ละคำเป็น phrase ในเครื่องหมายคำพูด จึงไม่ถูกตีความเป็น syntax ของ FTS5 (AND/OR/NEAR/*)
+        where.append(f"f.{FTS_TABLE} MATCH %s")
+        params.append(' AND '.join('"%s"' % term.replace('"', '""') for term in long_terms))
+    for term in short_terms:
+        pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        where.append('(' + ' OR '.join(f"f.{column} LIKE %s ESCAPE '\\'" for column in SHORT_TERM_COLUMNS) + ')')
+        params.extend([pattern] * len(SHORT_TERM_COLUMNS))
+    return ' AND '.join(where), params, bool(long_terms)
+
+
+def search_ids(query, limit: int = None, statuses=LISTED_STATUSES) -> list[int]:
+    """
+    id ของสินค้าที่ตรงกับคำค้น เรียงตามความเกี่ยวข้อง (BM25) สูงสุด limit รายการ
+    statuses: กรองตาม Product.status (None = ทุกสถานะ)
+    """
+    conditions = _conditions(query)
+    if conditions is None:
+        return []
+    where, params, ranked = conditions
+    if limit is None:
+        limit = getattr(settings, 'PRODUCT_SEARCH_MAX_RESULTS', DEFAULT_SEARCH_MAX_RESULTS)
+    if statuses:
+        where += f" AND p.status IN ({', '.join(['%s'] * len(statuses))})"
+        params = [*params, *statuses]
+    sql = (
+        f"SELECT f.rowid FROM {FTS_TABLE} f JOIN {Product._meta.db_table} p ON p.id = f.rowid "
+        f"WHERE {where} ORDER BY {'f.rank' if ranked else 'f.name'}, f.rowid LIMIT %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search(query, limit: int = None, statuses=LISTED_STATUSES) -> list[Product]:
+    """สินค้าที่ตรงกับคำค้นเรียงตามความเกี่ยวข้อง (2 query: ค้นใน index แล้วดึงสินค้า)"""
+    ids = search_ids(query, limit, statuses)
+    products = Product.objects.in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
+
+
+def filter_queryset(queryset, query):
+    """กรอง queryset ของ Product ด้วย index (ไม่เรียงตามความเกี่ยวข้อง ใช้ใน admin)"""
+    conditions = _conditions(query)
+    if conditions is None:
+        return queryset
+    where, params, ranked = conditions
+    return queryset.filter(pk__in=RawSQL(f"SELECT f.rowid FROM {FTS_TABLE} f WHERE {where}", params))
@@ -0,0 +1,110 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import detail_cache, facets, search
+from .aggregates import refresh_aggregates
+from .models import Brand, Category, Product, ProductVariant
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def refresh_product_aggregates(sender, instance, **kwargs):
+    """อัปเดตราคาต่ำสุด/สูงสุด สต็อกรวม และตัวเลือกหลักของสินค้าเมื่อ variant ถูกเพิ่ม แก้ไข หรือลบ"""
+    if kwargs.get('raw'):
+        return
+    refresh_aggregates([instance.product_id])
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    """เขียนสินค้าลง index ค้นหาใหม่ทุกครั้งที่บันทึก (products.search)"""
+    if kwargs.get('raw'):
+        return
+    search.index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_index(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def update_product_facets(sender, instance, **kwargs):
+    """อัปเดตตัวนับ filter ของหน้ารายการ (products.facets) เมื่อสถานะ หมวดหมู่ หรือแบรนด์ของสินค้าเปลี่ยน"""
+    if kwargs.get('raw'):
+        return
+    facets.schedule_update([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Brand)
+def invalidate_facets(sender, instance, **kwargs):
+    # ชื่อ/slug ของหมวดหมู่และแบรนด์อยู่ใน index และการลบตั้งค่า FK ของสินค้าเป็น NULL โดยไม่ส่ง signal
+    facets.invalidate()
+
+
+def _related_product_ids(sender, instance):
+    field = 'category' if sender is Category else 'brand'
+    return list(Product.objects.filter(**{field: instance}).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Brand)
+def reindex_related_products(sender, instance, created, **kwargs):
+    """ชื่อหมวดหมู่/แบรนด์ถูกเก็บใน index ด้วย จึงเขียนสินค้าที่เกี่ยวข้องใหม่เมื่อถูกแก้ไข"""
+    if created or kwargs.get('raw'):
+        return
+    product_ids = _related_product_ids(sender, instance)
+    search.index_products(product_ids)
+    _bump_product_details(product_ids)
+
+
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=Brand)
+def remember_related_products(sender, instance, **kwargs):
+    # การลบตั้งค่า FK ของสินค้าเป็น NULL ด้วย UPDATE (ไม่ส่ง signal ของ Product) จึงจำ id ไว้เขียน index ใหม่หลังลบ
+    instance._search_product_ids = _related_product_ids(sender, instance)
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Brand)
+def reindex_products_after_delete(sender, instance, **kwargs):
+    product_ids = getattr(instance, '_search_product_ids', [])
+    search.index_products(product_ids)
+    _bump_product_details(product_ids)
+
+
+# ----------------------------------------------------------------------
+# Cache หน้ารายละเอียดสินค้า (products.detail_cache)
+# ----------------------------------------------------------------------
+
+def _bump_product_details(product_ids):
+    if product_ids:
+        detail_cache.schedule_bump(Product.objects.filter(pk__in=product_ids).values_list('slug', flat=True))
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_slug(sender, instance, **kwargs):
+    # ถ้า slug ถูกเปลี่ยน ต้อง bump slug เดิมด้วย เพื่อไม่ให้ URL เดิมยังแสดงข้อมูลจาก cache
+    if instance.pk and not kwargs.get('raw'):
+        instance._previous_slug = Product.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def bump_product_detail(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    detail_cache.schedule_bump([instance.slug, getattr(instance, '_previous_slug', None)])
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def bump_variant_product_detail(sender, instance, **kwargs):
+    """ราคา ขนาด และตัวเลือกหลักอยู่ใน read model (สต็อกไม่อยู่ จึงไม่ต้อง bump ตอนตัดสต็อก)"""
+    if kwargs.get('raw'):
+        return
+    _bump_product_details([instance.product_id])
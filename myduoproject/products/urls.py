@@ -9,6 +9,9 @@ urlpatterns = [
     # ใช้ ProductListView.as_view()
     path('', views.ProductListView.as_view(), name='product_list'), 
     
+    # ค้นหาสินค้า (ต้องอยู่ก่อน product_detail เพื่อไม่ให้ 'search' ถูกตีความเป็น slug)
+    path('search/', views.ProductSearchView.as_view(), name='product_search'),
+
     # 2. Product Detail (แก้ไข NoReverseMatch: 'product_detail')
     # ต้องใช้ <str:slug>/ เพื่อให้ตรงกับ get_object ใน ProductDetailView
     path('<str:slug>/', views.ProductDetailView.as_view(), name='product_detail'), 
@@ -1,16 +1,18 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import ListView, DetailView, View 
 from django.utils.decorators import method_decorator
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import user_passes_test
 from django.contrib import messages
 from decimal import Decimal 
-from django.db.models import Prefetch, Min # Import Prefetch and Min
 
-from .models import Product, ProductVariant
+from .models import LISTED_STATUSES, Product, ProductVariant
+from .pagination import InvalidCursor, paginate
+from . import detail_cache, facets, search
 from .forms import ProductCreateForm 
-from orders.utils import get_cart_session 
+from orders.cart import CartManager
+from orders.inventory import InsufficientStock
 
 # Test function for staff access
 def is_staff(user):
@@ -22,37 +24,165 @@ def is_staff(user):
 # ----------------------------------------------------------------------
 
 class ProductListView(ListView):
+    """
+    รายการสินค้าแบบ keyset pagination (?after= / ?before= cursor แทนเลขหน้า) ไม่มี COUNT และไม่มี OFFSET
+    รองรับ ?sort= (ดู SORTS) และ ?category=<slug> / ?brand=<id> / ?price=<ช่วงราคา> / ?in_stock=1
+    แต่ละหน้าใช้ query เดียว (ผ่าน index ใน Product.Meta) จำนวนสินค้าของแต่ละ filter นับจาก products.facets ในหน่วยความจำ
+    """
     model = Product
     template_name = 'products/product_list.html'
     context_object_name = 'products'
-    paginate_by = 12
-    
-    def get_queryset(self):
+    per_page = 12
+
+    # ชื่อ sort -> (ป้ายชื่อ, ordering) ordering ต้องจบด้วย id เพื่อให้ cursor ชี้ตำแหน่งได้แน่นอน
+    SORTS = {
+        'newest': ('ใหม่ล่าสุด', ('-created_at', '-id')),
+        'price_asc': ('ราคาต่ำไปสูง', ('min_price', 'id')),
+        'price_desc': ('ราคาสูงไปต่ำ', ('-min_price', '-id')),
+        'name': ('ชื่อสินค้า', ('name', 'id')),
+    }
+    DEFAULT_SORT = 'newest'
+
+    def get_sort(self):
+        sort = self.request.GET.get('sort')
+        return sort if sort in self.SORTS else self.DEFAULT_SORT
+
+    def get_filters(self):
+        """filter ที่ใช้ได้จาก query string (ค่าที่ไม่ถูกต้องจะถูกข้าม)"""
+        filters = {}
+        if self.request.GET.get('category'):
+            filters['category__slug'] = self.request.GET['category']
+        if self.request.GET.get('brand', '').isdigit():
+            filters['brand_id'] = int(self.request.GET['brand'])
+        band = facets.parse_band(self.request.GET.get('price'))
+        if band is not None:
+            low, high = band
+            filters['min_price__gte'] = low
+            if high is not None:
+                filters['min_price__lt'] = high
+        if self.request.GET.get('in_stock'):
+            filters['total_stock__gt'] = 0
+        return filters
+
+    def get_facet_filters(self):
+        """filter เดียวกับ get_filters ในรูป {facet: ค่า} ของ products.facets"""
+        filters = {}
+        if self.request.GET.get('category'):
+            # slug ที่ไม่รู้จักใช้ค่า 0 ซึ่งไม่มีสินค้า (ตรงกับผลของ get_filters)
+            filters['category'] = facets.category_id(self.request.GET['category']) or 0
+        if self.request.GET.get('brand', '').isdigit():
+            filters['brand'] = int(self.request.GET['brand'])
+        if facets.parse_band(self.request.GET.get('price')) is not None:
+            filters['price'] = self.request.GET['price']
+        if self.request.GET.get('in_stock'):
+            filters['in_stock'] = True
+        return filters
+
+    def get_facets(self):
         """
-        กรองสินค้าตามสถานะและดึงข้อมูล ProductVariant ที่มีราคาต่ำสุด 
-        มาด้วยใน Query เดียวเพื่อแก้ปัญหา N+1 Query
+        ตัวเลือก filter พร้อมจำนวนสินค้าและลิงก์ (กดซ้ำเพื่อยกเลิก) ลิงก์คง filter/sort อื่นไว้และเริ่มจากหน้าแรก
         """
-        # 1. กำหนด Prefetch Object เพื่อดึงเฉพาะ ProductVariant ที่เป็น default หรือมีราคาต่ำสุด
-        # เนื่องจากใน Template คุณใช้ .first เราจะดึง Variant ทั้งหมดและให้ Django จัดการในหน่วยความจำ
-        # แต่เพื่อประสิทธิภาพสูงสุด เราควรดึงเฉพาะ variant ที่ต้องการจริงๆ (เช่น variant ที่มี is_default=True)
-        
-        # สำหรับกรณีที่คุณต้องการใช้ .first() ใน Template ต่อไป (เพื่อดึง Variant แรกที่พบ)
-        # Prefetch('variants') ก็เพียงพอที่จะแก้ปัญหา N+1
-        # หรือถ้าต้องการดึงเฉพาะ variant ที่เป็น default:
-        default_variant_prefetch = Prefetch(
-            'variants',
-            queryset=ProductVariant.objects.filter(is_default=True).order_by('id'), # สั่งให้ดึงเฉพาะ default variant (ถ้ามี)
-            to_attr='default_variant_list' # เก็บผลลัพธ์ไว้ใน attribute ชื่อ 'default_variant_list'
-        )
-        
-        queryset = Product.objects.filter(
-            status__in=['PRE_ORDER', 'AVAILABLE']
-        ).prefetch_related(
-            default_variant_prefetch
-        ).order_by('-created_at')
+        counts, index = facets.facet_counts(self.get_facet_filters())
+
+        def option(param, value, label, count):
+            params = self.request.GET.copy()
+            for key in ('after', 'before'):
+                params.pop(key, None)
+            selected = params.get(param) == value
+            if selected:
+                params.pop(param)
+            else:
+                params[param] = value
+            return {'label': label, 'count': count, 'selected': selected, 'query': params.urlencode()}
+
+        categories = [
+            option('category', index.categories[pk][0], index.categories[pk][1], count)
+            for pk, count in counts['category'].items() if pk in index.categories
+        ]
+        brands = [
+            option('brand', str(pk), index.brands[pk], count)
+            for pk, count in counts['brand'].items() if pk in index.brands
+        ]
+        prices = [
+            option('price', facets.band_key(low, high),
+                   f"{low:,.0f} - {high:,.0f} บาท" if high is not None else f"{low:,.0f} บาทขึ้นไป",
+                   counts['price'][facets.band_key(low, high)])
+            for low, high in index.bands if facets.band_key(low, high) in counts['price']
+        ]
+        in_stock = [option('in_stock', '1', 'มีสินค้าพร้อมส่ง', counts['in_stock'][True])] if counts['in_stock'] else []
+        return [
+            ('หมวดหมู่', sorted(categories, key=lambda o: o['label'])),
+            ('แบรนด์', sorted(brands, key=lambda o: o['label'])),
+            ('ช่วงราคา', prices),
+            ('สถานะสต็อก', in_stock),
+        ]
 
+    def get_queryset(self):
+        """
+        กรองสินค้าตามสถานะ ราคาและสต็อกอ่านจากคอลัมน์ค่าสรุปของ Product (ดู products.aggregates)
+        จึงไม่ต้องโหลด variant ของแต่ละสินค้า (ไม่มีปัญหา N+1 Query)
+        """
+        queryset = Product.objects.filter(status__in=LISTED_STATUSES, **self.get_filters())
+        if self.get_sort().startswith('price'):
+            # เรียงตาม Product.min_price ที่เก็บไว้ (สินค้าที่ยังไม่มี variant ไม่มีราคาและซื้อไม่ได้ จึงไม่แสดงในลำดับนี้)
+            queryset = queryset.filter(min_price__isnull=False)
         return queryset
 
+    def get_context_data(self, **kwargs):
+        sort = self.get_sort()
+        try:
+            page = paginate(
+                self.object_list,
+                self.SORTS[sort][1],
+                self.per_page,
+                after=self.request.GET.get('after'),
+                before=self.request.GET.get('before'),
+            )
+        except InvalidCursor:
+            raise Http404("cursor ไม่ถูกต้อง")
+
+        # query string ของ filter/sort ปัจจุบัน สำหรับต่อท้ายลิงก์หน้าถัดไป/ก่อนหน้า
+        params = self.request.GET.copy()
+        for key in ('after', 'before'):
+            params.pop(key, None)
+
+        context = super().get_context_data(object_list=page.object_list, **kwargs)
+        context.update({
+            'page': page,
+            'is_paginated': page.has_next or page.has_previous,
+            'query_params': params.urlencode(),
+            'sort': sort,
+            'sort_options': [(key, label) for key, (label, ordering) in self.SORTS.items()],
+            'facets': self.get_facets(),
+        })
+        return context
+
+
+class ProductSearchView(ListView):
+    """
+    ค้นหาสินค้าด้วย ?q= ผ่าน index FTS5 (products.search) เรียงตามความเกี่ยวข้อง
+    ผลลัพธ์สูงสุด PRODUCT_SEARCH_MAX_RESULTS รายการ แบ่งหน้าด้วย ?page= (ดึงสินค้าเฉพาะหน้าที่แสดง)
+    """
+    template_name = 'products/product_search.html'
+    context_object_name = 'products'
+    paginate_by = 12
+
+    def get_queryset(self):
+        self.query = self.request.GET.get('q', '').strip()
+        return search.search_ids(self.query) if self.query else []
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # object_list ของหน้านี้เป็น id ที่เรียงตามความเกี่ยวข้องแล้ว
+        ids = list(context['object_list'])
+        products = Product.objects.in_bulk(ids)
+        context.update({
+            'products': [products[pk] for pk in ids if pk in products],
+            'query': self.query,
+            'result_count': context['paginator'].count if context['paginator'] else 0,
+        })
+        return context
+
 
 class ProductDetailView(DetailView):
     model = Product
@@ -60,19 +190,34 @@ class ProductDetailView(DetailView):
     context_object_name = 'product'
     
     def get_object(self, queryset=None):
-        """ดึงสินค้าตาม slug ที่ส่งมาใน URL"""
-        return get_object_or_404(Product, slug=self.kwargs.get('slug'))
+        """
+        read model ของสินค้าตาม slug จาก cache (products.detail_cache) พร้อมสต็อกล่าสุดจากฐานข้อมูล
+        ส่วนที่ cache ไว้ไม่มีสต็อก จึงแสดงจำนวนที่ขายได้ถูกต้องเสมอโดยไม่ต้อง query สินค้า/variant ทุกครั้ง
+        """
+        product = detail_cache.get_detail(self.kwargs.get('slug'))
+        if product is None:
+            raise Http404("ไม่พบสินค้า")
+        stock = detail_cache.live_stock(product['id'])
+        for variant in product['variants']:
+            variant['available_stock'] = stock.get(variant['id'], 0)
+        product['default_variant'] = next(
+            (variant for variant in product['variants'] if variant['id'] == product['default_variant_id']), None
+        )
+        return product
     
 # ----------------------------------------------------------------------
 # AJAX / Cart Interaction (Function-Based)
 # ----------------------------------------------------------------------
 @require_POST
 def add_to_cart(request):
-    """จัดการการเพิ่ม ProductVariant ลงใน Session Cart (AJAX endpoint)"""
+    """จัดการการเพิ่ม ProductVariant ลงในตะกร้า (AJAX endpoint, ใช้ CartManager เดียวกับ orders)"""
     try:
         variant_id = request.POST.get('variant_id')
         # ตรวจสอบและแปลง quantity เป็น int ถ้าแปลงไม่ได้ให้ใช้ค่าเริ่มต้น 1
-        quantity = int(request.POST.get('quantity', 1)) 
+        try:
+            quantity = int(request.POST.get('quantity', 1))
+        except ValueError:
+            return JsonResponse({'success': False, 'message': 'จำนวนสินค้าไม่ถูกต้อง'}, status=400)
         
         if not variant_id:
              return JsonResponse({'success': False, 'message': 'กรุณาเลือกตัวเลือกสินค้า'}, status=400)
@@ -82,34 +227,19 @@ def add_to_cart(request):
         if quantity <= 0:
             return JsonResponse({'success': False, 'message': 'จำนวนสินค้าต้องมากกว่า 0'}, status=400)
             
-        # ดึงหรือสร้าง Session Cart
-        cart = get_cart_session(request)
-        cart_key = str(variant_id)
-        
-        # ราคาต้องแปลงเป็น String ก่อนเก็บใน Session (ตามหลักการของ Django Session)
-        price_str = str(variant.current_price.quantize(Decimal('0.00')))
-        
-        # เพิ่ม/อัปเดตสินค้า
-        if cart_key in cart:
-            cart[cart_key]['quantity'] += quantity
-        else:
-            cart[cart_key] = {
-                'quantity': quantity,
-                'price': price_str 
-            }
-        
-        # บันทึก Session: สำคัญมาก
-        request.session.modified = True
-        
-        # คำนวณจำนวนสินค้ารวม
-        total_items = sum(item.get('quantity', 0) for item in cart.values())
+        # เพิ่ม/อัปเดตสินค้าผ่าน cart storage backend ที่ตั้งค่าไว้
+        cart_manager = CartManager(request)
+        cart_manager.add(variant=variant, quantity=quantity)
         
-        return JsonResponse({'success': True, 'total_items': total_items})
+        return JsonResponse({'success': True, 'total_items': cart_manager.get_total_quantity()})
         
     except ProductVariant.DoesNotExist:
         return JsonResponse({'success': False, 'message': 'ตัวเลือกสินค้าไม่ถูกต้อง'}, status=404)
-    except ValueError:
-        return JsonResponse({'success': False, 'message': 'จำนวนสินค้าไม่ถูกต้อง'}, status=400)
+    except InsufficientStock as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    except ValueError as e:
+        # ข้อผิดพลาดจาก cart storage (เช่น ตะกร้าใน cookie เต็ม)
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
     except Exception as e:
         # Log error
         print(f"Error adding to cart: {e}")
@@ -1,6 +1,19 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.template.response import TemplateResponse
+from orders.jobs import enqueue
+from .codes import CODE_MAX_LENGTH, DEFAULT_CODE_LENGTH
 from .models import Promotion 
 
+
+class GenerateCodesForm(forms.Form):
+    """ฟอร์มของ action สร้างโค้ดจำนวนมาก"""
+    count = forms.IntegerField(label='จำนวนโค้ด', min_value=1, max_value=1_000_000)
+    prefix = forms.CharField(label='ข้อความนำหน้า', max_length=CODE_MAX_LENGTH - DEFAULT_CODE_LENGTH, required=False)
+    max_uses = forms.IntegerField(label='ใช้ได้กี่ครั้งต่อโค้ด', min_value=1, initial=1)
+
+
 # --- Promotion Admin ---
 @admin.register(Promotion)
 class PromotionAdmin(admin.ModelAdmin):
@@ -19,6 +32,11 @@ class PromotionAdmin(admin.ModelAdmin):
     list_filter = ('is_active', 'discount_type', 'valid_from', 'valid_to')
     
     search_fields = ('code',)
+
+    # ตารางอาจมีโค้ดจากแคมเปญเป็นล้านแถว ไม่ต้องนับจำนวนทั้งหมดทุกครั้งที่เปิดหน้ารายการ
+    show_full_result_count = False
+
+    actions = ['generate_codes']
     
     # ลบ filter_horizontal ออก เนื่องจากโมเดล Promotion ไม่มีฟิลด์ M2M กับ Product
     # filter_horizontal = ('products',) 
@@ -29,3 +47,38 @@ class PromotionAdmin(admin.ModelAdmin):
             return f"{obj.discount_value} %"
         return f"{obj.discount_value:,.2f} บาท"
     get_discount_display.short_description = 'ส่วนลด'
+
+    @admin.action(description='สร้างโค้ดใช้ครั้งเดียวจำนวนมากจากโปรโมชั่นนี้')
+    def generate_codes(self, request, queryset):
+        """
+        สร้างโค้ดจากโปรโมชั่นต้นแบบที่เลือก (เลือกได้ครั้งละหนึ่งรายการ)
+        การสร้างจริงทำใน worker (งาน promotions.generate_codes) เพราะโค้ดหลักแสนอาจใช้เวลานานเกิน request
+        """
+        if queryset.count() != 1:
+            self.message_user(request, 'กรุณาเลือกโปรโมชั่นต้นแบบเพียงหนึ่งรายการ', messages.ERROR)
+            return None
+        template = queryset.get()
+
+        form = GenerateCodesForm(request.POST if 'apply' in request.POST else None)
+        if form.is_valid():
+            enqueue('promotions.generate_codes', {
+                'template_id': template.pk,
+                'count': form.cleaned_data['count'],
+                'prefix': form.cleaned_data['prefix'],
+                'max_uses': form.cleaned_data['max_uses'],
+            })
+            self.message_user(
+                request,
+                f"เพิ่มงานสร้างโค้ด {form.cleaned_data['count']:,} โค้ดจาก {template.code} เข้าคิวแล้ว",
+                messages.SUCCESS,
+            )
+            return None
+
+        return TemplateResponse(request, 'admin/promotions/promotion/generate_codes.html', {
+            **self.admin_site.each_context(request),
+            'title': 'สร้างโค้ดจำนวนมาก',
+            'opts': self.model._meta,
+            'template_promotion': template,
+            'form': form,
+            'action_checkbox_name': ACTION_CHECKBOX_NAME,
+        })
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class PromotionsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'promotions'
+
+    def ready(self):
+        # ล้าง cache ของโปรโมชั่นเมื่อมีการแก้ไข (ดู promotions.cache)
+        from . import signals  # noqa: F401
+        # ลงทะเบียนงานเบื้องหลัง (ดู orders.jobs)
+        from . import tasks  # noqa: F401
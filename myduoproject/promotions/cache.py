@@ -0,0 +1,77 @@
+"""
+Cache ของโปรโมชั่นในหน่วยความจำของ process (read-through, มี TTL)
+
+- get_promotion(code) คืน Promotion หรือ None โดยไม่ query ถ้ามีใน cache
+- โค้ดที่ไม่มีอยู่ก็ถูกเก็บไว้ด้วย (negative caching) เพราะช่องกรอกโค้ดใน checkout เรียก validate ทุกครั้งที่พิมพ์
+- ถูกล้างทันทีเมื่อ Promotion ถูกบันทึก/ลบใน process นี้ (ดู promotions.signals)
+  process อื่นจะเห็นการเปลี่ยนแปลงภายใน PROMOTION_CACHE_TTL วินาที
+- times_used ไม่ถูกเก็บใน cache (ใช้ defer) จะถูกอ่านจากฐานข้อมูลใหม่ทุกครั้งที่เข้าถึง
+  cache จึงไม่ทำให้รับการใช้งานเกิน max_uses (การนับจริงทำด้วย Promotion.redeem ตอน checkout)
+"""
+import copy
+import threading
+import time
+
+from django.conf import settings
+
+from .models import Promotion
+
+DEFAULT_PROMOTION_CACHE_TTL = 60
+DEFAULT_PROMOTION_CACHE_NEGATIVE_TTL = 30
+DEFAULT_PROMOTION_CACHE_MAX_ENTRIES = 1000
+
+_MISSING = object()
+
+# code -> (expires_at (monotonic), Promotion หรือ None)
+_entries = {}
+_lock = threading.Lock()
+
+
+def _lookup(code):
+    with _lock:
+        entry = _entries.get(code)
+        if entry is None:
+            return _MISSING
+        expires_at, promotion = entry
+        if expires_at < time.monotonic():
+            del _entries[code]
+            return _MISSING
+        return promotion
+
+
+def _store(code, promotion):
+    ttl = (
+        getattr(settings, 'PROMOTION_CACHE_TTL', DEFAULT_PROMOTION_CACHE_TTL)
+        if promotion is not None
+        else getattr(settings, 'PROMOTION_CACHE_NEGATIVE_TTL', DEFAULT_PROMOTION_CACHE_NEGATIVE_TTL)
+    )
+    max_entries = getattr(settings, 'PROMOTION_CACHE_MAX_ENTRIES', DEFAULT_PROMOTION_CACHE_MAX_ENTRIES)
+    now = time.monotonic()
+    with _lock:
+        if len(_entries) >= max_entries:
+            # ลบรายการที่หมดอายุก่อน ถ้ายังเต็มอยู่ให้ลบรายการที่เก่าที่สุด (dict เรียงตามลำดับที่ใส่)
+            for key in [key for key, (expires_at, _) in _entries.items() if expires_at < now]:
+                del _entries[key]
+            while len(_entries) >= max_entries:
+                del _entries[next(iter(_entries))]
+        _entries[code] = (now + ttl, promotion)
+
+
+def get_promotion(code):
+    """Promotion ของโค้ดนี้ (หรือ None ถ้าไม่มี) แต่ละครั้งได้สำเนาใหม่ ผู้เรียกแก้ไขได้โดยไม่กระทบ cache"""
+    promotion = _lookup(code)
+    if promotion is _MISSING:
+        promotion = Promotion.objects.defer('times_used').filter(code=code).first()
+        _store(code, promotion)
+    return copy.copy(promotion) if promotion is not None else None
+
+
+def invalidate(promotion=None):
+    """ล้าง cache ของโปรโมชั่นนี้ (รวมถึงโค้ดเดิมถ้าโค้ดถูกเปลี่ยน) หรือทั้งหมดถ้าไม่ระบุ"""
+    with _lock:
+        if promotion is None:
+            _entries.clear()
+            return
+        for code, (expires_at, cached) in list(_entries.items()):
+            if code == promotion.code or (cached is not None and cached.pk == promotion.pk):
+                del _entries[code]
@@ -0,0 +1,88 @@
+"""
+การสร้างโค้ดโปรโมชั่นจำนวนมาก (เช่น โค้ดใช้ครั้งเดียวสำหรับแคมเปญ SMS/อินฟลูเอนเซอร์)
+
+- โค้ดสุ่มจาก secrets โดยใช้ตัวอักษรที่อ่านง่าย (ไม่มี 0/O/1/I) 32 ตัว ความยาว 10 ตัวจึงมี ~10^15 แบบ
+- ตรวจโค้ดซ้ำภายในรอบเดียวกันด้วย set และตรวจกับฐานข้อมูลทีละ batch ผ่าน unique index ของ code
+  (values_list('code') อ่านจาก index อย่างเดียว ไม่ต้องอ่านแถว)
+- บันทึกด้วย bulk_create ทีละ batch ใน savepoint ถ้ามีอีก process สร้างโค้ดเดียวกันระหว่างตรวจกับบันทึก
+  ทั้ง batch จะถูกย้อนกลับ แล้วตรวจใหม่และบันทึกเฉพาะโค้ดที่ยังว่าง (ไม่ใช้ ignore_conflicts เพราะจะแยกไม่ได้ว่าแถวไหนเป็นของรอบนี้)
+  โค้ดที่นับและส่งให้ on_batch จึงเป็นโค้ดที่รอบนี้สร้างจริงทั้งหมด
+- โค้ดที่สร้างเป็นโค้ดส่วนตัว (is_public=False) จึงไม่แสดงเป็นข้อเสนอในหน้าตะกร้า (ดู promotions.offers)
+- bulk_create ไม่ส่ง post_save จึงไม่ไปล้าง cache (ดู promotions.cache) หรือคำนวณตะกร้าใหม่ (ดู orders.pricing)
+"""
+import secrets
+
+from django.db import IntegrityError, transaction
+
+from .models import Promotion
+
+CODE_ALPHABET = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+DEFAULT_CODE_LENGTH = 10
+DEFAULT_BATCH_SIZE = 5000
+CODE_MAX_LENGTH = Promotion._meta.get_field('code').max_length
+
+# แปลง byte สุ่ม (0-255) เป็นตัวอักษรด้วย bytes.translate (256 / 32 = 8 รอบพอดี จึงไม่เอนเอียง)
+_TRANSLATE_TABLE = (CODE_ALPHABET * (256 // len(CODE_ALPHABET))).encode()
+
+# ฟิลด์ที่คัดลอกจากโปรโมชั่นต้นแบบ
+TEMPLATE_FIELDS = ('discount_type', 'discount_value', 'min_order_amount', 'is_active', 'valid_from', 'valid_to')
+
+
+def random_code(length: int = DEFAULT_CODE_LENGTH, prefix: str = '') -> str:
+    return prefix + secrets.token_bytes(length).translate(_TRANSLATE_TABLE).decode()
+
+
+def _existing_codes(codes) -> set:
+    return set(Promotion.objects.filter(code__in=codes).values_list('code', flat=True))
+
+
+def _insert_batch(codes: set, fields: dict, max_uses: int, batch_size: int) -> set:
+    """บันทึกโค้ดที่ยังไม่มีในฐานข้อมูล คืนค่าโค้ดที่ถูกบันทึกโดยการเรียกครั้งนี้"""
+    while True:
+        codes = codes - _existing_codes(codes)
+        if not codes:
+            return codes
+        try:
+            with transaction.atomic():
+                Promotion.objects.bulk_create(
+                    [Promotion(code=code, max_uses=max_uses, is_public=False, **fields) for code in codes],
+                    batch_size=batch_size,
+                )
+            return codes
+        except IntegrityError:
+            # มี process อื่นสร้างโค้ดเดียวกันไปก่อน: ตรวจใหม่แล้วลองอีกครั้งโดยไม่มีโค้ดนั้น
+            # (ถ้าไม่มีโค้ดใดซ้ำแสดงว่าเป็นข้อผิดพลาดอื่น)
+            if not _existing_codes(codes):
+                raise
+
+
+def generate_codes(template: Promotion, count: int, prefix: str = '', length: int = DEFAULT_CODE_LENGTH,
+                   max_uses: int = 1, batch_size: int = DEFAULT_BATCH_SIZE, on_batch=None) -> int:
+    """
+    สร้างโค้ดใหม่ count โค้ดโดยคัดลอกเงื่อนไขจาก template (แต่ละโค้ดใช้ได้ max_uses ครั้ง)
+    on_batch(codes) ถูกเรียกหลังบันทึกแต่ละ batch ด้วยโค้ดที่รอบนี้สร้างจริงเท่านั้น (เช่น เขียนโค้ดลงไฟล์ หรือรายงานความคืบหน้า)
+    คืนค่าจำนวนโค้ดที่สร้าง
+    """
+    prefix = prefix.strip().upper()
+    if count <= 0:
+        raise ValueError("จำนวนโค้ดต้องมากกว่า 0")
+    if len(prefix) + length > CODE_MAX_LENGTH:
+        raise ValueError(f"prefix และความยาวโค้ดรวมกันต้องไม่เกิน {CODE_MAX_LENGTH} ตัวอักษร")
+    # ให้จำนวนแบบที่เป็นไปได้มากกว่าจำนวนที่ขออย่างน้อย 1000 เท่า โอกาสสุ่มซ้ำจึงต่ำมาก
+    if len(CODE_ALPHABET) ** length < count * 1000:
+        raise ValueError("ความยาวโค้ดสั้นเกินไปสำหรับจำนวนที่ต้องการ")
+
+    fields = {field: getattr(template, field) for field in TEMPLATE_FIELDS}
+    created = 0
+    while created < count:
+        needed = min(batch_size, count - created)
+        batch = set()
+        while len(batch) < needed:
+            batch.add(random_code(length, prefix))
+        batch = _insert_batch(batch, fields, max_uses, batch_size)
+        if not batch:
+            continue
+        created += len(batch)
+        if on_batch is not None:
+            on_batch(batch)
+    return created
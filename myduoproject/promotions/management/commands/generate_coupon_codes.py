@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from promotions.codes import DEFAULT_BATCH_SIZE, DEFAULT_CODE_LENGTH, generate_codes
+from promotions.models import Promotion
+
+
+class Command(BaseCommand):
+    """
+    สร้างโค้ดโปรโมชั่นใช้ครั้งเดียวจำนวนมากจากโปรโมชั่นต้นแบบ (ดู promotions.codes)
+    ตัวอย่าง: manage.py generate_coupon_codes SMS2025 --count 500000 --prefix SMS --output codes.txt
+    """
+    help = 'Generate N unique single-use promotion codes from a template promotion.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('template', help='โค้ดของโปรโมชั่นต้นแบบ (คัดลอกประเภท มูลค่า ยอดขั้นต่ำ และช่วงเวลา)')
+        parser.add_argument('--count', type=int, required=True, help='จำนวนโค้ดที่ต้องการ')
+        parser.add_argument('--prefix', default='', help='ข้อความนำหน้าโค้ด เช่น SMS')
+        parser.add_argument('--length', type=int, default=DEFAULT_CODE_LENGTH, help=f'ความยาวส่วนที่สุ่ม (ค่าเริ่มต้น {DEFAULT_CODE_LENGTH})')
+        parser.add_argument('--max-uses', type=int, default=1, help='จำนวนครั้งที่แต่ละโค้ดใช้ได้ (ค่าเริ่มต้น 1)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help=f'จำนวนโค้ดต่อ batch (ค่าเริ่มต้น {DEFAULT_BATCH_SIZE})')
+        parser.add_argument('--output', help='ไฟล์สำหรับเขียนโค้ดที่สร้าง (บรรทัดละหนึ่งโค้ด)')
+
+    def handle(self, *args, **options):
+        try:
+            template = Promotion.objects.get(code=options['template'].strip().upper())
+        except Promotion.DoesNotExist:
+            raise CommandError(f"ไม่พบโปรโมชั่น {options['template']}")
+
+        output = open(options['output'], 'w') if options['output'] else None
+        started = time.monotonic()
+        progress = {'created': 0}
+
+        def on_batch(codes):
+            progress['created'] += len(codes)
+            if output is not None:
+                output.write('\n'.join(codes) + '\n')
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"  {progress['created']}/{options['count']} codes ({progress['created'] / elapsed:.0f}/s)")
+
+        try:
+            created = generate_codes(
+                template,
+                options['count'],
+                prefix=options['prefix'],
+                length=options['length'],
+                max_uses=options['max_uses'],
+                batch_size=options['batch_size'],
+                on_batch=on_batch,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if output is not None:
+                output.close()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created} codes from {template.code} in {elapsed:.2f}s ({created / elapsed:.0f}/s)."
+        ))
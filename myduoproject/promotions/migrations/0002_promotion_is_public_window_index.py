@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-17 11:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promotions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promotion',
+            name='is_public',
+            field=models.BooleanField(default=True, help_text='แสดงเป็นข้อเสนอที่ใช้ได้ในหน้าตะกร้า (โค้ดที่สร้างจำนวนมากสำหรับแคมเปญจะไม่แสดง)', verbose_name='แสดงในหน้าตะกร้า'),
+        ),
+        migrations.AddIndex(
+            model_name='promotion',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_public', True)), fields=['valid_to', 'valid_from', 'min_order_amount'], name='promotion_active_window_idx'),
+        ),
+    ]
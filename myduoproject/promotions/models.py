@@ -1,10 +1,35 @@
 from django.db import models
+from django.db.models import F, Q
 from django.utils.translation import gettext_lazy as _
 
 class DiscountType(models.TextChoices):
     PERCENTAGE = 'PERCENT', _('เปอร์เซ็นต์ (%)')
     FIXED_AMOUNT = 'FIXED', _('จำนวนเงินคงที่ (บาท)')
 
+class PromotionQuerySet(models.QuerySet):
+    def public(self):
+        """โปรโมชั่นที่แสดงเป็นข้อเสนอในหน้าตะกร้าได้ (ไม่รวมโค้ดแคมเปญที่สร้างจำนวนมาก)"""
+        return self.filter(is_public=True)
+
+    def applicable(self, at=None, subtotal=None):
+        """
+        โปรโมชั่นที่ใช้ได้ ณ เวลา at (ค่าเริ่มต้นคือตอนนี้) และยอด subtotal (ถ้าระบุ) เงื่อนไขเดียวกับ is_valid
+        public().applicable() ใช้ index promotion_active_window_idx แทนการตรวจทีละแถวใน Python
+        """
+        from django.utils import timezone
+        at = at or timezone.now()
+
+        queryset = self.filter(
+            Q(max_uses=0) | Q(times_used__lt=F('max_uses')),
+            is_active=True,
+            valid_from__lte=at,
+            valid_to__gte=at,
+        )
+        if subtotal is not None:
+            queryset = queryset.filter(min_order_amount__lte=subtotal)
+        return queryset
+
+
 class Promotion(models.Model):
     """
     Model สำหรับโค้ดโปรโมชั่นหรือส่วนลด
@@ -31,6 +56,11 @@ class Promotion(models.Model):
     
     # การจำกัด
     is_active = models.BooleanField(_('เปิดใช้งาน'), default=True)
+    is_public = models.BooleanField(
+        _('แสดงในหน้าตะกร้า'),
+        default=True,
+        help_text=_("แสดงเป็นข้อเสนอที่ใช้ได้ในหน้าตะกร้า (โค้ดที่สร้างจำนวนมากสำหรับแคมเปญจะไม่แสดง)")
+    )
     valid_from = models.DateTimeField(_('ใช้ได้ตั้งแต่'))
     valid_to = models.DateTimeField(_('ใช้ได้ถึง'))
     
@@ -40,10 +70,20 @@ class Promotion(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = PromotionQuerySet.as_manager()
+
     class Meta:
         verbose_name = _('โค้ดโปรโมชั่น')
         verbose_name_plural = _('โค้ดโปรโมชั่น')
         ordering = ['-valid_to']
+        indexes = [
+            # ค้นหาโปรโมชั่นที่ใช้ได้ตามช่วงเวลา (PromotionQuerySet.applicable) โดยไม่ต้องรวมโค้ดแคมเปญจำนวนมาก
+            models.Index(
+                fields=['valid_to', 'valid_from', 'min_order_amount'],
+                name='promotion_active_window_idx',
+                condition=Q(is_active=True, is_public=True),
+            ),
+        ]
 
     def __str__(self):
         return self.code
@@ -63,4 +103,22 @@ class Promotion(models.Model):
         if self.max_uses > 0 and self.times_used >= self.max_uses:
             return False
             
-        return True
\ No newline at end of file
+        return True
+
+    @classmethod
+    def redeem(cls, code) -> bool:
+        """
+        นับการใช้โค้ด 1 ครั้งด้วย UPDATE เดียวแบบมีเงื่อนไข (times_used < max_uses และยังอยู่ในช่วงเวลา)
+        ไม่ต้องล็อกแถวไว้ตลอด transaction จึงไม่ทำให้ checkout ที่ใช้โค้ดเดียวกันต้องรอกัน
+        คืนค่า False ถ้าโค้ดไม่มีอยู่ ถูกปิด หมดอายุ หรือถูกใช้ครบจำนวนแล้ว
+        """
+        from django.utils import timezone
+        now = timezone.now()
+
+        return cls.objects.filter(
+            Q(max_uses=0) | Q(times_used__lt=F('max_uses')),
+            code=code,
+            is_active=True,
+            valid_from__lte=now,
+            valid_to__gte=now,
+        ).update(times_used=F('times_used') + 1) == 1
@@ -0,0 +1,97 @@
+"""
+ข้อเสนอที่ใช้ได้สำหรับตะกร้า: "โปรโมชั่นใดใช้ได้ ณ เวลา T กับยอด S"
+
+- PromotionWindowIndex แบ่งเส้นเวลาเป็นช่วงย่อยตามจุดเริ่ม/สิ้นสุดของทุกโปรโมชั่น (valid_from, valid_to)
+  แต่ละช่วงเก็บรายการโปรโมชั่นที่ครอบคลุมช่วงนั้นเรียงตาม min_order_amount
+  การค้นหาจึงเป็น bisect 2 ครั้ง (เวลา แล้วยอดขั้นต่ำ) = O(log n + k)
+- index ถูกสร้างจาก Promotion.objects.public() ด้วย query เดียว (ใช้ index promotion_active_window_idx)
+  และเก็บไว้ใน process เป็นเวลา PROMOTION_CACHE_TTL วินาที (ล้างทันทีเมื่อ Promotion ถูกแก้ไข ดู promotions.signals)
+- จำนวนครั้งที่ใช้ (times_used) ถูกตรวจตอนสร้าง index เท่านั้น การนับจริงทำด้วย Promotion.redeem ตอน checkout
+"""
+import threading
+import time
+from bisect import bisect_right
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .cache import DEFAULT_PROMOTION_CACHE_TTL
+from .models import Promotion
+
+# valid_to ใช้ได้ถึงเวลานั้น (รวม) จึงเก็บจุดสิ้นสุดเป็น valid_to + 1 microsecond เพื่อใช้ช่วงแบบ [start, end)
+_RESOLUTION = timedelta(microseconds=1)
+
+
+class PromotionWindowIndex:
+    """Interval index ของช่วงเวลาที่ใช้ได้และยอดขั้นต่ำของโปรโมชั่น (อ่านอย่างเดียวหลังสร้าง)"""
+
+    def __init__(self, promotions):
+        promotions = list(promotions)
+        events = sorted({p.valid_from for p in promotions} | {p.valid_to + _RESOLUTION for p in promotions})
+
+        # boundaries[i] คือจุดเริ่มของช่วง i ซึ่งสิ้นสุดที่ boundaries[i + 1]
+        self.boundaries = events
+        self.thresholds = []
+        self.promotions = []
+        starts = sorted(promotions, key=lambda p: p.valid_from)
+        active = {}
+        position = 0
+        for start, end in zip(events, events[1:]):
+            while position < len(starts) and starts[position].valid_from <= start:
+                active[starts[position].pk] = starts[position]
+                position += 1
+            for pk in [pk for pk, p in active.items() if p.valid_to + _RESOLUTION <= start]:
+                del active[pk]
+            segment = sorted(active.values(), key=lambda p: (p.min_order_amount, p.pk))
+            self.thresholds.append([p.min_order_amount for p in segment])
+            self.promotions.append(segment)
+
+    def __len__(self):
+        return len({p.pk for segment in self.promotions for p in segment})
+
+    def applicable(self, at, subtotal) -> list[Promotion]:
+        """โปรโมชั่นที่ใช้ได้ ณ เวลา at กับยอด subtotal (เรียงตามยอดขั้นต่ำ)"""
+        segment = bisect_right(self.boundaries, at) - 1
+        if segment < 0 or segment >= len(self.promotions):
+            return []
+        return self.promotions[segment][:bisect_right(self.thresholds[segment], subtotal)]
+
+
+def build_index(now=None) -> PromotionWindowIndex:
+    """สร้าง index จากโปรโมชั่นสาธารณะที่ยังไม่หมดอายุและยังไม่ถูกใช้ครบ (รวมที่จะเริ่มในอนาคต)"""
+    now = now or timezone.now()
+    return PromotionWindowIndex(
+        Promotion.objects.public().filter(
+            Q(max_uses=0) | Q(times_used__lt=F('max_uses')),
+            is_active=True,
+            valid_to__gte=now,
+        )
+    )
+
+
+_index = None
+_expires_at = 0
+_lock = threading.Lock()
+
+
+def get_index() -> PromotionWindowIndex:
+    global _index, _expires_at
+    with _lock:
+        if _index is None or _expires_at < time.monotonic():
+            _index = build_index()
+            _expires_at = time.monotonic() + getattr(settings, 'PROMOTION_CACHE_TTL', DEFAULT_PROMOTION_CACHE_TTL)
+        return _index
+
+
+def invalidate():
+    """ล้าง index (เรียกเมื่อ Promotion ถูกแก้ไข/ลบ ดู promotions.signals)"""
+    global _index
+    with _lock:
+        _index = None
+
+
+def available_promotions(subtotal, at=None) -> list[Promotion]:
+    """ข้อเสนอที่ใช้ได้กับยอดนี้ (สำหรับแสดงในหน้าตะกร้า)"""
+    return get_index().applicable(at or timezone.now(), subtotal)
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import cache, offers
+from .models import Promotion
+
+
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+def invalidate_promotion_cache(sender, instance, **kwargs):
+    """ล้าง cache และ index ข้อเสนอของโปรโมชั่นที่ถูกแก้ไข/ลบ (รวมถึงการแก้ไขผ่าน PromotionAdmin)"""
+    cache.invalidate(instance)
+    offers.invalidate()
@@ -0,0 +1,14 @@
+"""
+งานเบื้องหลังของโปรโมชั่น (ทำโดย manage.py run_jobs ดู orders.jobs)
+"""
+from orders.jobs import task
+
+from .codes import generate_codes
+from .models import Promotion
+
+
+@task('promotions.generate_codes')
+def generate_codes_task(template_id, count, prefix='', max_uses=1):
+    """สร้างโค้ดจำนวนมากจากหน้าแอดมิน (ทำใน worker เพราะอาจใช้เวลานานเกินกว่า request หนึ่งครั้ง)"""
+    template = Promotion.objects.get(pk=template_id)
+    generate_codes(template, count, prefix=prefix, max_uses=max_uses)
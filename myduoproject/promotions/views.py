@@ -4,7 +4,9 @@ from django.shortcuts import get_object_or_404
 from django.db import transaction
 from decimal import Decimal
 from promotions.models import Promotion # นำเข้า Promotion model
-from orders.models import get_active_cart, calculate_discount_amount # นำเข้าฟังก์ชันจาก orders.models
+from promotions.cache import get_promotion
+from orders.models import get_active_cart # นำเข้าฟังก์ชันจาก orders.models
+from orders.pricing import REASON_INVALID, REASON_MIN_ORDER, price_subtotal
 
 # ----------------------------------------------------------------------
 # Logic ของ Promotion
@@ -31,22 +33,21 @@ def apply_promotion(request):
     if not cart:
         return JsonResponse({'success': False, 'message': 'ไม่พบตะกร้าสินค้า กรุณาลองเพิ่มสินค้าก่อน'})
 
-    try:
-        # 3. ค้นหา Promotion ในฐานข้อมูล
-        promotion = Promotion.objects.get(code=code)
-    except Promotion.DoesNotExist:
+    # 3. ค้นหา Promotion ผ่าน cache (times_used ถูกอ่านใหม่จากฐานข้อมูลเสมอ)
+    promotion = get_promotion(code)
+    if promotion is None:
         # 3a. ไม่พบโค้ด
         return JsonResponse({'success': False, 'message': f'ไม่พบโค้ดส่วนลด "{code}"'})
 
-    # 4. ตรวจสอบความถูกต้องของโค้ด (วันที่, สถานะ, จำนวนครั้งที่ใช้)
-    if not promotion.is_valid:
+    # 4. ตรวจสอบความถูกต้องของโค้ดและคำนวณส่วนลดด้วย pricing engine กลาง (ดู orders.pricing)
+    subtotal = cart.total_subtotal
+    price = price_subtotal(subtotal, promotion)
+    if price.error == REASON_INVALID:
         # ตรวจสอบว่าโค้ดหมดอายุ, ถูกปิด, หรือใช้ครบจำนวนแล้วหรือไม่
         return JsonResponse({'success': False, 'message': 'โค้ดส่วนลดนี้หมดอายุ, ถูกระงับ, หรือถูกใช้ครบจำนวนแล้ว'})
 
     # 5. ตรวจสอบยอดสั่งซื้อขั้นต่ำ
-    # ใช้ Decimal ในการเปรียบเทียบ
-    subtotal = cart.total_subtotal
-    if subtotal < promotion.min_order_amount:
+    if price.error == REASON_MIN_ORDER:
         return JsonResponse({
             'success': False, 
             'message': f'ยอดสั่งซื้อขั้นต่ำต้องถึง {promotion.min_order_amount:.2f} บาท (ยอดปัจจุบัน: {subtotal:.2f})'
@@ -56,16 +57,14 @@ def apply_promotion(request):
     if cart.is_empty():
          return JsonResponse({'success': False, 'message': 'ไม่สามารถใช้โค้ดได้ ตะกร้าสินค้าว่างเปล่า'})
 
-    # 7. คำนวณส่วนลดและบันทึกใน Cart
-    discount_amount = calculate_discount_amount(subtotal, promotion)
+    # 7. บันทึกส่วนลดใน Cart
+    discount_amount = price.discount_amount
     
     # อัปเดต Cart
     # ใช้ transaction เพื่อป้องกันข้อผิดพลาด
     try:
         with transaction.atomic():
-            cart.promotion_code = code
-            cart.discount_amount = discount_amount
-            cart.save()
+            cart.apply_discount(code, discount_amount)
             
             # Note: เราจะเพิ่ม times_used ใน Promotion Model ก็ต่อเมื่อมีการยืนยันคำสั่งซื้อจริงๆ
             # แต่เพื่อการทดสอบเบื้องต้น ให้ถือว่าโค้ดถูก "ใช้" ในเซสชันนี้แล้ว
@@ -93,9 +92,7 @@ def remove_promotion(request):
     
     if cart and cart.promotion_code:
         # รีเซ็ตส่วนลด
-        cart.promotion_code = None
-        cart.discount_amount = Decimal('0.00')
-        cart.save()
+        cart.apply_discount(None, Decimal('0.00'))
 
     # ส่งค่ากลับ (แม้ Cart จะไม่มีอยู่ หรือไม่มีโค้ดอยู่แล้ว ก็ต้องส่งค่ากลับที่รีเซ็ตแล้ว)
     return JsonResponse({